@@ -1,21 +1,30 @@
-from fastapi import APIRouter, HTTPException, Body, Depends, status, Response
+from fastapi import APIRouter, HTTPException, Body, Depends, status, Response, Request, Query
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import FileResponse, StreamingResponse
 from fastapi.security import OAuth2PasswordRequestForm
+from starlette.background import BackgroundTask
 from pydantic import ValidationError, BaseModel
 from app.schemas.schemas import ProductFilterSchema, LoginCredentials
-from app.services.crud import query_products
-from app.db.database import get_db_connection
+from app.services.crud import recommend_products
+from app.services.pagination import MAX_PAGE_SIZE, encode_cursor, filter_signature
+from app.db.database import pool_stats
+from app.db.async_db import run_db
+from app.db.statements import statement_stats
+from app.services import http_cache, id_tokens, identity, image_cache, image_links, images, language, llm, llm_cache, premium, sessions, thumbnails
+from app.services.catalog_sync import catalog_status
+from app.services.result_cache import cache_stats
 from app.services.firebase import FirebaseAuth, PremiumAuth, AdminAuth, is_premium_user, set_user_premium_status
-import openai
-import os
+import asyncio
+import contextlib
 import json
-import re
+import logging
 from app.services import blind_test
 from app.services.firebase import signin_with_email_password
 from typing import Optional, List
 
 router = APIRouter()
+logger = logging.getLogger(__name__)
 router.include_router(blind_test.router, prefix="/blind-test")
-openai.api_key = os.getenv("OPENAI_API_KEY")
 
 # Firebase auth dependencies
 firebase_auth = FirebaseAuth()  # Basic auth için
@@ -44,6 +53,15 @@ async def set_premium(
             detail=str(e)
         )
 
+def _identity_unavailable(e: Exception) -> HTTPException:
+    """503 instead of 401 when sign-in failed because the identity service did, not the credentials."""
+    logger.warning(f"⚠️ Sign-in unavailable: {e}")
+    return HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail="Authentication service is temporarily unavailable",
+        headers={"Retry-After": "5"},
+    )
+
 @router.post("/token", response_model=dict)
 async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends()):
     """
@@ -52,7 +70,7 @@ async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(
     """
     try:
         # Sign in with Firebase
-        auth_result = signin_with_email_password(
+        auth_result = await signin_with_email_password(
             form_data.username,  # username field is used for email in OAuth2 form
             form_data.password
         )
@@ -64,6 +82,8 @@ async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(
             "access_token": token,
             "token_type": "bearer"
         }
+    except identity.IdentityUnavailable as e:
+        raise _identity_unavailable(e)
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -79,7 +99,7 @@ async def login(credentials: LoginCredentials):
     """
     try:
         # Sign in with Firebase
-        auth_result = signin_with_email_password(
+        auth_result = await signin_with_email_password(
             credentials.email, credentials.password
         )
         
@@ -95,6 +115,8 @@ async def login(credentials: LoginCredentials):
             "user_id": user_id,
             "user_email": user_email
         }
+    except identity.IdentityUnavailable as e:
+        raise _identity_unavailable(e)
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -119,12 +141,7 @@ async def check_user_status(user = Depends(firebase_auth)):
 @router.get("/db-check/")
 async def check_db_connection():
     try:
-        conn = get_db_connection()
-        cur = conn.cursor()
-        cur.execute("SELECT * FROM PRODUCT;")
-        result = cur.fetchone()
-        cur.close()
-        conn.close()
+        result = await run_db(_fetch_first_product)
         return {
             "status": "success",
             "message": "✅ Veritabanı bağlantısı başarılı!",
@@ -137,6 +154,85 @@ async def check_db_connection():
         }
 
 
+def _fetch_first_product(conn):
+    with conn.cursor() as cur:
+        cur.execute("SELECT * FROM PRODUCT;")
+        return cur.fetchone()
+
+
+@router.get("/db-pool/")
+async def get_db_pool_stats():
+    """
+    Returns connection pool statistics (size, idle/in-use counts, checkouts, waits, recycles).
+    """
+    return {"status": "success", "pool": pool_stats()}
+
+
+@router.get("/db-statements/")
+async def get_db_statement_stats():
+    """
+    Returns compiled statement cache statistics (hits, misses, PREPAREs, EXECUTEs).
+    """
+    return {"status": "success", "statements": statement_stats()}
+
+
+@router.get("/cache/stats")
+async def get_cache_stats():
+    """
+    Returns recommendation result cache statistics, with hit rates per endpoint.
+    """
+    return {"status": "success", "cache": cache_stats()}
+
+
+@router.get("/image-cache/stats")
+async def get_image_cache_stats():
+    """
+    Returns image disk cache statistics (files, bytes, hit rate, evictions).
+    """
+    return {"status": "success", "cache": image_cache.cache_stats()}
+
+
+@router.get("/llm/stats")
+async def get_llm_stats():
+    """
+    Returns shared LLM client statistics (calls, retries, timeouts, in-flight and queued requests)
+    and LLM response cache hit rates per prompt class.
+    """
+    return {"status": "success", "llm": llm.llm_status(), "cache": llm_cache.cache_stats()}
+
+
+@router.get("/token-cache/stats")
+async def get_token_cache_stats():
+    """
+    Returns ID token verification statistics (local or firebase_admin, signing keys, cache hits).
+    """
+    return {"status": "success", "tokens": id_tokens.token_status()}
+
+
+@router.get("/identity/stats")
+async def get_identity_stats():
+    """
+    Returns Firebase sign-in client statistics (calls, retries, failures, circuit breaker state).
+    """
+    return {"status": "success", "identity": identity.identity_status()}
+
+
+@router.get("/sessions/stats")
+async def get_session_stats():
+    """
+    Returns premium session store statistics (backend, entries, hits, expirations).
+    """
+    return {"status": "success", "sessions": sessions.session_stats()}
+
+
+@router.get("/catalog/status")
+async def get_catalog_status():
+    """
+    Returns the scoring engine in use and the catalog snapshot version, age and sync statistics.
+    """
+    return {"status": "success", **catalog_status()}
+
+
 @router.get("/auth-check/")
 async def check_auth(user = Depends(firebase_auth)):
     """
@@ -153,11 +249,17 @@ async def check_auth(user = Depends(firebase_auth)):
 
 @router.post("/recommendations/basic/")
 async def get_basic_recommendations(
+    request: Request,
     raw_filters: ProductFilterSchema = Body(...),
+    cursor: Optional[str] = None,
+    limit: int = Query(10, ge=1, le=MAX_PAGE_SIZE),
     user = Depends(firebase_auth)
 ):
     try:
-        product_recommendations = query_products(raw_filters.model_dump())
+        # Daha fazla sonuç için önceki yanıttaki recommendations.next_cursor gönderilir
+        product_recommendations = await recommend_products(
+            "basic", raw_filters.model_dump(), request=request, limit=limit, cursor=cursor
+        )
         return {
             "message": "Öneriler hazır!",
             "filters_used": raw_filters.model_dump(),
@@ -166,218 +268,220 @@ async def get_basic_recommendations(
 
     except ValidationError as e:
         raise HTTPException(status_code=400, detail=e.errors())
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
 @router.post("/recommendations/premium")
 async def get_premium_recommendations(
+    request: Request,
     user_input: str, 
     previous_filled_data: dict = None,
+    session_id: Optional[str] = None,
+    cursor: Optional[str] = None,
+    limit: int = Query(10, ge=1, le=MAX_PAGE_SIZE),
     user = Depends(premium_auth)  # FirebaseAuth yerine PremiumAuth kullan
 ):
+    """
+    One premium conversation turn. The conversation state (filled table, language, shown products)
+    is kept on the server: send the session_id of the previous response with the new message.
+    previous_filled_data is still accepted to start a session from a known table.
+    """
+    session = await _premium_session(session_id, user.get("uid"), previous_filled_data)
     try:
-        filter_dict = previous_filled_data or ProductFilterSchema().model_dump()
-
-        prompt = f"""
-        Kullanıcıdan şu giriş alındı: {user_input}
-        Mevcut doldurulmuş tablo:
-        {json.dumps(filter_dict, indent=4)}
-
-        Bu tabloyu kullanıcı bilgisine göre **güncelle** ve sadece eksik bilgileri tamamla.
-        Daha önce doldurulmuş bilgileri değiştirme.
-        Boolean değişkenleri True veya False olarak döndür. Null kullanma.
-        
-        NOT: Kullanıcı bütçe konusunda konuştuğunda MUTLAKA şu şekilde davran:
-        1. Eğer kullanıcı net bir aralık belirttiyse (örn. "200-300 TL arası" gibi) min_budget ve max_budget'i o şekilde ayarla.
-        2. Eğer kullanıcı tek bir değer belirttiyse (örn. "500 TL civarı" gibi) bir aralık oluştur:
-           - min_budget = belirtilen değerin %20 altı
-           - max_budget = belirtilen değerin %20 üstü
-        3. Eğer kullanıcı "ucuz olsun" gibi belirsiz ifadeler kullandıysa, min_budget=0, max_budget=500 gibi belirleme yapabilirsin.
-        4. Eğer kullanıcı "pahalı olsun" veya "lüks" gibi ifadeler kullandıysa, min_budget=1000 gibi bir alt sınır belirleyebilirsin.
-        5. Kullanıcı bütçe konusunda hiçbir şey söylemediyse, min_budget ve max_budget'i null bırak.
-
-        ÖZEL GÜN KURALLARI:
-        1. Eğer kullanıcı özel bir gün istemediğini belirttiğinde veya farklı bir özel gün belirttiğinde, special_other'ı True yap.
-        2. Eğer kullanıcı doğum günü, yıl dönümü gibi standart özel günlerden birini belirttiğinde, ilgili alanı True yap ve special_other'ı False yap.
-        
-        JSON formatında sadece güncellenmiş tabloyu döndür.
-        """
-
-        client = openai.OpenAI()
-        response = client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[
-                {"role": "system", "content": "Sen bir asistan olarak kullanıcı girdisine göre tabloyu tamamlıyorsun. Daha önce doldurulmuş bilgileri değiştirme. JSON formatında sadece tabloyu döndür. Boolean değişkenleri True veya False olarak döndür."},
-                {"role": "user", "content": prompt}
-            ]
-        )
-
-        raw_content = response.choices[0].message.content.strip()
-        cleaned_content = re.sub(r"```json\n(.*?)\n```", r"\1", raw_content, flags=re.DOTALL).strip()
-
-        updated_data = json.loads(cleaned_content)
+        if cursor and session.filled_table:
+            # "Daha fazla göster": tablo zaten dolu, LLM'e gitmeden sonraki sayfayı döndür
+            filled_filters = ProductFilterSchema(**session.filled_table)
+            session, product_recommendations, _ = await _show(
+                session, filled_filters.model_dump(), request, limit, cursor
+            )
+            return {
+                "session_id": session.session_id,
+                "filled_table": session.filled_table,
+                "recommendations": product_recommendations
+            }
 
-        # Eksik alanlar önceki verilerle doldurulsun
-        for key, value in filter_dict.items():
-            if key not in updated_data or updated_data[key] is None:
-                updated_data[key] = value
+        filter_dict = session.filled_table or ProductFilterSchema().model_dump()
 
-        # Bütçe işleme mantığını kontrol et ve gerekirse düzelt
-        if "min_budget" in updated_data and "max_budget" in updated_data:
-            min_budget = updated_data.get("min_budget")
-            max_budget = updated_data.get("max_budget")
-            
-            # Hem min hem max aynı değere sahipse ve null değilse
-            if min_budget is not None and max_budget is not None and min_budget == max_budget:
-                # Aynı değeri merkez alarak aralık oluştur
-                budget_value = min_budget
-                updated_data["min_budget"] = round(budget_value * 0.8)  # %20 altı
-                updated_data["max_budget"] = round(budget_value * 1.2)  # %20 üstü
+        turn, updated_data, extraction = await premium.process_turn(user_input, filter_dict, session.session_id)
+        session = session._replace(filled_table=updated_data, language=turn.language)
 
         filled_filters = ProductFilterSchema(**updated_data)
-        missing_fields = filled_filters.get_missing_fields()
-
-        # Bütçe kontrolü
-        has_budget = False
-        if filled_filters.min_budget is not None or filled_filters.max_budget is not None:
-            has_budget = True
-
-        if missing_fields:
-            field_messages = {
-                "Yaş aralığını belirtir misiniz?": ("age", "Aslında hediyeyi düşündüğünüz kişinin yaş aralığını bilmem çok yardımcı olacak. Genç biri mi yoksa yetişkin biri için mi bakıyorsunuz?"),
-                "Hediye alacağınız kişinin cinsiyeti nedir?": ("gender", "Bu hediyeyi bir erkek için mi yoksa bir kadın için mi düşünüyorsunuz? Bu bilgi önerilerimi daha isabetli yapacak."),
-                "Bu hediye özel bir gün için mi? (Doğum günü, yıl dönümü vb.)": ("special", "Merak ediyorum, bu hediye özel bir kutlama için mi? Doğum günü, yıldönümü veya başka özel bir gün olabilir mi?"),
-                "Kişinin ilgi alanlarından birkaçını paylaşır mısınız? (Örneğin, spor, müzik, teknoloji vb.)": ("interests", "Hediye düşündüğünüz kişi nelerden hoşlanır? Belki spor, müzik, kitap okumak ya da başka hobiler... Biraz bahsedebilir misiniz?")
-            }
-
-            first_missing = missing_fields[0]
-            field_key, _ = field_messages.get(first_missing, ("unknown", "Bana biraz daha bilgi verebilir misiniz?"))
-
-            # Check if the input is in English using AI
-            language_detection_prompt = f"Determine if the following text is in English. Respond with only 'true' or 'false': '{user_input}'"
-            
-            language_response = client.chat.completions.create(
-                model="gpt-4o-mini",
-                messages=[
-                    {"role": "system", "content": "You are a language detection assistant. Respond with only 'true' for English text and 'false' for non-English text."},
-                    {"role": "user", "content": language_detection_prompt}
-                ]
-            )
-            
-            is_english = language_response.choices[0].message.content.strip().lower() == 'true'
-
-            # Create appropriate prompt based on language
-            if is_english:
-                message_prompt = f"Convert this message to a natural, conversational English response: '{first_missing}'"
-            else:
-                message_prompt = f"Şu mesajı doğal, sohbet tarzında ama kısa bir şekilde söyle: '{first_missing}'"
-
-            message_response = client.chat.completions.create(
-                model="gpt-4o-mini",
-                messages=[
-                    {"role": "system", "content": "You are a gift assistant. Respond naturally and conversationally in the same language as the user's input."},
-                    {"role": "user", "content": message_prompt}
-                ]
-            )
-            
-            natural_message = message_response.choices[0].message.content.strip()
 
+        # Eksik zorunlu alan ya da bütçe varsa kullanıcıya sor
+        field_key = premium.missing_field(filled_filters)
+        if field_key:
+            session = await sessions.session_store.save(session)
             return {
-                "message": natural_message,
+                "session_id": session.session_id,
+                "message": premium.follow_up_message(turn, field_key),
                 "field_key": field_key,
-                "filled_table": updated_data
+                "filled_table": updated_data,
+                "extraction": extraction
             }
 
-        # Eğer bütçe belirtilmemişse ve diğer tüm alanlar dolmuşsa bütçe soralım
-        if not has_budget:
-            # Check if the input is in English using AI
-            language_detection_prompt = f"Determine if the following text is in English. Respond with only 'true' or 'false': '{user_input}'"
-            
-            language_response = client.chat.completions.create(
-                model="gpt-4o-mini",
-                messages=[
-                    {"role": "system", "content": "You are a language detection assistant. Respond with only 'true' for English text and 'false' for non-English text."},
-                    {"role": "user", "content": language_detection_prompt}
-                ]
-            )
-            
-            is_english = language_response.choices[0].message.content.strip().lower() == 'true'
-
-            if is_english:
-                budget_prompt = "Do you have a budget in mind for the gift? It would help me make better recommendations."
-            else:
-                budget_prompt = "Hediye için düşündüğünüz bir bütçe var mı? Uygun önerilerim için bilmem yardımcı olur."
-            
-            return {
-                "message": budget_prompt,
-                "field_key": "budget",
-                "filled_table": updated_data
-            }
-        
         # Ürün önerileri için SQL sorgusu oluştur ve çalıştır
-        product_recommendations = query_products(filled_filters.model_dump())
+        session, product_recommendations, skipped = await _show(session, filled_filters.model_dump(), request, limit)
 
         if not product_recommendations["products"]:
-            # Check if the input is in English using AI
-            language_detection_prompt = f"Determine if the following text is in English. Respond with only 'true' or 'false': '{user_input}'"
-            
-            language_response = client.chat.completions.create(
-                model="gpt-4o-mini",
-                messages=[
-                    {"role": "system", "content": "You are a language detection assistant. Respond with only 'true' for English text and 'false' for non-English text."},
-                    {"role": "user", "content": language_detection_prompt}
-                ]
-            )
-            
-            is_english = language_response.choices[0].message.content.strip().lower() == 'true'
-
-            if is_english:
-                no_products_prompt = "Hmm, I couldn't find any products that exactly match your criteria. Would you like me to try a broader search?"
-            else:
-                no_products_prompt = "Hmm, aradığınız kriterlere tam uyan bir ürün bulamadım. Biraz daha geniş bir arama yapmamı ister misiniz?"
-            
             return {
-                "message": no_products_prompt,
-                "filled_table": updated_data
+                "session_id": session.session_id,
+                "message": premium.MESSAGES["all_shown" if skipped else "no_products"][turn.language],
+                "filled_table": updated_data,
+                "extraction": extraction
             }
 
-        # Check if the input is in English using AI
-        language_detection_prompt = f"Determine if the following text is in English. Respond with only 'true' or 'false': '{user_input}'"
-        
-        language_response = client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[
-                {"role": "system", "content": "You are a language detection assistant. Respond with only 'true' for English text and 'false' for non-English text."},
-                {"role": "user", "content": language_detection_prompt}
-            ]
-        )
-        
-        is_english = language_response.choices[0].message.content.strip().lower() == 'true'
-
-        if is_english:
-            success_message = "Great! I've prepared some gift recommendations just for you. I hope you like them!"
-        else:
-            success_message = "Harika! Size özel hediye önerilerim hazır. Umarım beğenirsiniz!"
-        
         return {
-            "message": success_message,
+            "session_id": session.session_id,
+            "message": premium.MESSAGES["success"][turn.language],
             "filled_table": updated_data,
+            "extraction": extraction,
             "recommendations": product_recommendations
         }
 
-    except json.JSONDecodeError:
+    except premium.ExtractionError as e:
         return {
             "error": "Üzgünüm, yanıtınızı anlayamadım. Lütfen tekrar dener misiniz?",
-            "raw_response": raw_content
+            "raw_response": e.raw_content
         }
+    except llm.LlmError as e:
+        logger.warning(f"⚠️ Premium LLM call failed: {e}")
+        return {"error": "Şu anda çok yoğunuz, lütfen birazdan tekrar dener misiniz?"}
     except Exception as e:
         return {"error": f"Bir sorun oluştu: {str(e)}. Tekrar deneyebilir miyiz?"}
 
+
+async def _premium_session(session_id: Optional[str], uid: Optional[str], previous_filled_data: Optional[dict]):
+    """The caller's session, or a new one (optionally seeded with a table) when no id was sent."""
+    if not session_id:
+        return sessions.session_store.create(uid, previous_filled_data)
+    session = await sessions.session_store.get(session_id, uid)
+    if session is None:
+        raise HTTPException(status_code=404, detail="Oturum bulunamadı ya da süresi doldu")
+    # Kısa cevaplarda ("25", "ok") oturumun dili kullanılsın
+    language.remember(session.session_id, session.language)
+    return session
+
+
+async def _show(session, filters: dict, request: Request, limit: int, cursor: Optional[str] = None):
+    """
+    A page of up to `limit` products this session has not seen yet, paging past the ones it has
+    (the ranking can shift between pages and turns), and the saved session. Also returns how many
+    already shown products were skipped, so an empty page can say so instead of "no products".
+    """
+    shown = set(session.shown_ids)
+    products, skipped, page_size, page = [], 0, limit, None
+    # Gösterilenler SESSION_MAX_SHOWN ile sınırlı; bu kadar tam sayfa hepsini geçmeye yeter
+    for _ in range(sessions.SESSION_MAX_SHOWN // MAX_PAGE_SIZE + 2):
+        page = await recommend_products("premium", filters, request=request, limit=page_size, cursor=cursor)
+        for product in page["products"]:
+            if len(products) >= limit:
+                break
+            if product["id"] in shown:
+                skipped += 1
+            else:
+                products.append(product)
+        cursor = page["next_cursor"]
+        if len(products) >= limit or cursor is None:
+            break
+        page_size = MAX_PAGE_SIZE
+    if len(products) >= limit:
+        # Sayfanın kalanı atlanmasın: sonraki sayfa son döndürülen üründen başlar
+        last = products[-1]
+        cursor = encode_cursor(last["score"], last["id"], filter_signature("premium", filters))
+    session = await sessions.session_store.save(session.with_shown(p["id"] for p in products))
+    return session, {**page, "products": products, "next_cursor": cursor}, skipped
+
+
+@router.post("/recommendations/premium/stream")
+async def stream_premium_recommendations(
+    request: Request,
+    user_input: str,
+    previous_filled_data: dict = None,
+    session_id: Optional[str] = None,
+    limit: int = Query(10, ge=1, le=MAX_PAGE_SIZE),
+    user = Depends(premium_auth)
+):
+    """
+    Server-Sent Events variant of /recommendations/premium. Events, in order:
+    message_delta ({"text"}) while the model writes the follow-up question; message
+    ({"message", "field_key", "replaces_stream"}) with the final question when a field is still
+    missing; filled_table ({"session_id", "filled_table", "extraction"}); recommendations
+    ({"message", "recommendations", "replaces_stream"}) once the table is complete; then done.
+    replaces_stream is true when the final message is not the streamed text, which the client
+    should then replace. Failures are sent as an error event. Paging with a cursor stays on
+    /recommendations/premium.
+    """
+    session = await _premium_session(session_id, user.get("uid"), previous_filled_data)
+    return StreamingResponse(
+        _premium_events(request, user_input, session, limit),
+        media_type="text/event-stream",
+        # Proxy'ler olayları biriktirmesin
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+def _sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(jsonable_encoder(data), ensure_ascii=False)}\n\n"
+
+
+async def _premium_events(request: Request, user_input: str, session, limit: int):
+    try:
+        filter_dict = session.filled_table or ProductFilterSchema().model_dump()
+        result, streamed = None, []
+        # Bağlantı koparsa LLM akışı da kapanır ve eşzamanlılık yuvası bırakılır
+        async with contextlib.aclosing(premium.stream_turn(user_input, filter_dict, session.session_id)) as events:
+            async for kind, value in events:
+                if kind == "delta":
+                    streamed.append(value)
+                    yield _sse("message_delta", {"text": value})
+                else:
+                    result = value
+        turn, updated_data, extraction = result
+        session = session._replace(filled_table=updated_data, language=turn.language)
+        filled_filters = ProductFilterSchema(**updated_data)
+        table_event = {"session_id": session.session_id, "filled_table": updated_data, "extraction": extraction}
+
+        field_key = premium.missing_field(filled_filters)
+        if field_key:
+            await sessions.session_store.save(session)
+            message = premium.follow_up_message(turn, field_key)
+            yield _sse("message", {
+                "message": message,
+                "field_key": field_key,
+                "replaces_stream": bool(streamed) and message != "".join(streamed)
+            })
+            yield _sse("filled_table", table_event)
+        else:
+            yield _sse("filled_table", table_event)
+            session, product_recommendations, skipped = await _show(session, filled_filters.model_dump(), request, limit)
+            outcome = "success" if product_recommendations["products"] else "all_shown" if skipped else "no_products"
+            yield _sse("recommendations", {
+                "message": premium.MESSAGES[outcome][turn.language],
+                "recommendations": product_recommendations,
+                "replaces_stream": bool(streamed)
+            })
+        yield _sse("done", {})
+
+    except premium.ExtractionError as e:
+        yield _sse("error", {
+            "error": "Üzgünüm, yanıtınızı anlayamadım. Lütfen tekrar dener misiniz?",
+            "raw_response": e.raw_content
+        })
+    except llm.LlmError as e:
+        logger.warning(f"⚠️ Premium LLM stream failed: {e}")
+        yield _sse("error", {"error": "Şu anda çok yoğunuz, lütfen birazdan tekrar dener misiniz?"})
+    except Exception as e:
+        yield _sse("error", {"error": f"Bir sorun oluştu: {str(e)}. Tekrar deneyebilir miyiz?"})
+
 @router.get("/products/{product_id}/images")
 async def get_product_images(
+    request: Request,
     product_id: int, 
     image_id: Optional[int] = None,
+    v: Optional[str] = None,
     user = Depends(firebase_auth)  # Normal auth ekledim
 ):
     """
@@ -385,159 +489,317 @@ async def get_product_images(
     Eğer image_id belirtilirse sadece o resmi döndürür, aksi halde tüm resimlerin listesini döndürür.
     Bu endpoint için normal kullanıcı kimlik doğrulaması gereklidir.
     """
-    try:
-        conn = get_db_connection()
-        cur = conn.cursor()
-
-        if image_id is not None:
-            # Belirli bir resmi getir
-            cur.execute(
-                "SELECT image_data FROM product_images WHERE product_id = %s AND id = %s ORDER BY image_order",
-                (product_id, image_id)
-            )
-            result = cur.fetchone()
-            
-            if not result:
-                raise HTTPException(status_code=404, detail="Belirtilen resim bulunamadı")
-            
-            image_data = result[0]
-            cur.close()
-            conn.close()
-            
-            # Binary resim verisini doğrudan döndür
-            return Response(content=bytes(image_data), media_type="image/png")
-        else:
-            # Ürüne ait tüm resimlerin listesini getir
-            cur.execute(
-                "SELECT id, image_order FROM product_images WHERE product_id = %s ORDER BY image_order",
-                (product_id,)
-            )
-            results = cur.fetchall()
-            
-            if not results:
-                raise HTTPException(status_code=404, detail="Bu ürüne ait resim bulunamadı")
-            
-            image_list = [{"image_id": row[0], "order": row[1], "url": f"/api/products/{product_id}/images?image_id={row[0]}"} for row in results]
-            cur.close()
-            conn.close()
-            
-            return {"product_id": product_id, "images": image_list}
-
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Resim getirme hatası: {str(e)}")
+    return await _product_images_response(request, product_id, image_id, v, "/api/products", public=False)
 
 
 @router.get("/public/products/{product_id}/images")
-async def get_public_product_images(product_id: int, image_id: Optional[int] = None):
+async def get_public_product_images(request: Request, product_id: int, image_id: Optional[int] = None, v: Optional[str] = None):
     """
     Ürün ID'sine göre resimleri getirir. Bu endpoint kimlik doğrulaması gerektirmez.
     Eğer image_id belirtilirse sadece o resmi döndürür, aksi halde tüm resimlerin listesini döndürür.
     """
-    try:
-        conn = get_db_connection()
-        cur = conn.cursor()
-
-        if image_id is not None:
-            # Belirli bir resmi getir
-            cur.execute(
-                "SELECT image_data FROM product_images WHERE product_id = %s AND id = %s ORDER BY image_order",
-                (product_id, image_id)
-            )
-            result = cur.fetchone()
-            
-            if not result:
-                raise HTTPException(status_code=404, detail="Belirtilen resim bulunamadı")
-            
-            image_data = result[0]
-            cur.close()
-            conn.close()
-            
-            # Binary resim verisini doğrudan döndür
-            return Response(content=bytes(image_data), media_type="image/png")
-        else:
-            # Ürüne ait tüm resimlerin listesini getir
-            cur.execute(
-                "SELECT id, image_order FROM product_images WHERE product_id = %s ORDER BY image_order",
-                (product_id,)
-            )
-            results = cur.fetchall()
-            
-            if not results:
-                raise HTTPException(status_code=404, detail="Bu ürüne ait resim bulunamadı")
-            
-            image_list = [{"image_id": row[0], "order": row[1], "url": f"/api/public/products/{product_id}/images?image_id={row[0]}"} for row in results]
-            cur.close()
-            conn.close()
-            
-            return {"product_id": product_id, "images": image_list}
-
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Resim getirme hatası: {str(e)}")
+    return await _product_images_response(request, product_id, image_id, v, "/api/public/products", public=True)
 
 
 @router.get("/products/{product_id}/thumbnail")
 async def get_product_thumbnail(
+    request: Request,
     product_id: int,
+    size: Optional[int] = Query(None, ge=1, le=4096),
+    v: Optional[str] = None,
     user = Depends(firebase_auth)  # Normal auth ekledim
 ):
     """
     Ürün ID'sine göre ilk resmi (thumbnail) döndürür.
+    size verilirse en yakın boyuttaki küçültülmüş varyant (WebP/JPEG) döner.
     Bu endpoint için normal kullanıcı kimlik doğrulaması gereklidir.
     """
-    try:
-        conn = get_db_connection()
-        cur = conn.cursor()
-        
-        # İlk sıradaki resmi getir (image_order'a göre sıralı)
-        cur.execute(
-            "SELECT image_data FROM product_images WHERE product_id = %s ORDER BY image_order LIMIT 1",
-            (product_id,)
-        )
-        result = cur.fetchone()
-        
-        if not result:
-            # Eğer resim bulunamazsa default bir resim döndürülebilir
-            # Ya da 404 hatası verilebilir
-            raise HTTPException(status_code=404, detail="Bu ürüne ait resim bulunamadı")
-        
-        image_data = result[0]
-        cur.close()
-        conn.close()
-        
-        # Binary resim verisini doğrudan döndür
-        return Response(content=bytes(image_data), media_type="image/png")
-        
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Thumbnail getirme hatası: {str(e)}")
+    return await _product_thumbnail_response(request, product_id, size, v, public=False)
 
 
 @router.get("/public/products/{product_id}/thumbnail")
-async def get_public_product_thumbnail(product_id: int):
+async def get_public_product_thumbnail(
+    request: Request, product_id: int, size: Optional[int] = Query(None, ge=1, le=4096), v: Optional[str] = None,
+):
     """
     Ürün ID'sine göre ilk resmi (thumbnail) döndürür. Bu endpoint kimlik doğrulaması gerektirmez.
+    size verilirse en yakın boyuttaki küçültülmüş varyant (WebP/JPEG) döner.
     """
+    return await _product_thumbnail_response(request, product_id, size, v, public=True)
+
+
+@router.get("/products/images/batch")
+async def get_product_images_batch(
+    request: Request,
+    product_ids: List[int] = Query(...),
+    user = Depends(firebase_auth)
+):
+    """
+    Birden fazla ürünün resim listesini ve thumbnail bilgisini tek sorguyla döndürür.
+    Örnek: /products/images/batch?product_ids=1&product_ids=2
+    Bu endpoint için normal kullanıcı kimlik doğrulaması gereklidir.
+    """
+    return await _product_images_batch_response(request, product_ids, "/api/products")
+
+
+@router.get("/public/products/images/batch")
+async def get_public_product_images_batch(request: Request, product_ids: List[int] = Query(...)):
+    """
+    Birden fazla ürünün resim listesini ve thumbnail bilgisini tek sorguyla döndürür.
+    Bu endpoint kimlik doğrulaması gerektirmez.
+    """
+    return await _product_images_batch_response(request, product_ids, "/api/public/products")
+
+
+async def _product_images_batch_response(request: Request, product_ids: List[int], url_prefix: str):
+    # Sıra korunur, tekrar eden id'ler bir kez döner
+    product_ids = list(dict.fromkeys(product_ids))
+    if len(product_ids) > image_links.MAX_BATCH_PRODUCTS:
+        raise HTTPException(status_code=400, detail=f"En fazla {image_links.MAX_BATCH_PRODUCTS} ürün istenebilir")
     try:
-        conn = get_db_connection()
-        cur = conn.cursor()
-        
-        # İlk sıradaki resmi getir (image_order'a göre sıralı)
-        cur.execute(
-            "SELECT image_data FROM product_images WHERE product_id = %s ORDER BY image_order LIMIT 1",
-            (product_id,)
+        listings = await run_db(images.list_images_batch, product_ids, request=request)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Resim getirme hatası: {str(e)}")
+
+    return {
+        "products": [
+            {
+                "product_id": product_id,
+                "images": image_links.image_listing(url_prefix, product_id, listings[product_id]),
+                # Resmi olmayan ürünlerde thumbnail None'dır
+                "thumbnail": image_links.thumbnail_link(url_prefix, product_id, listings[product_id][0][2]) if listings[product_id] else None,
+            } for product_id in product_ids
+        ]
+    }
+
+
+async def _conditional_image_response(request: Request, product_id: int, image_id: Optional[int], cache_control: str):
+    """
+    Serve an image with ETag/Last-Modified validators. A matching If-None-Match or
+    If-Modified-Since gets a 304 without the blob being read from the database.
+    cache_control(meta) returns the Cache-Control value for the image.
+    Metadata is memoized for IMAGE_META_TTL and the bytes come from the disk cache when
+    present, so repeated requests usually need no database round-trip at all.
+    """
+    key = ("image", product_id, image_id)
+    meta, image_data = image_cache.meta_cache.get(key), None
+    if meta is image_cache.NO_IMAGE:
+        return None
+    if meta is None:
+        meta, image_data = await run_db(
+            images.fetch_image_if_modified, product_id, image_id, _skip_body(request, _etag), request=request
         )
-        result = cur.fetchone()
-        
-        if not result:
+        image_cache.meta_cache.put(key, image_cache.NO_IMAGE if meta is None else meta)
+        if meta is None:
+            return None
+
+    headers = http_cache.validator_headers(_etag(meta), meta.updated_at, cache_control(meta))
+    if http_cache.is_not_modified(request, _etag(meta), meta.updated_at):
+        return http_cache.not_modified_response(headers)
+    disk = image_cache.disk_cache()
+    if image_data is None and images.is_streamed(meta) and not (disk is not None and disk.contains(meta.content_hash)):
+        return await _streaming_image_response(request, meta, headers)
+    return await _image_body_response(
+        request, meta.content_hash, image_data, headers, None,
+        lambda: run_db(images.fetch_image_data, meta.image_id, request=request),
+    )
+
+
+def _skip_body(request: Request, etag):
+    """not_modified callback for the DB lookups: the blob is not needed for a 304 or a disk cache hit."""
+    disk = image_cache.disk_cache()
+
+    def skip(meta):
+        if http_cache.is_not_modified(request, etag(meta), meta.updated_at):
+            return True
+        return disk is not None and disk.contains(meta.content_hash)
+    return skip
+
+
+async def _image_body_response(
+    request: Request, content_hash: Optional[str], data: Optional[bytes], headers: dict, media_type: Optional[str], load,
+):
+    """
+    Send image bytes: from the disk cache as a file response (zero-copy where the server supports
+    the ASGI pathsend extension), else from `data` or `await load()`; fresh bytes are written to the
+    disk cache after the response. Single Range requests get a 206. Returns None if the bytes no longer exist.
+    """
+    disk = image_cache.disk_cache()
+    if data is None and disk is not None:
+        path = await asyncio.to_thread(disk.get, content_hash)
+        if path is not None:
+            if media_type is None:
+                with open(path, "rb") as f:
+                    media_type = images.sniff_media_type(f.read(16))
+            return FileResponse(path, media_type=media_type, headers=headers)
+    if data is None:
+        data = await load()
+        if data is None:
+            return None
+    background = BackgroundTask(disk.put, content_hash, data) if disk is not None else None
+    media_type = media_type or images.sniff_media_type(data)
+    headers["Accept-Ranges"] = "bytes"
+    requested = http_cache.byte_range(request, headers.get("ETag"), len(data))
+    if requested is not None:
+        start, end = requested
+        return Response(
+            content=data[start:end + 1], status_code=206, media_type=media_type,
+            headers=http_cache.range_headers(headers, start, end, len(data)), background=background,
+        )
+    # Binary resim verisini doğrudan döndür
+    return Response(content=data, media_type=media_type, headers=headers, background=background)
+
+
+async def _streaming_image_response(request: Request, meta: images.ImageMeta, headers: dict):
+    """
+    Stream a large image from the database in IMAGE_STREAM_CHUNK_SIZE pieces (substring reads), so
+    a request never holds more than one chunk in memory. Honours single Range requests; a full
+    response is written to the disk cache as it streams. Returns None if the image no longer exists.
+    """
+    size, chunk_size = meta.size, images.IMAGE_STREAM_CHUNK_SIZE
+    requested = http_cache.byte_range(request, headers.get("ETag"), size)
+    start, end = requested or (0, size - 1)
+
+    first = await run_db(
+        images.fetch_image_chunk, meta.image_id, start, min(chunk_size, end - start + 1), meta.content_hash, request=request
+    )
+    if first is None:
+        return None
+    head = first if start == 0 else await run_db(images.fetch_image_chunk, meta.image_id, 0, 16, request=request)
+    disk = image_cache.disk_cache()
+    writer = disk.writer(meta.content_hash) if disk is not None and requested is None else None
+
+    async def body():
+        chunk, offset = first, start + len(first)
+        try:
+            while chunk:
+                if writer is not None:
+                    await asyncio.to_thread(writer.write, chunk)
+                yield chunk
+                if offset > end:
+                    break
+                # Resim akış sırasında değişirse (hash tutmaz) yanıt kısa kesilir; istemci Content-Length'ten anlar
+                chunk = await run_db(
+                    images.fetch_image_chunk, meta.image_id, offset, min(chunk_size, end - offset + 1), meta.content_hash
+                )
+                offset += len(chunk or b"")
+            if writer is not None and offset > end:
+                await asyncio.to_thread(writer.commit)
+        finally:
+            if writer is not None:
+                writer.abort()
+
+    headers["Accept-Ranges"] = "bytes"
+    if requested is not None:
+        return StreamingResponse(
+            body(), status_code=206, media_type=images.sniff_media_type(head or b""),
+            headers=http_cache.range_headers(headers, start, end, size),
+        )
+    headers["Content-Length"] = str(size)
+    return StreamingResponse(body(), media_type=images.sniff_media_type(head or b""), headers=headers)
+
+
+async def _thumbnail_variant_response(
+    request: Request, product_id: int, size: int, version: Optional[str], public: bool, retry: bool = True
+):
+    """
+    Serve the nearest size bucket of the product's first image in the best format the client accepts.
+    A missing variant is rendered on this request and stored; the remaining sizes and formats are
+    queued for the background worker. A `version` matching the first image's content hash makes
+    the response immutable. Returns None if the product has no image.
+    """
+    bucket = thumbnails.nearest_size(size)
+    fmt = thumbnails.negotiate_format(request.headers.get("accept"))
+
+    def variant_etag(meta):
+        return http_cache.make_etag(meta.content_hash)
+
+    key = ("variant", product_id, bucket, fmt)
+    cached = image_cache.meta_cache.get(key)
+    source, meta, data = (*cached, None) if cached else (None, None, None)
+    if meta is None:
+        source, meta, data = await run_db(
+            thumbnails.lookup_thumbnail_variant, product_id, bucket, fmt, _skip_body(request, variant_etag), request=request
+        )
+        if source is None:
+            return None
+    if meta is None:
+        original = await run_db(images.fetch_image_data, source.image_id, request=request)
+        try:
+            data = await asyncio.to_thread(thumbnails.render, original, bucket, fmt)
+        except Exception as e:
+            # Çözülemeyen resim: orijinali olduğu gibi döndür
+            logger.warning(f"⚠️ Thumbnail variant of image {source.image_id} could not be rendered: {e}")
+            return None
+        meta = await run_db(thumbnails.store_variant, source.image_id, bucket, fmt, source.content_hash, data, request=request)
+        thumbnails.submit(source.image_id)
+    image_cache.meta_cache.put(key, (source, meta))
+
+    immutable = version is not None and version == image_links.image_version(source.content_hash)
+    headers = http_cache.validator_headers(variant_etag(meta), meta.updated_at, http_cache.cache_control(public, immutable))
+    headers["Vary"] = "Accept"
+    if http_cache.is_not_modified(request, variant_etag(meta), meta.updated_at):
+        return http_cache.not_modified_response(headers)
+    response = await _image_body_response(
+        request, meta.content_hash, data, headers, meta.media_type,
+        lambda: run_db(thumbnails.fetch_variant_data, source.image_id, bucket, fmt, meta.content_hash, request=request),
+    )
+    if response is None and retry:
+        # Varyant bu arada yeniden üretilmiş (ETag'i artık başka) ya da silinmiş: baştan çöz, gerekirse yeniden üret
+        image_cache.meta_cache.discard(key)
+        return await _thumbnail_variant_response(request, product_id, size, version, public, retry=False)
+    return response
+
+
+def _etag(meta) -> Optional[str]:
+    return http_cache.make_etag(meta.content_hash) if meta.content_hash else None
+
+
+async def _product_images_response(
+    request: Request, product_id: int, image_id: Optional[int], version: Optional[str], url_prefix: str, public: bool,
+):
+    try:
+        if image_id is not None:
+            # Belirli bir resmi getir; v= güncel içerik hash'iyle eşleşiyorsa URL değişmezdir
+            response = await _conditional_image_response(
+                request, product_id, image_id,
+                lambda meta: http_cache.cache_control(public, immutable=version is not None and version == image_links.image_version(meta.content_hash)),
+            )
+            if response is None:
+                raise HTTPException(status_code=404, detail="Belirtilen resim bulunamadı")
+            return response
+
+        # Ürüne ait tüm resimlerin listesini getir
+        results = await run_db(images.list_images, product_id, request=request)
+        if not results:
+            raise HTTPException(status_code=404, detail="Bu ürüne ait resim bulunamadı")
+
+        return {"product_id": product_id, "images": image_links.image_listing(url_prefix, product_id, results)}
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Resim getirme hatası: {str(e)}")
+
+
+async def _product_thumbnail_response(request: Request, product_id: int, size: Optional[int], version: Optional[str], public: bool):
+    try:
+        response = None
+        if size is not None and thumbnails.available():
+            response = await _thumbnail_variant_response(request, product_id, size, version, public)
+        if response is None:
+            # İlk sıradaki resmi getir (image_order'a göre sıralı)
+            response = await _conditional_image_response(
+                request, product_id, None,
+                lambda meta: http_cache.cache_control(public, immutable=version is not None and version == image_links.image_version(meta.content_hash)),
+            )
+        if response is None:
             # Eğer resim bulunamazsa default bir resim döndürülebilir
             # Ya da 404 hatası verilebilir
             raise HTTPException(status_code=404, detail="Bu ürüne ait resim bulunamadı")
-        
-        image_data = result[0]
-        cur.close()
-        conn.close()
-        
-        # Binary resim verisini doğrudan döndür
-        return Response(content=bytes(image_data), media_type="image/png")
-        
+        return response
+
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Thumbnail getirme hatası: {str(e)}")
@@ -0,0 +1,126 @@
+import asyncio
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from fastapi import HTTPException, Request
+
+from app.db.database import db_connection, DB_POOL_MAX_SIZE
+
+logger = logging.getLogger(__name__)
+
+# İş parçacığı sayısı havuz boyutunu aşmamalı; aksi halde iş parçacıkları bağlantı beklerken bloklanır
+DB_EXECUTOR_WORKERS = int(os.getenv("DB_EXECUTOR_WORKERS", str(DB_POOL_MAX_SIZE)))
+DB_QUERY_TIMEOUT = float(os.getenv("DB_QUERY_TIMEOUT", "15"))
+DISCONNECT_POLL_INTERVAL = 0.1
+
+_executor = ThreadPoolExecutor(max_workers=DB_EXECUTOR_WORKERS, thread_name_prefix="db")
+
+
+class QueryTimeout(HTTPException):
+    def __init__(self, timeout: float):
+        super().__init__(status_code=504, detail=f"Veritabanı sorgusu {timeout} saniyede tamamlanamadı")
+
+
+class ClientDisconnected(HTTPException):
+    def __init__(self):
+        super().__init__(status_code=499, detail="İstemci bağlantıyı kapattı")
+
+
+class _RunningQuery:
+    """Tracks the connection a worker is using so the event loop can cancel it."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._conn = None
+        self.cancelled = False
+
+    def attach(self, conn):
+        with self._lock:
+            if self.cancelled:
+                return False
+            self._conn = conn
+            return True
+
+    def detach(self):
+        with self._lock:
+            self._conn = None
+
+    def cancel(self):
+        with self._lock:
+            self.cancelled = True
+            if self._conn is not None:
+                try:
+                    self._conn.cancel()
+                except Exception as e:
+                    logger.warning(f"⚠️ Could not cancel running query: {e}")
+
+
+async def _wait_for_disconnect(request: Request):
+    while not await request.is_disconnected():
+        await asyncio.sleep(DISCONNECT_POLL_INTERVAL)
+
+
+async def run_db(fn, *args, timeout: float = None, request: Request = None, **kwargs):
+    """
+    Run fn(conn, *args, **kwargs) on the bounded database executor with a pooled connection.
+    Args:
+        fn (callable): Blocking function receiving the connection as first argument
+        timeout (float): Seconds for the whole call, enforced both by statement_timeout and client-side cancel
+        request (Request): If given, the query is cancelled when this client disconnects
+    Returns:
+        Whatever fn returns
+    Raises:
+        QueryTimeout: If the query did not finish within the timeout
+        ClientDisconnected: If the client went away before the query finished
+    """
+    timeout = DB_QUERY_TIMEOUT if timeout is None else timeout
+    running = _RunningQuery()
+
+    def work():
+        with db_connection() as conn:
+            if not running.attach(conn):
+                raise asyncio.CancelledError()
+            try:
+                if timeout:
+                    with conn.cursor() as cur:
+                        cur.execute("SET LOCAL statement_timeout = %s", (int(timeout * 1000),))
+                return fn(conn, *args, **kwargs)
+            finally:
+                running.detach()
+
+    loop = asyncio.get_running_loop()
+    future = loop.run_in_executor(_executor, work)
+    waiters = {future}
+    watcher = None
+    if request is not None:
+        watcher = asyncio.ensure_future(_wait_for_disconnect(request))
+        waiters.add(watcher)
+
+    try:
+        done, _ = await asyncio.wait(waiters, timeout=timeout or None, return_when=asyncio.FIRST_COMPLETED)
+    except asyncio.CancelledError:
+        _abandon(running, future)
+        raise
+    finally:
+        if watcher is not None:
+            watcher.cancel()
+
+    if future in done:
+        return future.result()
+
+    _abandon(running, future)
+    if watcher is not None and watcher in done:
+        raise ClientDisconnected()
+    raise QueryTimeout(timeout)
+
+
+def _abandon(running: _RunningQuery, future):
+    running.cancel()
+    # Sonucu artık kimse beklemiyor; "exception was never retrieved" uyarısını engelle
+    future.add_done_callback(lambda f: f.cancelled() or f.exception())
+
+
+def shutdown_executor():
+    _executor.shutdown(wait=False, cancel_futures=True)
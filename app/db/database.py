@@ -1,16 +1,31 @@
 import psycopg2
 import logging
+import threading
+from contextlib import contextmanager
 from dotenv import load_dotenv
 import os
 from pathlib import Path
 
+from app.db.pool import ConnectionPool, PooledConnection
+
 dotenv_path = Path(__file__).resolve().parent.parent.parent / "config" / ".env"
 load_dotenv(dotenv_path)
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-def get_db_connection():
+DB_POOL_MIN_SIZE = int(os.getenv("DB_POOL_MIN_SIZE", "1"))
+DB_POOL_MAX_SIZE = int(os.getenv("DB_POOL_MAX_SIZE", "10"))
+DB_POOL_MAX_LIFETIME = float(os.getenv("DB_POOL_MAX_LIFETIME", "1800"))
+DB_POOL_HEALTH_CHECK_AFTER = float(os.getenv("DB_POOL_HEALTH_CHECK_AFTER", "5"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "10"))
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def connect(connection_factory=PooledConnection):
+    """Open a new, unpooled database connection."""
     try:
         conn = psycopg2.connect(
             host=os.getenv("DB_HOST"),
@@ -18,7 +33,8 @@ def get_db_connection():
             user=os.getenv("DB_USER"),
             password=os.getenv("DB_PASSWORD"),
             port=os.getenv("DB_PORT"),
-            options="-c client_encoding=UTF8"
+            options="-c client_encoding=UTF8",
+            connection_factory=connection_factory
         )
         logger.info("✅ Database connection successful")
         return conn
@@ -31,3 +47,61 @@ def get_db_connection():
     except Exception as e:
         logger.error(f"❌ Unexpected error: {e}")
         raise
+
+
+def get_pool() -> ConnectionPool:
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ConnectionPool(
+                    connect,
+                    min_size=DB_POOL_MIN_SIZE,
+                    max_size=DB_POOL_MAX_SIZE,
+                    max_lifetime=DB_POOL_MAX_LIFETIME,
+                    health_check_after=DB_POOL_HEALTH_CHECK_AFTER,
+                    timeout=DB_POOL_TIMEOUT,
+                )
+    return _pool
+
+
+def open_pool():
+    """Warm up the pool to its minimum size. Called on application startup."""
+    get_pool().open()
+
+
+def close_pool():
+    """Close all pooled connections. Called on application shutdown."""
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.closeall()
+            _pool = None
+
+
+def get_db_connection():
+    """
+    Check out a connection from the pool.
+    Calling close() on the returned connection gives it back to the pool.
+    """
+    return get_pool().getconn()
+
+
+@contextmanager
+def db_connection():
+    """Context manager that always returns the connection to the pool."""
+    conn = get_db_connection()
+    try:
+        yield conn
+    finally:
+        conn.close()
+
+
+def get_db():
+    """FastAPI dependency yielding a pooled connection for the request."""
+    with db_connection() as conn:
+        yield conn
+
+
+def pool_stats() -> dict:
+    return get_pool().stats()
@@ -0,0 +1,230 @@
+import time
+import logging
+import threading
+from collections import deque, OrderedDict
+
+import psycopg2
+import psycopg2.extensions
+
+logger = logging.getLogger(__name__)
+
+
+class PoolError(Exception):
+    """Raised when the pool cannot hand out a connection."""
+
+
+class PoolTimeout(PoolError):
+    """Raised when no connection became available within the checkout timeout."""
+
+
+class PooledConnection(psycopg2.extensions.connection):
+    """
+    psycopg2 connection that remembers the pool it belongs to.
+
+    Calling close() on a pooled connection returns it to the pool instead of
+    closing the socket, so existing `conn.close()` call sites keep working.
+    Use discard() to really close it.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.pool = None
+        self.created_at = time.monotonic()
+        self.last_used_at = self.created_at
+        # Bu oturumda PREPARE edilmiş ifadelerin adları (bkz. app/db/statements.py)
+        self.prepared_statements = OrderedDict()
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.putconn(self)
+        else:
+            super().close()
+
+    def discard(self):
+        self.pool = None
+        super().close()
+
+
+class ConnectionPool:
+    """
+    Thread-safe PostgreSQL connection pool.
+
+    Args:
+        connect (callable): Opens a new PooledConnection
+        min_size (int): Connections opened eagerly by open()
+        max_size (int): Upper bound on open connections
+        max_lifetime (float): Seconds after which a connection is recycled
+        health_check_after (float): Idle seconds after which a connection is pinged on checkout
+        timeout (float): Default seconds to wait for a free connection
+    """
+
+    def __init__(
+        self,
+        connect,
+        min_size: int = 1,
+        max_size: int = 10,
+        max_lifetime: float = 1800.0,
+        health_check_after: float = 5.0,
+        timeout: float = 10.0,
+    ):
+        if min_size < 0 or max_size < 1 or min_size > max_size:
+            raise ValueError("Invalid pool size: min_size must be between 0 and max_size")
+        self._connect = connect
+        self.min_size = min_size
+        self.max_size = max_size
+        self.max_lifetime = max_lifetime
+        self.health_check_after = health_check_after
+        self.timeout = timeout
+
+        self._idle = deque()
+        self._in_use = set()
+        self._size = 0
+        self._closed = False
+        self._cond = threading.Condition()
+        self._counters = {
+            "connections_opened": 0,
+            "connections_closed": 0,
+            "connections_recycled": 0,
+            "failed_health_checks": 0,
+            "checkouts": 0,
+            "waits": 0,
+            "timeouts": 0,
+        }
+
+    def open(self):
+        """Open min_size connections up front."""
+        conns = []
+        try:
+            for _ in range(self.min_size - self._size):
+                conns.append(self.getconn())
+        finally:
+            for conn in conns:
+                self.putconn(conn)
+
+    def getconn(self, timeout: float = None):
+        """
+        Check out a healthy connection, waiting up to `timeout` seconds.
+        Raises:
+            PoolTimeout: If the pool stays exhausted for the whole timeout
+        """
+        timeout = self.timeout if timeout is None else timeout
+        deadline = time.monotonic() + timeout
+
+        while True:
+            conn = None
+            with self._cond:
+                if self._closed:
+                    raise PoolError("Connection pool is closed")
+                if self._idle:
+                    conn = self._idle.pop()
+                elif self._size < self.max_size:
+                    self._size += 1
+                else:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._counters["timeouts"] += 1
+                        raise PoolTimeout(f"No database connection available after {timeout}s")
+                    self._counters["waits"] += 1
+                    self._cond.wait(remaining)
+                    continue
+
+            if conn is None:
+                try:
+                    conn = self._open_connection()
+                except Exception:
+                    with self._cond:
+                        self._size -= 1
+                        self._cond.notify()
+                    raise
+            elif not self._is_usable(conn):
+                self._discard(conn)
+                continue
+
+            with self._cond:
+                self._in_use.add(conn)
+                self._counters["checkouts"] += 1
+            conn.pool = self
+            return conn
+
+    def putconn(self, conn):
+        """Return a connection to the pool. Returning it twice is a no-op."""
+        with self._cond:
+            if conn not in self._in_use:
+                return
+            self._in_use.discard(conn)
+
+        if conn.closed or self._closed or self._expired(conn):
+            self._discard(conn)
+            return
+
+        if conn.get_transaction_status() != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+            try:
+                conn.rollback()
+            except psycopg2.Error:
+                self._discard(conn)
+                return
+
+        conn.last_used_at = time.monotonic()
+        with self._cond:
+            self._idle.append(conn)
+            self._cond.notify()
+
+    def closeall(self):
+        """Close idle connections and refuse new checkouts; busy ones close when returned."""
+        with self._cond:
+            self._closed = True
+            idle = list(self._idle)
+            self._idle.clear()
+            self._cond.notify_all()
+        for conn in idle:
+            self._discard(conn)
+
+    def stats(self) -> dict:
+        with self._cond:
+            return {
+                "min_size": self.min_size,
+                "max_size": self.max_size,
+                "size": self._size,
+                "idle": len(self._idle),
+                "in_use": len(self._in_use),
+                **self._counters,
+            }
+
+    def _open_connection(self):
+        conn = self._connect()
+        with self._cond:
+            self._counters["connections_opened"] += 1
+        return conn
+
+    def _expired(self, conn) -> bool:
+        return self.max_lifetime > 0 and time.monotonic() - conn.created_at > self.max_lifetime
+
+    def _is_usable(self, conn) -> bool:
+        if conn.closed:
+            return False
+        if self._expired(conn):
+            with self._cond:
+                self._counters["connections_recycled"] += 1
+            return False
+        if time.monotonic() - conn.last_used_at < self.health_check_after:
+            return True
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SELECT 1")
+            conn.rollback()
+            return True
+        except psycopg2.Error as e:
+            logger.warning(f"⚠️ Dropping unhealthy pooled connection: {e}")
+            with self._cond:
+                self._counters["failed_health_checks"] += 1
+            return False
+
+    def _discard(self, conn):
+        try:
+            conn.discard()
+        except Exception:
+            pass
+        with self._cond:
+            self._size -= 1
+            self._counters["connections_closed"] += 1
+            self._cond.notify()
@@ -0,0 +1,31 @@
+-- Katalog değişikliklerini bellek içi puanlama motoruna bildirir (bkz. app/services/catalog_sync.py).
+-- product satırları için 'p:<id>', product_features satırları için 'f:<id>' gönderilir.
+-- Aynı transaction içindeki tekrar eden bildirimler Postgres tarafından birleştirilir.
+
+CREATE OR REPLACE FUNCTION notify_catalog_product_change() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'DELETE' THEN
+        PERFORM pg_notify('catalog_changes', 'p:' || OLD.id);
+    ELSE
+        PERFORM pg_notify('catalog_changes', 'p:' || NEW.id);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION notify_catalog_features_change() RETURNS trigger AS $$
+BEGIN
+    PERFORM pg_notify('catalog_changes', 'f:' || NEW.id);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS product_catalog_notify ON product;
+CREATE TRIGGER product_catalog_notify
+    AFTER INSERT OR UPDATE OR DELETE ON product
+    FOR EACH ROW EXECUTE FUNCTION notify_catalog_product_change();
+
+DROP TRIGGER IF EXISTS product_features_catalog_notify ON product_features;
+CREATE TRIGGER product_features_catalog_notify
+    AFTER INSERT OR UPDATE ON product_features
+    FOR EACH ROW EXECUTE FUNCTION notify_catalog_features_change();
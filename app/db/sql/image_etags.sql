@@ -0,0 +1,29 @@
+-- Ürün resimleri için HTTP önbellek doğrulayıcıları (ETag / Last-Modified).
+-- Resim endpoint'leri bu kolonlara ihtiyaç duyar; uygulamayı güncellemeden önce bir kez çalıştırın.
+-- sha256() PostgreSQL 11+ gerektirir.
+
+ALTER TABLE product_images ADD COLUMN IF NOT EXISTS content_hash text;
+ALTER TABLE product_images ADD COLUMN IF NOT EXISTS updated_at timestamptz NOT NULL DEFAULT now();
+
+-- Mevcut resimler için hash'i bir kez hesapla (büyük tablolarda gruplar halinde çalıştırılabilir)
+UPDATE product_images SET content_hash = encode(sha256(image_data), 'hex') WHERE content_hash IS NULL;
+
+-- Resim verisi her yazıldığında hash ve değişiklik zamanı güncellenir
+CREATE OR REPLACE FUNCTION product_images_set_content_hash() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'INSERT' OR NEW.image_data IS DISTINCT FROM OLD.image_data THEN
+        NEW.content_hash := encode(sha256(NEW.image_data), 'hex');
+        NEW.updated_at := now();
+    END IF;
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS product_images_content_hash ON product_images;
+CREATE TRIGGER product_images_content_hash
+    BEFORE INSERT OR UPDATE ON product_images
+    FOR EACH ROW EXECUTE FUNCTION product_images_set_content_hash();
+
+-- Thumbnail ve resim listesi sorguları blob'a dokunmadan bu indeksten cevaplanır
+CREATE INDEX IF NOT EXISTS product_images_product_order_idx
+    ON product_images (product_id, image_order) INCLUDE (id, content_hash, updated_at);
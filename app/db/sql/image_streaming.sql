@@ -0,0 +1,7 @@
+-- Büyük resimlerin parça parça (substring) okunması için depolama ayarı.
+-- Opsiyoneldir; app/db/sql/image_etags.sql'den sonra bir kez çalıştırın.
+-- EXTERNAL, TOAST'ta sıkıştırmasız saklama demektir: substring() yalnızca istenen parçaları okur,
+-- sıkıştırılmış değerlerde ise her parça için tüm blob açılır. JPEG/PNG/WebP zaten sıkıştırılmış
+-- olduğundan disk kullanımı pratikte değişmez. Ayar yeni yazılan değerlere uygulanır.
+
+ALTER TABLE product_images ALTER COLUMN image_data SET STORAGE EXTERNAL;
@@ -0,0 +1,14 @@
+-- Küçültülmüş thumbnail varyantları (ör. 128/256/512 px, WebP/JPEG).
+-- app/db/sql/image_etags.sql'den sonra bir kez çalıştırın.
+-- source_hash, varyantın üretildiği orijinal resmin content_hash'idir; orijinal değişince varyant yeniden üretilir.
+
+CREATE TABLE IF NOT EXISTS product_image_variants (
+    image_id     integer NOT NULL REFERENCES product_images(id) ON DELETE CASCADE,
+    size         integer NOT NULL,
+    format       text    NOT NULL,
+    source_hash  text    NOT NULL,
+    content_hash text    NOT NULL,
+    data         bytea   NOT NULL,
+    created_at   timestamptz NOT NULL DEFAULT now(),
+    PRIMARY KEY (image_id, size, format)
+);
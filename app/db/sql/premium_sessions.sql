@@ -0,0 +1,13 @@
+-- Premium sohbet oturumları (SESSION_BACKEND=postgres için). Bir kez çalıştırın.
+-- data: {"filled_table": {...}, "language": "tr", "shown_ids": [...]}
+-- SESSION_TTL'den uzun süre kullanılmayan satırlar okunmaz; ara sıra temizlemek için:
+--   DELETE FROM premium_sessions WHERE updated_at < now() - interval '1 day';
+
+CREATE TABLE IF NOT EXISTS premium_sessions (
+    id         text PRIMARY KEY,
+    uid        text,
+    data       jsonb       NOT NULL,
+    updated_at timestamptz NOT NULL DEFAULT now()
+);
+
+CREATE INDEX IF NOT EXISTS premium_sessions_updated_at_idx ON premium_sessions (updated_at);
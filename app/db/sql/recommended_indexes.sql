@@ -0,0 +1,9 @@
+-- Öneri sorguları için önerilen indeksler.
+-- Canlı veritabanında tabloyu kilitlememek için CREATE INDEX CONCURRENTLY ile ve transaction dışında çalıştırın.
+
+-- Bütçe aralığı (p.price >= $1 AND p.price <= $2) önce bu indeksle daraltılır;
+-- skor yalnızca aralıktaki ürünler için hesaplanır.
+CREATE INDEX IF NOT EXISTS product_price_idx ON product (price);
+
+-- product JOIN product_features birleşimi için
+CREATE INDEX IF NOT EXISTS product_features_id_idx ON product (product_features_id);
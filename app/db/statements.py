@@ -0,0 +1,130 @@
+import os
+import hashlib
+import threading
+from collections import OrderedDict
+
+STATEMENT_CACHE_SIZE = int(os.getenv("STATEMENT_CACHE_SIZE", "512"))
+MAX_PREPARED_PER_CONNECTION = int(os.getenv("MAX_PREPARED_PER_CONNECTION", "256"))
+
+
+class CompiledQuery:
+    """SQL text with $n placeholders plus the Postgres types of its parameters."""
+
+    __slots__ = ("name", "sql", "param_types")
+
+    def __init__(self, name: str, sql: str, param_types: list):
+        self.name = name
+        self.sql = sql
+        self.param_types = param_types
+
+
+class StatementBuilder:
+    """Hands out $n placeholders while a statement is being compiled."""
+
+    def __init__(self):
+        self.param_types = []
+
+    def param(self, pg_type: str) -> str:
+        self.param_types.append(pg_type)
+        return f"${len(self.param_types)}"
+
+
+class StatementCache:
+    """
+    LRU cache of compiled statements keyed by a signature tuple.
+
+    The signature must capture everything that changes the SQL text (selected columns,
+    algorithm, which optional clauses are present); values such as budgets, excluded ids
+    and limits are bound as parameters. Each statement is PREPAREd once per connection.
+    """
+
+    def __init__(self, max_size: int = STATEMENT_CACHE_SIZE):
+        self.max_size = max_size
+        self._compiled = OrderedDict()
+        self._lock = threading.Lock()
+        self._counters = {"hits": 0, "misses": 0, "prepares": 0, "executes": 0, "deallocations": 0}
+
+    def compile(self, signature: tuple, build) -> CompiledQuery:
+        """
+        Return the cached statement for `signature`, calling build(StatementBuilder) -> sql on a miss.
+        """
+        with self._lock:
+            compiled = self._compiled.get(signature)
+            if compiled is not None:
+                self._compiled.move_to_end(signature)
+                self._counters["hits"] += 1
+                return compiled
+            self._counters["misses"] += 1
+
+        builder = StatementBuilder()
+        sql = build(builder)
+        name = "hq_" + hashlib.sha1(repr(signature).encode()).hexdigest()[:16]
+        compiled = CompiledQuery(name, sql, builder.param_types)
+
+        with self._lock:
+            self._compiled[signature] = compiled
+            self._compiled.move_to_end(signature)
+            while len(self._compiled) > self.max_size:
+                self._compiled.popitem(last=False)
+        return compiled
+
+    def execute(self, cur, compiled: CompiledQuery, params: list):
+        """Execute a compiled statement, preparing it on this connection first if needed."""
+        prepared = getattr(cur.connection, "prepared_statements", None)
+        if prepared is None:
+            # Havuz dışı bağlantı: hazırlanmış ifade takibi yok, parametreli sorgu olarak çalıştır
+            cur.execute(_to_pyformat(compiled), {f"p{i}": v for i, v in enumerate(params, 1)})
+            return
+
+        if compiled.name in prepared:
+            prepared.move_to_end(compiled.name)
+        else:
+            if len(prepared) >= MAX_PREPARED_PER_CONNECTION:
+                oldest, _ = prepared.popitem(last=False)
+                cur.execute(f"DEALLOCATE {oldest}")
+                self._count("deallocations")
+            types = f" ({', '.join(compiled.param_types)})" if compiled.param_types else ""
+            cur.execute(f"PREPARE {compiled.name}{types} AS {compiled.sql}")
+            prepared[compiled.name] = True
+            self._count("prepares")
+
+        args = f" ({', '.join(['%s'] * len(params))})" if params else ""
+        cur.execute(f"EXECUTE {compiled.name}{args}", params)
+        self._count("executes")
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self._counters["hits"] + self._counters["misses"]
+            return {
+                "size": len(self._compiled),
+                "max_size": self.max_size,
+                **self._counters,
+                "hit_rate": round(self._counters["hits"] / lookups, 4) if lookups else 0.0,
+            }
+
+    def _count(self, key: str):
+        with self._lock:
+            self._counters[key] += 1
+
+
+def _to_pyformat(compiled: CompiledQuery) -> str:
+    sql = compiled.sql
+    # $10'un $1 olarak değiştirilmemesi için büyükten küçüğe
+    for i in range(len(compiled.param_types), 0, -1):
+        sql = sql.replace(f"${i}", f"%(p{i})s")
+    return sql
+
+
+statement_cache = StatementCache()
+
+
+def compile_statement(signature: tuple, build) -> CompiledQuery:
+    return statement_cache.compile(signature, build)
+
+
+def execute_statement(cur, compiled: CompiledQuery, params: list):
+    statement_cache.execute(cur, compiled, params)
+
+
+def statement_stats() -> dict:
+    return statement_cache.stats()
@@ -1,5 +1,15 @@
 from fastapi import FastAPI
 from app.api.routes import router
+from app.db.database import open_pool, close_pool
+from app.db.async_db import shutdown_executor
+from app.services.catalog_sync import init_catalog, stop_catalog_sync
+from app.services.result_cache import RESULT_CACHE_ENABLED
+from app.services.thumbnails import start_thumbnail_worker, stop_thumbnail_worker
+from app.services.image_cache import open_disk_cache
+from app.services.llm import close_client
+from app.services import identity
+from app.services.llm_cache import open_llm_cache, close_llm_cache
+from app.services.id_tokens import start_key_refresh, stop_key_refresh
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.openapi.utils import get_openapi
 
@@ -13,6 +23,29 @@ app = FastAPI(
 
 app.include_router(router, prefix="/api")
 
+@app.on_event("startup")
+def on_startup():
+    open_pool()
+    init_catalog(track_versions=RESULT_CACHE_ENABLED)
+    start_thumbnail_worker()
+    open_disk_cache()
+    open_llm_cache()
+    start_key_refresh()
+
+@app.on_event("shutdown")
+def on_shutdown():
+    stop_catalog_sync()
+    stop_thumbnail_worker()
+    shutdown_executor()
+    close_pool()
+    close_llm_cache()
+    stop_key_refresh()
+
+@app.on_event("shutdown")
+async def close_http_clients():
+    await close_client()
+    await identity.close_client()
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],  # Geliştirme için * bırakabiliriz
@@ -1,3 +1,4 @@
+import asyncio
 from fastapi import Request, HTTPException, status, Depends
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 from app.services.firebase import verify_token, signin_with_email_password
@@ -10,7 +11,8 @@ async def get_current_user(token: str = Depends(oauth2_scheme)):
     """
     
     try:
-        decoded_token = verify_token(token)
+        # Sertifika indirme ya da firebase_admin çağrısı olay döngüsünü bloklamasın
+        decoded_token = await asyncio.to_thread(verify_token, token)
         return decoded_token
     except Exception as e:
         raise HTTPException(
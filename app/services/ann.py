@@ -0,0 +1,245 @@
+import os
+import time
+import logging
+import threading
+from typing import Optional
+
+import numpy as np
+
+from app.services.catalog import CatalogSnapshot
+from app.services.features import FEATURE_COLUMNS, FEATURE_INDEX, FEATURE_WEIGHTS, NORMALIZE
+
+logger = logging.getLogger(__name__)
+
+# Yaklaşık en yakın komşu (IVF) modu; yalnızca SCORING_ENGINE=memory ile kullanılır ve sonuçlar
+# tam tarama ile birebir aynı olmayabilir. Varsayılan kapalı.
+ANN_ENABLED = os.getenv("ANN_ENABLED", "false").lower() == "true"
+# Liste sayısı; 0 ise katalog boyutuna göre seçilir (~4 * sqrt(N))
+ANN_LISTS = int(os.getenv("ANN_LISTS", "0"))
+# Sorgu başına taranan liste sayısı: büyüdükçe recall artar, gecikme artar
+ANN_NPROBE = int(os.getenv("ANN_NPROBE", "64"))
+ANN_KMEANS_ITERS = int(os.getenv("ANN_KMEANS_ITERS", "10"))
+ANN_TRAIN_SAMPLE = int(os.getenv("ANN_TRAIN_SAMPLE", "100000"))
+ANN_REFRESH_INTERVAL = float(os.getenv("ANN_REFRESH_INTERVAL", "3600"))
+ANN_MAX_PENDING_CHANGES = int(os.getenv("ANN_MAX_PENDING_CHANGES", "5000"))
+ANN_CHECK_INTERVAL = float(os.getenv("ANN_CHECK_INTERVAL", "60"))
+_ASSIGN_CHUNK = 65536
+
+_WEIGHTS = np.array([FEATURE_WEIGHTS[c] for c in FEATURE_COLUMNS], dtype=np.float32)
+
+
+def term_vectors(features: np.ndarray) -> np.ndarray:
+    """
+    Per-column distance terms w * (10 - x)^2 / 100. The distance of a query is the sum of the
+    terms of its selected columns, i.e. a linear function of these vectors.
+    """
+    diff = NORMALIZE - features
+    return diff * diff * _WEIGHTS / np.float32(NORMALIZE * NORMALIZE)
+
+
+def _assign(vectors: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+    """Nearest centroid of every vector, computed in chunks to bound memory."""
+    norms = (centroids * centroids).sum(axis=1)
+    labels = np.empty(len(vectors), dtype=np.int64)
+    for start in range(0, len(vectors), _ASSIGN_CHUNK):
+        block = vectors[start:start + _ASSIGN_CHUNK]
+        labels[start:start + _ASSIGN_CHUNK] = np.argmin(norms - 2.0 * block @ centroids.T, axis=1)
+    return labels
+
+
+def kmeans(vectors: np.ndarray, n_lists: int, iters: int = ANN_KMEANS_ITERS, seed: int = 0) -> np.ndarray:
+    """Plain Lloyd's k-means; empty clusters are re-seeded from random vectors."""
+    rng = np.random.default_rng(seed)
+    centroids = vectors[rng.choice(len(vectors), n_lists, replace=False)].copy()
+    for _ in range(iters):
+        labels = _assign(vectors, centroids)
+        counts = np.bincount(labels, minlength=n_lists)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, labels, vectors)
+        empty = counts == 0
+        centroids[~empty] = sums[~empty] / counts[~empty, None]
+        if empty.any():
+            centroids[empty] = vectors[rng.choice(len(vectors), int(empty.sum()), replace=False)]
+    return centroids
+
+
+class IvfIndex:
+    """
+    Inverted-file index over the live rows of one snapshot lineage.
+
+    Rows are clustered by their distance-term vectors. A query over a column subset ranks the
+    lists by the summed centroid terms of those columns (the mean member distance of the list)
+    and only the rows of the nprobe best lists are scored exactly. Rows patched in after the build
+    are always scored as well.
+    """
+
+    def __init__(self, centroids: np.ndarray, offsets: np.ndarray, rows: np.ndarray, loaded_at: float, changed_count: int):
+        self.centroids = centroids
+        self.offsets = offsets
+        self.rows = rows
+        self.loaded_at = loaded_at
+        self.changed_count = changed_count
+        self.built_at = time.time()
+
+    @property
+    def n_lists(self) -> int:
+        return len(self.centroids)
+
+    def matches(self, snapshot: CatalogSnapshot) -> bool:
+        return snapshot.loaded_at == self.loaded_at
+
+    def pending_changes(self, snapshot: CatalogSnapshot) -> int:
+        return len(snapshot.changed_rows) - self.changed_count
+
+    def candidates(
+        self, snapshot: CatalogSnapshot, cols: list, limit: int,
+        min_budget=None, max_budget=None, nprobe: int = ANN_NPROBE,
+    ) -> np.ndarray:
+        """
+        Live candidate rows inside the budget from the nprobe closest lists. More lists are probed
+        while fewer than `limit` candidates are found, so a narrow budget does not under-fill.
+        """
+        idx = [FEATURE_INDEX[c] for c in cols]
+        order = np.argsort(self.centroids[:, idx].sum(axis=1), kind="stable")
+
+        found, count, probed = [], 0, 0
+        changed = snapshot.changed_rows[self.changed_count:]
+        if len(changed):
+            found.append(_filter(snapshot, np.unique(changed), min_budget, max_budget))
+            count += len(found[-1])
+        stale = changed if len(changed) else None
+        for lst in order:
+            if probed >= nprobe and count >= limit:
+                break
+            rows = self.rows[self.offsets[lst]:self.offsets[lst + 1]]
+            if stale is not None:
+                rows = rows[~np.isin(rows, stale)]
+            rows = _filter(snapshot, rows, min_budget, max_budget)
+            found.append(rows)
+            count += len(rows)
+            probed += 1
+        return np.concatenate(found) if found else np.empty(0, dtype=np.int64)
+
+
+def _filter(snapshot: CatalogSnapshot, rows: np.ndarray, min_budget=None, max_budget=None) -> np.ndarray:
+    keep = snapshot.active[rows]
+    if min_budget is not None:
+        keep &= snapshot.prices[rows] >= min_budget
+    if max_budget is not None:
+        keep &= snapshot.prices[rows] <= max_budget
+    return rows[keep]
+
+
+def default_lists(n: int) -> int:
+    return max(1, min(n, int(4 * np.sqrt(n))))
+
+
+def build_index(snapshot: CatalogSnapshot, n_lists: int = ANN_LISTS, train_sample: int = ANN_TRAIN_SAMPLE, seed: int = 0) -> IvfIndex:
+    """Train k-means on a sample of the live rows, then assign every live row to a list."""
+    started = time.monotonic()
+    live = snapshot.active_rows()
+    live = np.arange(len(snapshot)) if live is None else live
+    vectors = term_vectors(snapshot.features[live])
+    n_lists = min(n_lists or default_lists(len(live)), max(1, len(live)))
+
+    rng = np.random.default_rng(seed)
+    sample = vectors if len(vectors) <= train_sample else vectors[rng.choice(len(vectors), train_sample, replace=False)]
+    centroids = kmeans(sample, n_lists, seed=seed)
+    labels = _assign(vectors, centroids)
+
+    order = np.argsort(labels, kind="stable")
+    offsets = np.concatenate([[0], np.cumsum(np.bincount(labels, minlength=n_lists))]).astype(np.int64)
+    # Liste sıralaması yalnızca üyelerin ortalamasına bakar; merkezleri son atamaya göre güncelle
+    counts = np.diff(offsets)
+    sums = np.zeros_like(centroids)
+    np.add.at(sums, labels, vectors)
+    centroids[counts > 0] = sums[counts > 0] / counts[counts > 0, None]
+
+    index = IvfIndex(centroids, offsets, live[order], snapshot.loaded_at, len(snapshot.changed_rows))
+    logger.info(f"✅ ANN index built: {len(live)} products in {n_lists} lists in {time.monotonic() - started:.2f}s")
+    return index
+
+
+class AnnRefresher:
+    """Background job that rebuilds the IVF index after a full reload, periodically, or after many patches."""
+
+    def __init__(self, get_snapshot):
+        self._get_snapshot = get_snapshot
+        self._thread = None
+        self._stop = threading.Event()
+        self.index: Optional[IvfIndex] = None
+        self.stats = {"builds": 0, "queries": 0, "last_build_seconds": None}
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="ann-index", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=ANN_CHECK_INTERVAL)
+
+    def refresh(self):
+        snapshot = self._get_snapshot()
+        if snapshot is None:
+            return
+        index = self.index
+        if index is not None and index.matches(snapshot):
+            stale = time.time() - index.built_at >= ANN_REFRESH_INTERVAL
+            if not stale and index.pending_changes(snapshot) <= ANN_MAX_PENDING_CHANGES:
+                return
+        started = time.monotonic()
+        self.index = build_index(snapshot)
+        self.stats["builds"] += 1
+        self.stats["last_build_seconds"] = round(time.monotonic() - started, 3)
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.refresh()
+            except Exception as e:
+                logger.error(f"❌ ANN index refresh failed: {e}")
+            self._stop.wait(ANN_CHECK_INTERVAL)
+
+    def status(self) -> dict:
+        snapshot = self._get_snapshot()
+        index = self.index
+        status = {**self.stats, "nprobe": ANN_NPROBE}
+        if index is not None:
+            status.update({
+                "lists": index.n_lists,
+                "built_at": index.built_at,
+                "current": snapshot is not None and index.matches(snapshot),
+            })
+        return status
+
+
+_refresher: Optional[AnnRefresher] = None
+
+
+def start_refresher(get_snapshot):
+    global _refresher
+    if not ANN_ENABLED or _refresher is not None:
+        return
+    _refresher = AnnRefresher(get_snapshot)
+    _refresher.start()
+
+
+def stop_refresher():
+    if _refresher is not None:
+        _refresher.stop()
+
+
+def lookup(snapshot: CatalogSnapshot, cols: list, filters: dict, limit: int) -> Optional[np.ndarray]:
+    """ANN candidate rows for a query, or None when the index is off or not built for this snapshot."""
+    if _refresher is None:
+        return None
+    index = _refresher.index
+    if index is None or not index.matches(snapshot):
+        return None
+    _refresher.stats["queries"] += 1
+    return index.candidates(snapshot, cols, limit, filters.get("min_budget"), filters.get("max_budget"))
+
+
+def ann_status() -> Optional[dict]:
+    return _refresher.status() if _refresher is not None else None
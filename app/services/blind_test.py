@@ -1,21 +1,17 @@
-from typing import List, Optional
-from fastapi import APIRouter, HTTPException, Query
+from typing import Dict, List, Optional
+import numpy as np
+from fastapi import APIRouter, HTTPException, Query, Depends, Request
 from app.schemas.schemas import FeatureInput, BlindTestSubmission
-from app.db.database import get_db_connection
+from app.db.database import db_connection, get_db
+from app.db.statements import compile_statement, execute_statement
+from app.services import scoring
+from app.services.features import FEATURE_COLUMNS, FEATURE_INDEX
+from app.services.result_cache import cached_call
 
 router = APIRouter()
 
 def map_features(input: FeatureInput) -> dict:
-    base_keys = [
-        "age_0_2", "age_3_5", "age_6_12", "age_13_18", "age_19_29", "age_30_45", "age_45_65", "age_65_plus",
-        "gender_male", "gender_female",
-        "special_birthday", "special_anniversary", "special_valentines", "special_new_year",
-        "special_house_warming", "special_mothers_day", "special_fathers_day",
-        "interest_sports", "interest_music", "interest_books", "interest_technology",
-        "interest_travel", "interest_art", "interest_food", "interest_fitness", "interest_health",
-        "interest_photography", "interest_fashion", "interest_pets", "interest_home_decor", "interest_movies_tv"
-    ]
-    mapped = dict.fromkeys(base_keys, 0.0)
+    mapped = dict.fromkeys(FEATURE_COLUMNS, 0.0)
     if input.age:
         mapped[f"age_{input.age}"] = 1.0
     if input.gender:
@@ -28,36 +24,30 @@ def map_features(input: FeatureInput) -> dict:
             mapped[key] = 1.0
     return mapped
 
-def run_algorithm(
-    conn,
-    mapped_features: dict,
-    algo: str,
-    exclude_ids: List[int] = [],
-    min_budget: Optional[float] = None,
-    max_budget: Optional[float] = None
-) -> List[dict]:
-    cur = conn.cursor()
+NORMALIZE = 10.0
+EPS       = 1e-6
 
-    NORMALIZE = 10.0
-    EPS       = 1e-6
+ALGORITHMS = {"algorithm_1": "algo1", "algorithm_2": "algo2", "algorithm_3": "algo3"}
 
-    W = {
+def algorithm_weights(mapped_features: dict) -> dict:
+    return {
         **{k: 2.0 for k in mapped_features if k.startswith("age")},
         **{k: 4.0 for k in mapped_features if k.startswith("gender")},
         **{k: 1.0 for k in mapped_features if k.startswith("special")},
         **{k: 1.0 for k in mapped_features if k.startswith("interest")},
     }
 
-    selected_cols = [k for k, v in mapped_features.items() if v > 0]
-    if not selected_cols:
-        return []                    
+def selected_feature_columns(mapped_features: dict) -> List[str]:
+    # special_other'ın product_features'ta kolonu yok
+    return [k for k, v in mapped_features.items() if v > 0 and k in FEATURE_INDEX]
 
+def score_expression(algo: str, selected_cols: List[str], W: dict) -> str:
     if algo == "algo1":
         parts = [
             f"({W[c]} * (COALESCE({c},0)/{NORMALIZE}))"
             for c in selected_cols
         ]
-        score_expr = " + ".join(parts)
+        return " + ".join(parts)
 
     elif algo == "algo2":
         dot_parts  = [f"(COALESCE({c},0)/{NORMALIZE})" for c in selected_cols]
@@ -68,7 +58,7 @@ def run_algorithm(
                                  for c in selected_cols])
         prod_norm  = f"SQRT({prod_sq} + {EPS})"
 
-        score_expr = f"(({dot_expr}) / ({user_norm} * {prod_norm}))"
+        return f"(({dot_expr}) / ({user_norm} * {prod_norm}))"
 
     else:
         diff_parts = [
@@ -76,37 +66,81 @@ def run_algorithm(
             for c in selected_cols
         ]
         diff_sum   = " + ".join(diff_parts)
-        score_expr = f"(1 / (1 + SQRT({diff_sum})))"
+        return f"(1 / (1 + SQRT({diff_sum})))"
 
+def filter_clauses(
+    stmt,
+    exclude_ids: List[int] = [],
+    min_budget: Optional[float] = None,
+    max_budget: Optional[float] = None
+) -> str:
     price_clause = ""
     if min_budget is not None:
-        price_clause += f" AND p.price >= {min_budget}"
+        price_clause += f" AND p.price >= {stmt.param('numeric')}"
     if max_budget is not None:
-        price_clause += f" AND p.price <= {max_budget}"
+        price_clause += f" AND p.price <= {stmt.param('numeric')}"
 
     exclude_clause = ""
     if exclude_ids:
-        exclude_clause = f" AND p.id NOT IN ({', '.join(str(i) for i in exclude_ids)})"
-
-    query = f"""
-        SELECT p.id,
-               p.product_name,
-               p.price,
-               ({score_expr}) AS score
-        FROM product p
-        JOIN product_features pf ON p.product_features_id = pf.id
-        WHERE 1=1 {price_clause} {exclude_clause}
-        ORDER BY score DESC
-        LIMIT 5
-    """
+        exclude_clause = f" AND p.id <> ALL({stmt.param('bigint[]')})"
+
+    return f"{price_clause} {exclude_clause}"
+
+def filter_signature(
+    exclude_ids: List[int] = [],
+    min_budget: Optional[float] = None,
+    max_budget: Optional[float] = None
+) -> tuple:
+    return (min_budget is not None, max_budget is not None, bool(exclude_ids))
 
+def filter_params(
+    exclude_ids: List[int] = [],
+    min_budget: Optional[float] = None,
+    max_budget: Optional[float] = None
+) -> list:
+    params = [v for v in (min_budget, max_budget) if v is not None]
+    if exclude_ids:
+        params.append(list(exclude_ids))
+    return params
+
+def run_algorithm(
+    conn,
+    mapped_features: dict,
+    algo: str,
+    exclude_ids: List[int] = [],
+    min_budget: Optional[float] = None,
+    max_budget: Optional[float] = None,
+    limit: int = 5
+) -> List[dict]:
+    selected_cols = selected_feature_columns(mapped_features)
+    if not selected_cols:
+        return []                    
+
+    def build(stmt):
+        score_expr = score_expression(algo, selected_cols, algorithm_weights(mapped_features))
+        return f"""
+            SELECT p.id,
+                   p.product_name,
+                   p.price,
+                   ({score_expr}) AS score
+            FROM product p
+            JOIN product_features pf ON p.product_features_id = pf.id
+            WHERE 1=1 {filter_clauses(stmt, exclude_ids, min_budget, max_budget)}
+            ORDER BY score DESC, p.id
+            LIMIT {stmt.param("integer")}
+        """
+
+    signature = ("blind_test", algo, tuple(selected_cols), *filter_signature(exclude_ids, min_budget, max_budget))
+    compiled = compile_statement(signature, build)
+
+    cur = conn.cursor()
     try:
-        cur.execute(query)
+        execute_statement(cur, compiled, filter_params(exclude_ids, min_budget, max_budget) + [limit])
         return [
             {
                 "product_id": r[0],
                 "product_name": r[1],
-                "price": float(r[2]),
+                "price": float(r[2]) if r[2] is not None else 0.0,
                 "score": float(r[3]),
             }
             for r in cur.fetchall()
@@ -116,21 +150,141 @@ def run_algorithm(
     finally:
         cur.close()
 
-@router.post("/recommendations")
-def get_blind_test_recommendations(features: FeatureInput):
-    conn = get_db_connection()
-    mapped = map_features(features)
-    results = {
-        "algorithm_1": run_algorithm(conn, mapped, "algo1", [], features.min_budget, features.max_budget),
-        "algorithm_2": run_algorithm(conn, mapped, "algo2", [], features.min_budget, features.max_budget),
-        "algorithm_3": run_algorithm(conn, mapped, "algo3", [], features.min_budget, features.max_budget),
+def run_all_algorithms(
+    conn,
+    mapped_features: dict,
+    exclude_ids: List[int] = [],
+    min_budget: Optional[float] = None,
+    max_budget: Optional[float] = None,
+    limit: int = 5
+) -> Dict[str, List[dict]]:
+    """
+    Scores all three algorithms in a single scan of product JOIN product_features.
+    The scored rows are materialized once by the CTE and each algorithm takes its own top-N
+    from it, so the result is identical to three run_algorithm calls.
+    """
+    selected_cols = selected_feature_columns(mapped_features)
+    if not selected_cols:
+        return {name: [] for name in ALGORITHMS}
+
+    def build(stmt):
+        W = algorithm_weights(mapped_features)
+        score_columns = ",\n                       ".join(
+            f"({score_expression(algo, selected_cols, W)}) AS {algo}"
+            for algo in ALGORITHMS.values()
+        )
+        where = filter_clauses(stmt, exclude_ids, min_budget, max_budget)
+        limit_param = stmt.param("integer")
+        # UNION ALL çıktısının sırası garanti değil; her algoritmanın sırası rank ile korunur
+        top_n = "\n                UNION ALL\n                ".join(
+            f"(SELECT '{name}' AS algo, id, product_name, price, {algo} AS score, "
+            f"row_number() OVER (ORDER BY {algo} DESC, id) AS rank "
+            f"FROM scored ORDER BY {algo} DESC, id LIMIT {limit_param})"
+            for name, algo in ALGORITHMS.items()
+        )
+        return f"""
+            WITH scored AS (
+                SELECT p.id,
+                       p.product_name,
+                       p.price,
+                       {score_columns}
+                FROM product p
+                JOIN product_features pf ON p.product_features_id = pf.id
+                WHERE 1=1 {where}
+            )
+            SELECT algo, id, product_name, price, score
+            FROM (
+                {top_n}
+            ) top_n
+            ORDER BY algo, rank
+        """
+
+    signature = ("blind_test_all", tuple(selected_cols), *filter_signature(exclude_ids, min_budget, max_budget))
+    compiled = compile_statement(signature, build)
+    params = filter_params(exclude_ids, min_budget, max_budget) + [limit]
+
+    results = {name: [] for name in ALGORITHMS}
+    cur = conn.cursor()
+    try:
+        execute_statement(cur, compiled, params)
+        for r in cur.fetchall():
+            results[r[0]].append({
+                "product_id": r[1],
+                "product_name": r[2],
+                "price": float(r[3]) if r[3] is not None else 0.0,
+                "score": float(r[4]),
+            })
+        return results
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        cur.close()
+
+def score_all_in_memory(
+    mapped_features: dict,
+    exclude_ids: List[int] = [],
+    min_budget: Optional[float] = None,
+    max_budget: Optional[float] = None,
+    limit: int = 5
+) -> Dict[str, List[dict]]:
+    """run_all_algorithms over the in-memory catalog snapshot: one pass over the selected columns."""
+    snapshot = scoring.get_snapshot()
+    selected_cols = selected_feature_columns(mapped_features)
+    if not selected_cols:
+        return {name: [] for name in ALGORITHMS}
+
+    rows = scoring.budget_rows(snapshot, min_budget, max_budget)
+    if rows is None:
+        rows = snapshot.active_rows()
+    if rows is None:
+        rows = np.arange(len(snapshot))
+    if exclude_ids:
+        rows = rows[~np.isin(snapshot.ids[rows], exclude_ids)]
+
+    W = algorithm_weights(mapped_features)
+    weights = np.array([W[c] for c in selected_cols], dtype=np.float64)
+    # Ham (ölçeklenmemiş) değerlerle toplanır; tam sayı özelliklerde toplamlar tam çıkar ve
+    # eşit skorlu ürünler SQL'deki gibi id sırasına düşer
+    raw = snapshot.features[np.ix_(rows, [FEATURE_INDEX[c] for c in selected_cols])].astype(np.float64)
+
+    scores = {
+        "algo1": (raw @ weights) / NORMALIZE,
+        "algo2": (raw.sum(axis=1) / NORMALIZE) / (
+            len(selected_cols) ** 0.5 * np.sqrt((raw * raw).sum(axis=1) / (NORMALIZE * NORMALIZE) + EPS)
+        ),
+        "algo3": scoring.scores_from_distances(((NORMALIZE - raw) ** 2) @ weights / (NORMALIZE * NORMALIZE)),
     }
-    conn.close()
+
+    ids = snapshot.ids[rows]
+    results = {}
+    for name, algo in ALGORITHMS.items():
+        top = scoring.rank_top_k(-scores[algo], ids, limit)
+        results[name] = [
+            {
+                "product_id": int(ids[pos]),
+                "product_name": snapshot.names[rows[pos]],
+                "price": 0.0 if np.isnan(snapshot.prices[rows[pos]]) else float(snapshot.prices[rows[pos]]),
+                "score": float(scores[algo][pos]),
+            }
+            for pos in top
+        ]
     return results
 
+@router.post("/recommendations")
+def get_blind_test_recommendations(features: FeatureInput, request: Request):
+    mapped = map_features(features)
+
+    def compute(f, limit):
+        if scoring.engine_enabled():
+            return score_all_in_memory(mapped, [], f["min_budget"], f["max_budget"], limit)
+        with db_connection() as conn:
+            return run_all_algorithms(conn, mapped, [], f["min_budget"], f["max_budget"], limit)
+
+    filters = {**mapped, "min_budget": features.min_budget, "max_budget": features.max_budget}
+    return cached_call("blind_test", filters, 5, compute, request)
+
 @router.post("/submit")
-def submit_blind_test(data: BlindTestSubmission):
-    conn = get_db_connection()
+def submit_blind_test(data: BlindTestSubmission, conn = Depends(get_db)):
     cur = conn.cursor()
     try:
         cur.execute(
@@ -157,11 +311,9 @@ def submit_blind_test(data: BlindTestSubmission):
         raise HTTPException(status_code=500, detail=str(e))
     finally:
         cur.close()
-        conn.close()
 
 @router.get("/previous-sessions")
-def get_previous_sessions(email: Optional[str] = Query(None)):
-    conn = get_db_connection()
+def get_previous_sessions(email: Optional[str] = Query(None), conn = Depends(get_db)):
     cur = conn.cursor()
     try:
         query = """
@@ -190,5 +342,4 @@ def get_previous_sessions(email: Optional[str] = Query(None)):
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
     finally:
-        cur.close()
-        conn.close()
\ No newline at end of file
+        cur.close()
\ No newline at end of file
@@ -0,0 +1,208 @@
+import time
+import logging
+
+import numpy as np
+
+from app.services.features import FEATURE_COLUMNS
+
+logger = logging.getLogger(__name__)
+
+CATALOG_FETCH_SIZE = 10000
+
+_CATALOG_QUERY = f"""
+    SELECT p.id, p.product_name, p.price, p.site, p.link,
+           p.is_last_7_days_lower_price, p.is_last_30_days_lower_price,
+           {", ".join(f"pf.{c}" for c in FEATURE_COLUMNS)}
+    FROM product p
+    JOIN product_features pf ON p.product_features_id = pf.id
+"""
+
+
+_COLUMNS = ("ids", "features", "prices", "names", "sites", "links", "lower_7", "lower_30")
+
+
+class CatalogSnapshot:
+    """
+    Immutable in-memory copy of product + product_features used by the scoring engine.
+
+    features: (N, 31) float32 matrix in FEATURE_COLUMNS order, NULL stored as 0 (COALESCE)
+    prices:   (N,) float64, NULL stored as NaN so that budget comparisons exclude it like SQL does
+    active:   (N,) bool, False for products deleted since the last full load
+    changed_rows: row indices touched by patches since the last full load (loaded_at)
+    Metadata columns are object arrays so they can be fancy-indexed with the result rows.
+
+    Snapshots are never modified in place; patched() returns a new snapshot with a higher
+    version which is then swapped in with a single reference assignment.
+    """
+
+    def __init__(
+        self, ids, features, prices, names, sites, links, lower_7, lower_30,
+        active=None, version: int = 1, loaded_at: float = None, changed_rows=None,
+    ):
+        self.ids = ids
+        self.features = features
+        self.prices = prices
+        self.names = names
+        self.sites = sites
+        self.links = links
+        self.lower_7 = lower_7
+        self.lower_30 = lower_30
+        self.active = np.ones(len(ids), dtype=bool) if active is None else active
+        self.changed_rows = np.empty(0, dtype=np.int64) if changed_rows is None else changed_rows
+        self.version = version
+        self.created_at = time.time()
+        self.loaded_at = loaded_at or self.created_at
+
+        self._id_order = np.argsort(ids, kind="stable")
+        self._sorted_ids = ids[self._id_order]
+        self._active_rows = None if self.active.all() else np.flatnonzero(self.active)
+
+        # Fiyat indeksi: NaN (NULL) fiyatlar sona sıralanır ve hiçbir bütçe aralığına girmez
+        self._price_order = np.argsort(prices, kind="stable")
+        self._sorted_prices = prices[self._price_order]
+        self._priced_count = int(np.count_nonzero(~np.isnan(prices)))
+
+    def __len__(self):
+        return len(self.ids)
+
+    @property
+    def active_count(self) -> int:
+        return len(self.ids) if self._active_rows is None else len(self._active_rows)
+
+    def active_rows(self):
+        """Row indices of live products, or None when every row is live."""
+        return self._active_rows
+
+    def rows_in_price_range(self, min_budget=None, max_budget=None) -> np.ndarray:
+        """
+        Live row indices with min_budget <= price <= max_budget, found by binary search on the
+        price index; the cost depends on the size of the window, not on the catalog size.
+        """
+        sorted_prices = self._sorted_prices[:self._priced_count]
+        lo = 0 if min_budget is None else int(np.searchsorted(sorted_prices, min_budget, side="left"))
+        hi = self._priced_count if max_budget is None else int(np.searchsorted(sorted_prices, max_budget, side="right"))
+        rows = self._price_order[lo:max(lo, hi)]
+        if self._active_rows is not None:
+            rows = rows[self.active[rows]]
+        return rows
+
+    def positions(self, ids) -> np.ndarray:
+        """Row index of each product id, -1 for ids not in the snapshot."""
+        ids = np.asarray(ids, dtype=np.int64)
+        if len(self._sorted_ids) == 0:
+            return np.full(len(ids), -1, dtype=np.int64)
+        i = np.searchsorted(self._sorted_ids, ids)
+        i_clipped = np.minimum(i, len(self._sorted_ids) - 1)
+        found = (i < len(self._sorted_ids)) & (self._sorted_ids[i_clipped] == ids)
+        return np.where(found, self._id_order[i_clipped], -1)
+
+    def patched(self, rows: list, removed_ids=()) -> "CatalogSnapshot":
+        """
+        Return a new snapshot with `rows` (catalog query rows) upserted and `removed_ids` deactivated.
+        Only the arrays are copied; nothing is re-read from the database.
+        """
+        arrays = {k: getattr(self, k).copy() for k in _COLUMNS}
+        active = self.active.copy()
+        touched = [self.changed_rows]
+
+        if rows:
+            update = rows_to_arrays(rows)
+            pos = self.positions(update["ids"])
+            existing = pos >= 0
+            for k in _COLUMNS:
+                arrays[k][pos[existing]] = update[k][existing]
+            active[pos[existing]] = True
+            touched.append(pos[existing])
+
+            new = ~existing
+            if new.any():
+                for k in _COLUMNS:
+                    arrays[k] = np.concatenate([arrays[k], update[k][new]])
+                active = np.concatenate([active, np.ones(int(new.sum()), dtype=bool)])
+                touched.append(np.arange(len(self), len(active), dtype=np.int64))
+
+        if len(removed_ids):
+            pos = self.positions(removed_ids)
+            active[pos[pos >= 0]] = False
+            touched.append(pos[pos >= 0])
+
+        return CatalogSnapshot(
+            **arrays, active=active, version=self.version + 1, loaded_at=self.loaded_at,
+            changed_rows=np.concatenate(touched).astype(np.int64),
+        )
+
+    def status(self) -> dict:
+        now = time.time()
+        return {
+            "version": self.version,
+            "products": self.active_count,
+            "rows": len(self),
+            "loaded_at": self.loaded_at,
+            "updated_at": self.created_at,
+            "age_seconds": round(now - self.created_at, 3),
+            "full_load_age_seconds": round(now - self.loaded_at, 3),
+        }
+
+    def product(self, row: int, score: float) -> dict:
+        """Format one row exactly like crud.fetch_products does."""
+        price = self.prices[row]
+        return {
+            "id": int(self.ids[row]),
+            "name": self.names[row],
+            "price": 0.0 if np.isnan(price) else float(price),
+            "site": self.sites[row] if self.sites[row] is not None else "",
+            "link": self.links[row] if self.links[row] is not None else "",
+            "score": float(score),
+            "is_last_7_days_lower_price": self.lower_7[row],
+            "is_last_30_days_lower_price": self.lower_30[row],
+        }
+
+
+def rows_to_arrays(rows: list) -> dict:
+    """Convert catalog query rows into the column arrays of a CatalogSnapshot."""
+    n = len(rows)
+    features = np.zeros((n, len(FEATURE_COLUMNS)), dtype=np.float32)
+    for i, row in enumerate(rows):
+        features[i] = [v if v is not None else 0 for v in row[7:]]
+    return {
+        "ids": np.fromiter((r[0] for r in rows), dtype=np.int64, count=n),
+        "features": features,
+        "prices": np.fromiter((np.nan if r[2] is None else float(r[2]) for r in rows), dtype=np.float64, count=n),
+        "names": _object_array([r[1] for r in rows]),
+        "sites": _object_array([r[3] for r in rows]),
+        "links": _object_array([r[4] for r in rows]),
+        "lower_7": _object_array([r[5] for r in rows]),
+        "lower_30": _object_array([r[6] for r in rows]),
+    }
+
+
+def _object_array(values: list):
+    arr = np.empty(len(values), dtype=object)
+    arr[:] = values
+    return arr
+
+
+def fetch_changed_rows(conn, product_ids: list, feature_ids: list) -> list:
+    """Catalog rows for the given product ids and for products pointing at the given feature rows."""
+    with conn.cursor() as cur:
+        cur.execute(
+            _CATALOG_QUERY + " WHERE p.id = ANY(%s) OR pf.id = ANY(%s)",
+            (list(product_ids), list(feature_ids))
+        )
+        return cur.fetchall()
+
+
+def load_snapshot(conn, version: int = 1) -> CatalogSnapshot:
+    """Read the whole catalog through a server-side cursor and build a snapshot."""
+    started = time.monotonic()
+    rows = []
+    with conn.cursor(name="catalog_snapshot") as cur:
+        cur.itersize = CATALOG_FETCH_SIZE
+        cur.execute(_CATALOG_QUERY)
+        for row in cur:
+            rows.append(row)
+    conn.rollback()
+
+    snapshot = CatalogSnapshot(**rows_to_arrays(rows), version=version)
+    logger.info(f"✅ Catalog snapshot v{version} loaded: {len(snapshot)} products in {time.monotonic() - started:.2f}s")
+    return snapshot
@@ -0,0 +1,222 @@
+import os
+import time
+import select
+import logging
+import threading
+
+import psycopg2
+import psycopg2.extensions
+
+from app.db.database import connect, db_connection
+from app.services import ann, scoring, segments
+from app.services.catalog import fetch_changed_rows, load_snapshot
+
+logger = logging.getLogger(__name__)
+
+# Tetikleyiciler app/db/sql/catalog_notify.sql ile kurulur
+CATALOG_SYNC_ENABLED = os.getenv("CATALOG_SYNC_ENABLED", "true").lower() == "true"
+CATALOG_NOTIFY_CHANNEL = os.getenv("CATALOG_NOTIFY_CHANNEL", "catalog_changes")
+CATALOG_SYNC_DEBOUNCE = float(os.getenv("CATALOG_SYNC_DEBOUNCE", "1.0"))
+CATALOG_SYNC_MAX_DELAY = float(os.getenv("CATALOG_SYNC_MAX_DELAY", "5.0"))
+CATALOG_SYNC_MAX_BATCH = int(os.getenv("CATALOG_SYNC_MAX_BATCH", "5000"))
+CATALOG_SYNC_RECONNECT_DELAY = 5.0
+
+
+class CatalogSync:
+    """
+    Keeps the scoring snapshot in step with the database through LISTEN/NOTIFY.
+
+    Notifications are batched (debounced) and only the changed products are re-read and
+    patched into a copy of the snapshot, which is then swapped in atomically. After a lost
+    listener connection the missed notifications cannot be recovered, so a full reload is done.
+
+    With track_only=True (SQL scoring) no snapshot is kept; each batch only bumps `version`
+    so that cached recommendation results can be invalidated.
+    """
+
+    def __init__(self, track_only: bool = False):
+        self.track_only = track_only
+        self.version = 0
+        self._conn = None
+        self._thread = None
+        self._stop = threading.Event()
+        self.stats = {
+            "listening": False,
+            "batches": 0,
+            "patched_products": 0,
+            "removed_products": 0,
+            "full_reloads": 0,
+            "last_sync_at": None,
+        }
+
+    def start(self):
+        # Önce LISTEN, sonra yükleme: arada gelen değişiklikler kaçırılmaz
+        self._listen()
+        if not self.track_only:
+            self._reload()
+        self._thread = threading.Thread(target=self._run, name="catalog-sync", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=CATALOG_SYNC_RECONNECT_DELAY)
+        self._close()
+
+    def _listen(self):
+        conn = connect(connection_factory=psycopg2.extensions.connection)
+        conn.set_isolation_level(psycopg2.extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+        with conn.cursor() as cur:
+            cur.execute(f"LISTEN {CATALOG_NOTIFY_CHANNEL}")
+        self._conn = conn
+        self.stats["listening"] = True
+
+    def _close(self):
+        self.stats["listening"] = False
+        if self._conn is not None:
+            try:
+                self._conn.close()
+            except Exception:
+                pass
+            self._conn = None
+
+    def _reload(self):
+        if self.track_only:
+            self.version += 1
+            return
+        current = scoring.get_snapshot()
+        with db_connection() as conn:
+            snapshot = load_snapshot(conn, version=current.version + 1 if current else 1)
+        scoring.set_snapshot(snapshot)
+        self.stats["full_reloads"] += 1
+        self.stats["last_sync_at"] = time.time()
+
+    def _run(self):
+        product_ids, feature_ids = set(), set()
+        batch_started = None
+
+        while not self._stop.is_set():
+            try:
+                if self._conn is None:
+                    self._listen()
+                    self._reload()
+                    product_ids.clear()
+                    feature_ids.clear()
+                    batch_started = None
+
+                timeout = CATALOG_SYNC_DEBOUNCE if batch_started else CATALOG_SYNC_RECONNECT_DELAY
+                readable, _, _ = select.select([self._conn], [], [], timeout)
+                if readable:
+                    self._conn.poll()
+                    while self._conn.notifies:
+                        _parse(self._conn.notifies.pop(0).payload, product_ids, feature_ids)
+                    if (product_ids or feature_ids) and batch_started is None:
+                        batch_started = time.monotonic()
+
+                if batch_started is None:
+                    continue
+                quiet = not readable
+                overdue = time.monotonic() - batch_started >= CATALOG_SYNC_MAX_DELAY
+                full = len(product_ids) + len(feature_ids) >= CATALOG_SYNC_MAX_BATCH
+                if quiet or overdue or full:
+                    self._apply(product_ids, feature_ids)
+                    product_ids, feature_ids = set(), set()
+                    batch_started = None
+
+            except Exception as e:
+                logger.error(f"❌ Catalog sync failed, reconnecting: {e}")
+                self._close()
+                self._stop.wait(CATALOG_SYNC_RECONNECT_DELAY)
+
+    def _apply(self, product_ids: set, feature_ids: set):
+        if self.track_only:
+            self.version += 1
+            self.stats["batches"] += 1
+            self.stats["last_sync_at"] = time.time()
+            return
+
+        snapshot = scoring.get_snapshot()
+        if snapshot is None:
+            return
+        with db_connection() as conn:
+            rows = fetch_changed_rows(conn, product_ids, feature_ids)
+
+        found = {row[0] for row in rows}
+        removed = [i for i in product_ids if i not in found]
+        scoring.set_snapshot(snapshot.patched(rows, removed))
+
+        self.stats["batches"] += 1
+        self.stats["patched_products"] += len(rows)
+        self.stats["removed_products"] += len(removed)
+        self.stats["last_sync_at"] = time.time()
+        logger.info(f"🔄 Catalog snapshot v{snapshot.version + 1}: {len(rows)} patched, {len(removed)} removed")
+
+
+def _parse(payload: str, product_ids: set, feature_ids: set):
+    kind, _, value = payload.partition(":")
+    try:
+        if kind == "p":
+            product_ids.add(int(value))
+        elif kind == "f":
+            feature_ids.add(int(value))
+    except ValueError:
+        logger.warning(f"⚠️ Ignoring malformed catalog notification: {payload}")
+
+
+_sync = None
+
+
+def init_catalog(track_versions: bool = False):
+    """
+    Load the scoring snapshot and, if enabled, keep it in sync. Called on application startup.
+    With SQL scoring and track_versions=True only the catalog version is followed.
+    """
+    global _sync
+    if scoring.SCORING_ENGINE != "memory":
+        if not (CATALOG_SYNC_ENABLED and track_versions):
+            return
+    elif not CATALOG_SYNC_ENABLED:
+        scoring.init_engine()
+        _start_segments()
+        return
+    sync = CatalogSync(track_only=scoring.SCORING_ENGINE != "memory")
+    try:
+        sync.start()
+        _sync = sync
+    except Exception as e:
+        sync.stop()
+        logger.error(f"❌ Catalog sync could not be started: {e}")
+    _start_segments()
+
+
+def _start_segments():
+    if scoring.engine_enabled():
+        segments.start_refresher(scoring.get_snapshot)
+        ann.start_refresher(scoring.get_snapshot)
+
+
+def stop_catalog_sync():
+    segments.stop_refresher()
+    ann.stop_refresher()
+    if _sync is not None:
+        _sync.stop()
+
+
+def catalog_version() -> int:
+    """Version of the catalog as seen by this process; changes whenever a change batch is applied."""
+    snapshot = scoring.get_snapshot()
+    if snapshot is not None:
+        return snapshot.version
+    return _sync.version if _sync else 0
+
+
+def catalog_status() -> dict:
+    snapshot = scoring.get_snapshot()
+    return {
+        "engine": "memory" if scoring.engine_enabled() else "sql",
+        "version": catalog_version(),
+        "snapshot": snapshot.status() if snapshot else None,
+        "sync": dict(_sync.stats) if _sync else None,
+        "segments": segments.segment_status(),
+        "ann": ann.ann_status(),
+    }
@@ -1,93 +1,123 @@
-from app.db.database import get_db_connection
-from fastapi import HTTPException
+import asyncio
+from app.db.database import db_connection
+from app.db.async_db import run_db
+from app.db.statements import compile_statement, execute_statement
+from app.services import image_links, scoring
+from app.services.pagination import decode_cursor, filter_signature, with_next_cursor
+from app.services.result_cache import cached_call_async
+from fastapi import HTTPException, Request
+from app.services.features import FEATURE_WEIGHTS, NORMALIZE, selected_columns
 from typing import Dict
 
-def query_products(filters: Dict[str, bool]):
-    conn = get_db_connection()
-    cur = conn.cursor()
-
-    weights = {
-        "age_0_2": 2.0,
-        "age_3_5": 2.0,
-        "age_6_12": 2.0,
-        "age_13_18": 2.0,
-        "age_19_29": 2.0,
-        "age_30_45": 2.0,
-        "age_45_65": 2.0,
-        "age_65_plus": 2.0,
-        "gender_male": 4.0,
-        "gender_female": 4.0,
-        "special_birthday": 1.0,
-        "special_anniversary": 1.0,
-        "special_valentines": 1.0,
-        "special_new_year": 1.0,
-        "special_house_warming": 1.0,
-        "special_mothers_day": 1.0,
-        "special_fathers_day": 1.0,
-        "interest_sports": 1.0,
-        "interest_music": 1.0,
-        "interest_books": 1.0,
-        "interest_technology": 1.0,
-        "interest_travel": 1.0,
-        "interest_art": 1.0,
-        "interest_food": 1.0,
-        "interest_fitness": 1.0,
-        "interest_health": 1.0,
-        "interest_photography": 1.0,
-        "interest_fashion": 1.0,
-        "interest_pets": 1.0,
-        "interest_home_decor": 1.0,
-        "interest_movies_tv": 1.0
-    }
-
-    NORMALIZE = 10.0
-    expression_parts = []
+def query_products(filters: Dict[str, bool], limit: int = 10, after: tuple = None):
+    if scoring.engine_enabled():
+        return scoring.top_products(filters, limit, after=after)
 
-    for key, value in filters.items():
-        if key in weights and value:
-            weight = weights.get(key, 1.0)
-            expression_parts.append(f"{weight} * POWER((COALESCE({key}, 0)/{NORMALIZE}) - 1, 2)")
-
-    if not expression_parts:
+    query = build_products_query(filters, limit, after)
+    if query is None:
         return {"message": "No filters selected", "products": []}
 
-    diff_sum = " + ".join(expression_parts)
-    score_expr = f"(1 / (1 + SQRT({diff_sum})))"
-
-    price_clause = ""
-    if "min_budget" in filters and filters["min_budget"] is not None:
-        price_clause += f" AND p.price >= {filters['min_budget']}"
-    if "max_budget" in filters and filters["max_budget"] is not None:
-        price_clause += f" AND p.price <= {filters['max_budget']}"
-
-    query = f"""
-        SELECT p.id, p.product_name, p.price, p.site, p.link, ({score_expr}) AS score, is_last_7_days_lower_price, is_last_30_days_lower_price
-        FROM product p
-        JOIN product_features pf ON p.product_features_id = pf.id
-        WHERE 1=1 {price_clause}
-        ORDER BY score DESC
-        LIMIT 10
+    try:
+        with db_connection() as conn:
+            return fetch_products(conn, query)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+async def query_products_async(filters: Dict[str, bool], request: Request = None, timeout: float = None, limit: int = 10, after: tuple = None):
     """
+    Non-blocking variant of query_products for async route handlers.
+    The query runs on the database executor and is cancelled on timeout or client disconnect.
+    """
+    if scoring.engine_enabled():
+        return await asyncio.to_thread(scoring.top_products, filters, limit, None, after)
+
+    query = build_products_query(filters, limit, after)
+    if query is None:
+        return {"message": "No filters selected", "products": []}
 
     try:
-        cur.execute(query)
-        products = cur.fetchall()
-        return {
-            "products": [
-                {
-                    "id": row[0],
-                    "name": row[1], 
-                    "price": float(row[2]) if row[2] is not None else 0.0, 
-                    "site": row[3] if row[3] is not None else "",
-                    "link": row[4] if row[4] is not None else "",
-                    "score": float(row[5]) if row[5] is not None else 0.0,
-                    "is_last_7_days_lower_price": row[6],
-                    "is_last_30_days_lower_price": row[7]
-                } for row in products
-            ],
-        }
+        return await run_db(fetch_products, query, timeout=timeout, request=request)
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
-    finally:
-        cur.close()
-        conn.close()
+
+async def recommend_products(endpoint: str, filters: Dict[str, bool], request: Request = None, limit: int = 10, cursor: str = None):
+    """
+    One page of query_products_async behind the recommendation result cache.
+    `cursor` is the next_cursor of the previous page; the response carries the cursor of the next one.
+    Products carry their thumbnail URL and ETag (see image_links.attach_thumbnails).
+    """
+    signature = filter_signature(endpoint, filters)
+    after = decode_cursor(cursor, signature) if cursor else None
+
+    async def compute(f, n, position):
+        return await query_products_async(f, request=request, limit=n, after=position)
+    result = await cached_call_async(endpoint, filters, limit, compute, request, after=after)
+    return await image_links.attach_thumbnails(with_next_cursor(result, limit, signature), request)
+
+def build_products_query(filters: Dict[str, bool], limit: int = 10, after: tuple = None):
+    """
+    Compile (or fetch from the statement cache) the scoring query for these filters.
+    `after` is a keyset position (score, id); the page then starts right after it, so its cost
+    does not depend on how many pages came before.
+    Returns (CompiledQuery, params), or None when no scoring filter is selected.
+    """
+    cols = selected_columns(filters)
+    if not cols:
+        return None
+
+    min_budget = filters.get("min_budget")
+    max_budget = filters.get("max_budget")
+
+    def build(stmt):
+        expression_parts = [
+            f"{FEATURE_WEIGHTS[key]} * POWER((COALESCE({key}, 0)/{NORMALIZE}) - 1, 2)"
+            for key in cols
+        ]
+        diff_sum = " + ".join(expression_parts)
+        score_expr = f"(1 / (1 + SQRT({diff_sum})))"
+
+        price_clause = ""
+        if min_budget is not None:
+            price_clause += f" AND p.price >= {stmt.param('numeric')}"
+        if max_budget is not None:
+            price_clause += f" AND p.price <= {stmt.param('numeric')}"
+
+        keyset_clause = ""
+        if after is not None:
+            score_param, id_param = stmt.param("double precision"), stmt.param("bigint")
+            keyset_clause = f" AND ({score_expr} < {score_param} OR ({score_expr} = {score_param} AND p.id > {id_param}))"
+
+        return f"""
+            SELECT p.id, p.product_name, p.price, p.site, p.link, ({score_expr}) AS score, is_last_7_days_lower_price, is_last_30_days_lower_price
+            FROM product p
+            JOIN product_features pf ON p.product_features_id = pf.id
+            WHERE 1=1 {price_clause}{keyset_clause}
+            ORDER BY score DESC, p.id
+            LIMIT {stmt.param('integer')}
+        """
+
+    signature = ("products", tuple(cols), min_budget is not None, max_budget is not None, after is not None)
+    params = [v for v in (min_budget, max_budget) if v is not None] + list(after or ()) + [limit]
+    return compile_statement(signature, build), params
+
+def fetch_products(conn, query):
+    compiled, params = query
+    with conn.cursor() as cur:
+        execute_statement(cur, compiled, params)
+        products = cur.fetchall()
+    return {
+        "products": [
+            {
+                "id": row[0],
+                "name": row[1], 
+                "price": float(row[2]) if row[2] is not None else 0.0, 
+                "site": row[3] if row[3] is not None else "",
+                "link": row[4] if row[4] is not None else "",
+                "score": float(row[5]) if row[5] is not None else 0.0,
+                "is_last_7_days_lower_price": row[6],
+                "is_last_30_days_lower_price": row[7]
+            } for row in products
+        ],
+    }
@@ -0,0 +1,34 @@
+# product_features tablosundaki puanlama kolonları ve ağırlıkları.
+# special_other'ın tabloda karşılığı yok; puanlamaya katılmaz.
+
+NORMALIZE = 10.0
+
+AGE_COLUMNS = [
+    "age_0_2", "age_3_5", "age_6_12", "age_13_18", "age_19_29", "age_30_45", "age_45_65", "age_65_plus",
+]
+GENDER_COLUMNS = ["gender_male", "gender_female"]
+SPECIAL_COLUMNS = [
+    "special_birthday", "special_anniversary", "special_valentines", "special_new_year",
+    "special_house_warming", "special_mothers_day", "special_fathers_day",
+]
+INTEREST_COLUMNS = [
+    "interest_sports", "interest_music", "interest_books", "interest_technology",
+    "interest_travel", "interest_art", "interest_food", "interest_fitness", "interest_health",
+    "interest_photography", "interest_fashion", "interest_pets", "interest_home_decor", "interest_movies_tv",
+]
+
+FEATURE_COLUMNS = AGE_COLUMNS + GENDER_COLUMNS + SPECIAL_COLUMNS + INTEREST_COLUMNS
+
+FEATURE_WEIGHTS = {
+    **{c: 2.0 for c in AGE_COLUMNS},
+    **{c: 4.0 for c in GENDER_COLUMNS},
+    **{c: 1.0 for c in SPECIAL_COLUMNS},
+    **{c: 1.0 for c in INTEREST_COLUMNS},
+}
+
+FEATURE_INDEX = {c: i for i, c in enumerate(FEATURE_COLUMNS)}
+
+
+def selected_columns(filters: dict) -> list:
+    """Return the scoring columns switched on in a filter dict, in FEATURE_COLUMNS order."""
+    return [c for c in FEATURE_COLUMNS if filters.get(c)]
@@ -0,0 +1,279 @@
+import os
+import re
+from typing import NamedTuple, Optional, Tuple
+
+from app.services.features import AGE_COLUMNS, GENDER_COLUMNS, INTEREST_COLUMNS
+from app.services.language import lower
+
+# Bu güvenin altındaki kural sonuçları kullanılmaz; o alan LLM'e bırakılır
+RULES_MIN_CONFIDENCE = float(os.getenv("RULES_MIN_CONFIDENCE", "0.8"))
+
+GROUPS = ("age", "gender", "special", "interests", "budget")
+SPECIAL_FIELDS = (
+    "special_birthday", "special_anniversary", "special_valentines", "special_new_year",
+    "special_house_warming", "special_mothers_day", "special_fathers_day", "special_other",
+)
+GROUP_FIELDS = {
+    "age": tuple(AGE_COLUMNS),
+    "gender": tuple(GENDER_COLUMNS),
+    "special": SPECIAL_FIELDS,
+    "interests": tuple(INTEREST_COLUMNS),
+    "budget": ("min_budget", "max_budget"),
+}
+
+# (üst sınır, kolon); 45 yaş hem 30_45 hem 45_65'e girer, küçük olan seçilir
+_AGE_BUCKETS = ((2, "age_0_2"), (5, "age_3_5"), (12, "age_6_12"), (18, "age_13_18"),
+                (29, "age_19_29"), (45, "age_30_45"), (65, "age_45_65"))
+
+# (desen, güven, on yıl mı): "30'lu yaşlar" / "in her 30s" on yılın ortası sayılır
+_AGE_NUMBER_PATTERNS = (
+    (re.compile(r"\b(\d{1,3})\s*(?:yaşında\w*|yaşına\w*|yaş\w*|years?[\s-]*old|yrs?\b|yo\b)"), 0.95, False),
+    (re.compile(r"\b(\d)0\s*'?\s*(?:l[ıiuü]|s)\s*yaş\w*"), 0.85, True),
+    (re.compile(r"\bin\s+(?:his|her|their)\s+(\d)0s\b"), 0.85, True),
+    (re.compile(r"\b(?:he|she|they)(?:'s|\s+is|\s+are|\s+turns?|\s+will\s+be)\s+(\d{1,3})\b(?!\s*(?:tl|lira|\$|dollar))"), 0.85, False),
+)
+# Sayı geçmeyen yaş ifadeleri; yalnızca çok kesin olanlar eşiği geçer
+_AGE_WORD_PATTERNS = (
+    (re.compile(r"\b(?:bebe\w*|baby|babies|newborn|yenidoğan\w*)"), "age_0_2", 0.85),
+    (re.compile(r"\b(?:toddler|anaokul\w*|kreş\w*|preschool\w*)"), "age_3_5", 0.85),
+    (re.compile(r"\b(?:çocuk\w*|kids?|child\w*|ilkokul\w*)"), "age_6_12", 0.6),
+    (re.compile(r"\b(?:genç\w*|ergen\w*|teen\w*|lise\w*|high\s*school)"), "age_13_18", 0.7),
+    (re.compile(r"\b(?:üniversite\w*|college|university)"), "age_19_29", 0.6),
+    (re.compile(r"\b(?:yaşlı\w*|dede\w*|büyükanne\w*|babaanne\w*|anneanne\w*|büyükbaba\w*|ninem\w*|ninesi\w*|"
+                r"elderly|grandfather\w*|grandmother\w*|grandpa\w*|grandma\w*)"), "age_65_plus", 0.85),
+)
+
+# Bileşik ifadeler önce denenir ve eşleşen kısım metinden çıkarılır ("kız arkadaş", "babaanne")
+_GENDER_PATTERNS = (
+    (re.compile(r"\b(?:babaanne\w*|anneanne\w*|kız\s*arkadaş\w*|kız\s*kardeş\w*)"), "gender_female", 0.95),
+    (re.compile(r"\b(?:erkek\s*arkadaş\w*|erkek\s*kardeş\w*)"), "gender_male", 0.95),
+    (re.compile(r"\b(?:erkek\w*|adam\w*|baba\w*|oğl\w*|ağabey\w*|abi(?:m|me|mi|min|ye)?\b|koca(?:m|ma|mı|mın)\b|"
+                r"dede\w*|amca\w*|dayı\w*|büyükbaba\w*|man|men|male|guy|boyfriend|husband|father\w*|dad\w*|"
+                r"my\s+son|grandfather\w*|grandpa\w*|brother\w*|uncle|nephew|he|him|his)\b"), "gender_male", 0.9),
+    (re.compile(r"\b(?:kadın\w*|bayan\w*|anne\w*|kız\w*|abla\w*|karı(?:m|ma|mı|mın)\b|teyze\w*|ninem\w*|"
+                r"woman|women|female|lady|girl\w*|wife|mother\w*|mom\w*|mum|sister\w*|daughter\w*|"
+                r"grandmother\w*|grandma\w*|aunt\w*|niece|she)\b"), "gender_female", 0.9),
+)
+
+_SPECIAL_PATTERNS = (
+    (re.compile(r"\b(?:doğum\s*gün\w*|birthday\w*|bday)"), "special_birthday"),
+    (re.compile(r"\b(?:yıl\s*dönüm\w*|anniversary)"), "special_anniversary"),
+    (re.compile(r"\b(?:sevgililer\s*gün\w*|valentine\w*|14\s*şubat)"), "special_valentines"),
+    (re.compile(r"\b(?:yılbaşı\w*|yeni\s*yıl\w*|new\s*year\w*|christmas|noel\w*)"), "special_new_year"),
+    (re.compile(r"\b(?:yeni\s*ev\w*|ev\s*hediye\w*|taşın\w*|housewarming|house\s*warming|"
+                r"new\s*(?:house|home|apartment|flat)|moved?\s+(?:in|into))"), "special_house_warming"),
+    (re.compile(r"\b(?:anneler\s*gün\w*|mother'?s\s*day)"), "special_mothers_day"),
+    (re.compile(r"\b(?:babalar\s*gün\w*|father'?s\s*day)"), "special_fathers_day"),
+    (re.compile(r"\b(?:özel\s*(?:bir\s*)?gün\w*\s*(?:değil|yok)|özel\s*bir\s*(?:şey|durum)\s*yok|"
+                r"(?:gün\s*)?yok\s*sadece|sadece\s*hediye|no\s*special\s*(?:occasion|day)|not\s*for\s*a\s*special|"
+                r"just\s*because|düğün\w*|nişan\w*|mezuniyet\w*|teşekkür\w*|emeklil\w*|wedding\w*|"
+                r"engagement|graduat\w*|thank\s*you|retirement|retiring|baby\s*shower)"), "special_other"),
+)
+
+_INTEREST_PATTERNS = {
+    "interest_sports": r"spor(?!\s*salon)\w*|futbol\w*|basketbol\w*|voleybol\w*|tenis\w*|yüzme\w*|bisiklet\w*|"
+                       r"sports?|football|soccer|basketball|tennis|cycling|swimming|golf",
+    "interest_music": r"müzi\w*|gitar\w*|piyano\w*|şarkı\w*|konser\w*|plak\w*|music\w*|guitar\w*|piano\w*|concert\w*|vinyl",
+    "interest_books": r"kitap\w*|roman(?!t)\w*|okuma\w*|books?|novels?|reading|reads?|bookworm",
+    "interest_technology": r"teknoloji\w*|bilgisayar\w*|telefon\w*|elektronik\w*|konsol\w*|playstation|tech\w*|"
+                           r"computer\w*|electronic\w*|gadget\w*|video\s*games?|consoles?",
+    "interest_travel": r"seyahat\w*|gezi\w*|gezme\w*|tatil\w*|kamp(?:a|ı|ta|çılık)?|travel\w*|trips?|camping|hiking",
+    "interest_art": r"sanat\w*|resim\w*|çizim\w*|müze\w*|art|arts|artist\w*|drawing|painting|museums?|crafts?",
+    "interest_food": r"yemek\w*|mutfa\w*|aşçı\w*|kahve\w*|cook\w*|kitchen\w*|food\w*|baking|coffee|chef",
+    "interest_fitness": r"spor\s*salon\w*|fitness|gym|koşu\w*|koşma\w*|yoga|pilates|running|workouts?",
+    "interest_health": r"sağlık\w*|health\w*|wellness",
+    "interest_photography": r"fotoğraf\w*|kamera\w*|photo\w*|camera\w*",
+    "interest_fashion": r"moda\w*|giyim\w*|giyin\w*|kıyafet\w*|aksesuar\w*|takı(?:lar\w*)?|fashion\w*|cloth\w*|"
+                        r"dressing|jewel\w*|accessor\w*",
+    "interest_pets": r"evcil\w*|kedi\w*|köpe\w*|pets?|cats?|dogs?|puppy|kitten",
+    "interest_home_decor": r"dekor\w*|bahçe\w*|decor\w*|garden\w*|interior",
+    "interest_movies_tv": r"film\w*|dizi\w*|sinema\w*|netflix|movies?|cinema|tv(?:\s*shows?)?|series",
+}
+_INTEREST_PATTERNS = {field: re.compile(rf"\b(?:{pattern})\b") for field, pattern in _INTEREST_PATTERNS.items()}
+
+_NUM = r"(\d+(?:[.,]\d{3})*(?:[.,]\d+)?)\s*(k\b|bin\b)?"
+_CUR = r"(?:tl\b|lira\w*|₺|try\b|dolar\w*|dollars?\b|usd\b|\$|euro\w*|€)"
+_BUDGET_CONTEXT = re.compile(rf"{_CUR}|\b(?:bütçe\w*|budget\w*|fiyat\w*|price\w*|arası|between|spend\w*|harca\w*)")
+_RANGE = re.compile(rf"(?:between\s+)?\$?{_NUM}\s*{_CUR}?\s*(?:-|–|ile|to|and|ve)\s*\$?{_NUM}\s*{_CUR}?")
+_UPPER = (
+    re.compile(rf"\b(?:under|below|less\s+than|max(?:imum)?|up\s+to|at\s+most|no\s+more\s+than|en\s+fazla|en\s+çok|maksimum)\s+\$?{_NUM}"),
+    re.compile(rf"{_NUM}\s*{_CUR}?\s*'?\w*\s*(?:geçmesin|geçmeyecek|altında\w*|altı\b|az\b|ucuz\w*)"),
+)
+_LOWER = (
+    re.compile(rf"\b(?:over|above|more\s+than|at\s+least|min(?:imum)?|en\s+az)\s+\$?{_NUM}"),
+    re.compile(rf"{_NUM}\s*{_CUR}?\s*'?\w*\s*(?:fazla|yukarı\w*|üstü\w*|üzeri\w*|pahalı\w*)"),
+)
+_SINGLE = (
+    re.compile(rf"\b(?:around|about|approximately|roughly|~)\s*\$?{_NUM}"),
+    re.compile(rf"\b(?:bütçe\w*|budget\w*)(?:\s+is)?\s*:?\s*\$?{_NUM}"),
+    re.compile(rf"\$\s*{_NUM}|{_NUM}\s*{_CUR}"),
+    re.compile(rf"{_NUM}\s*(?:civar\w*|gibi|kadar|'?l[ıi]k)"),
+)
+_CHEAP = re.compile(r"\b(?:ucuz\w*|uygun\s*fiyat\w*|cheap\w*|inexpensive|affordable|budget[\s-]*friendly)")
+_LUXURY = re.compile(r"\b(?:pahalı\w*|lüks\w*|luxur\w*|expensive|premium|fancy)")
+
+
+class RuleExtraction(NamedTuple):
+    filters: dict
+    confidence: dict
+
+    def resolved(self, min_confidence: float = RULES_MIN_CONFIDENCE) -> tuple:
+        return tuple(group for group in GROUPS if self.confidence.get(group, 0.0) >= min_confidence)
+
+
+def _amount(number: str, multiplier: Optional[str]) -> float:
+    if re.fullmatch(r"\d{1,3}(?:[.,]\d{3})+", number):
+        value = float(re.sub(r"[.,]", "", number))
+    else:
+        value = float(number.replace(",", "."))
+    return value * 1000 if multiplier else value
+
+
+def age_bucket(age: int) -> str:
+    for upper, column in _AGE_BUCKETS:
+        if age <= upper:
+            return column
+    return "age_65_plus"
+
+
+def _extract_age(text: str) -> Tuple[Optional[str], float, str]:
+    """
+    Age column, confidence and the text with the numbers of the age phrases blanked out (so they
+    are not read as a budget); their words stay, "she is 40" still tells the gender.
+    """
+    buckets, confidence = set(), 0.0
+    for pattern, score, decade in _AGE_NUMBER_PATTERNS:
+        for match in pattern.finditer(text):
+            age = int(match.group(1))
+            buckets.add(age_bucket(age * 10 + 5 if decade else age))
+            confidence = max(confidence, score)
+        text = pattern.sub(lambda match: re.sub(r"\d", " ", match.group(0)), text)
+    if not buckets:
+        for pattern, column, score in _AGE_WORD_PATTERNS:
+            if pattern.search(text):
+                buckets.add(column)
+                confidence = max(confidence, score)
+    if len(buckets) != 1:
+        return None, (0.3 if buckets else 0.0), text
+    return buckets.pop(), confidence, text
+
+
+def _extract_gender(text: str) -> Tuple[Optional[str], float]:
+    found = {}
+    for pattern, column, score in _GENDER_PATTERNS:
+        if pattern.search(text):
+            found[column] = max(found.get(column, 0.0), score)
+            text = pattern.sub(" ", text)
+    if len(found) != 1:
+        return None, (0.3 if found else 0.0)
+    return next(iter(found.items()))
+
+
+def _extract_special(text: str) -> Tuple[Optional[str], float]:
+    found = [column for pattern, column in _SPECIAL_PATTERNS if pattern.search(text)]
+    specific = [column for column in found if column != "special_other"]
+    if len(specific) == 1:
+        return specific[0], 0.95
+    if specific:
+        return None, 0.3
+    if found:
+        return "special_other", 0.9
+    return None, 0.0
+
+
+def _extract_budget(text: str) -> Tuple[Optional[float], Optional[float], float]:
+    """(min_budget, max_budget, confidence); a single amount becomes a ±20% range like in the LLM prompt."""
+    has_context = _BUDGET_CONTEXT.search(text) is not None
+    if has_context:
+        match = _RANGE.search(text)
+        if match:
+            low, high = _amount(*match.group(1, 2)), _amount(*match.group(3, 4))
+            if low <= high:
+                return low, high, 0.95
+    for pattern in _UPPER:
+        match = pattern.search(text)
+        if match:
+            return 0.0, _amount(*match.group(1, 2)), 0.9
+    for pattern in _LOWER:
+        match = pattern.search(text)
+        if match:
+            return _amount(*match.group(1, 2)), None, 0.9
+    for pattern in _SINGLE:
+        match = pattern.search(text)
+        if match:
+            groups = match.groups()
+            number, multiplier = (groups[0], groups[1]) if groups[0] else (groups[2], groups[3])
+            value = _amount(number, multiplier)
+            # Para birimi ya da bütçe sözü yoksa ("around 50") yaş da olabilir; karar LLM'e kalır
+            return round(value * 0.8), round(value * 1.2), 0.85 if has_context else 0.6
+    # Belirsiz ifadeler LLM kurallarıyla aynı aralığı verir ama emin sayılmaz
+    if _CHEAP.search(text):
+        return 0.0, 500.0, 0.6
+    if _LUXURY.search(text):
+        return 1000.0, None, 0.6
+    if re.search(r"\d", text):
+        # Tek başına bir sayı ("500", "25") yaş da bütçe de olabilir
+        return None, None, 0.5
+    return None, None, 0.0
+
+
+def extract(text: str) -> RuleExtraction:
+    """
+    Deterministic Turkish/English extraction of the filter fields from one message.
+    `filters` holds the values of every group that had any evidence; `confidence` maps each
+    group to 0.0 (nothing found) up to 0.95. Conflicting evidence (two ages, "annem ve babam")
+    gives a low confidence and no value, leaving the group to the LLM.
+    """
+    text = lower(text)
+    filters, confidence = {}, {}
+
+    age, confidence["age"], text = _extract_age(text)
+    if age:
+        filters[age] = True
+
+    gender, confidence["gender"] = _extract_gender(text)
+    if gender:
+        filters[gender] = True
+
+    special, confidence["special"] = _extract_special(text)
+    if special:
+        filters[special] = True
+
+    interests = [field for field, pattern in _INTEREST_PATTERNS.items() if pattern.search(text)]
+    confidence["interests"] = 0.9 if interests else 0.0
+    for field in interests:
+        filters[field] = True
+
+    min_budget, max_budget, confidence["budget"] = _extract_budget(text)
+    if confidence["budget"]:
+        filters["min_budget"], filters["max_budget"] = min_budget, max_budget
+    return RuleExtraction(filters, confidence)
+
+
+def group_filled(table: dict, group: str) -> bool:
+    return any(table.get(field) not in (None, False) for field in GROUP_FIELDS[group])
+
+
+def apply(table: dict, extraction: RuleExtraction, min_confidence: float = RULES_MIN_CONFIDENCE) -> dict:
+    """Copy of `table` with the confidently extracted groups filled in; groups already filled are not changed."""
+    updated = dict(table)
+    for group in extraction.resolved(min_confidence):
+        if group_filled(updated, group):
+            continue
+        for field in GROUP_FIELDS[group]:
+            if field in extraction.filters:
+                updated[field] = extraction.filters[field]
+    return updated
+
+
+def needs_llm(table: dict, extraction: RuleExtraction, min_confidence: float = RULES_MIN_CONFIDENCE) -> bool:
+    """
+    True when the LLM still has work: a required group (age, gender, special, interests) is empty,
+    or the message mentions a group the rules could not resolve confidently.
+    """
+    if not all(group_filled(table, group) for group in ("age", "gender", "special", "interests")):
+        return True
+    return any(
+        0.0 < extraction.confidence.get(group, 0.0) < min_confidence and not group_filled(table, group)
+        for group in GROUPS
+    )
@@ -0,0 +1,110 @@
+import os
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Optional, Tuple
+
+from fastapi import HTTPException, Request, Response
+
+# Sürüm (v=) içermeyen herkese açık resim URL'leri için önbellek süresi
+IMAGE_CACHE_MAX_AGE = int(os.getenv("IMAGE_CACHE_MAX_AGE", "86400"))
+# İçerik hash'ini taşıyan URL'ler değişmez; bir yıl önbellekte kalabilir
+IMAGE_IMMUTABLE_MAX_AGE = int(os.getenv("IMAGE_IMMUTABLE_MAX_AGE", "31536000"))
+
+
+def make_etag(content_hash: str) -> str:
+    return f'"{content_hash}"'
+
+
+def http_date(value: datetime) -> str:
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return format_datetime(value.astimezone(timezone.utc), usegmt=True)
+
+
+def cache_control(public: bool, immutable: bool = False) -> str:
+    """
+    Cache-Control for image responses: public URLs are cached by browsers and CDNs, versioned
+    ones as immutable; authenticated URLs stay private and are revalidated with the ETag.
+    """
+    if not public:
+        return f"private, max-age={IMAGE_IMMUTABLE_MAX_AGE}, immutable" if immutable else "private, no-cache"
+    if immutable:
+        return f"public, max-age={IMAGE_IMMUTABLE_MAX_AGE}, immutable"
+    return f"public, max-age={IMAGE_CACHE_MAX_AGE}"
+
+
+def validator_headers(etag: Optional[str], last_modified: Optional[datetime], cache_control_value: str) -> dict:
+    headers = {"Cache-Control": cache_control_value}
+    if etag:
+        headers["ETag"] = etag
+    if last_modified:
+        headers["Last-Modified"] = http_date(last_modified)
+    return headers
+
+
+def _etag_matches(header: str, etag: str) -> bool:
+    if header.strip() == "*":
+        return True
+    # If-None-Match zayıf karşılaştırma kullanır: W/ öneki yok sayılır
+    candidates = [tag.strip().removeprefix("W/") for tag in header.split(",")]
+    return etag in candidates
+
+
+def is_not_modified(request: Request, etag: Optional[str], last_modified: Optional[datetime]) -> bool:
+    """
+    RFC 9110 conditional GET: If-None-Match wins when present, otherwise If-Modified-Since
+    is compared at one-second resolution.
+    """
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        return etag is not None and _etag_matches(if_none_match, etag)
+
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since and last_modified is not None:
+        try:
+            since = parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+        if since.tzinfo is None:
+            since = since.replace(tzinfo=timezone.utc)
+        if last_modified.tzinfo is None:
+            last_modified = last_modified.replace(tzinfo=timezone.utc)
+        return last_modified.replace(microsecond=0) <= since
+    return False
+
+
+def not_modified_response(headers: dict) -> Response:
+    return Response(status_code=304, headers=headers)
+
+
+def byte_range(request: Request, etag: Optional[str], size: int) -> Optional[Tuple[int, int]]:
+    """
+    The single byte range (start, end inclusive) asked for by a Range header, or None when the
+    whole body is to be sent: no Range, several ranges, or an If-Range that no longer matches.
+    Raises:
+        HTTPException: 416 if the range lies outside the body
+    """
+    header = request.headers.get("range")
+    if not header or not header.startswith("bytes=") or "," in header:
+        return None
+    if_range = request.headers.get("if-range")
+    # If-Range güçlü karşılaştırma ister; tarih içeren If-Range'de tüm gövde gönderilir
+    if if_range is not None and (etag is None or if_range.strip() != etag):
+        return None
+    first, _, last = header[len("bytes="):].strip().partition("-")
+    try:
+        if first:
+            start = int(first)
+            end = min(int(last), size - 1) if last else size - 1
+        else:
+            # bytes=-N: son N bayt
+            start, end = max(size - int(last), 0), size - 1
+    except ValueError:
+        return None
+    if start < 0 or start > end or start >= size:
+        raise HTTPException(status_code=416, headers={"Content-Range": f"bytes */{size}"})
+    return start, end
+
+
+def range_headers(headers: dict, start: int, end: int, size: int) -> dict:
+    return {**headers, "Content-Range": f"bytes {start}-{end}/{size}", "Content-Length": str(end - start + 1)}
@@ -0,0 +1,313 @@
+import os
+import re
+import json
+import time
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from typing import Callable, Optional
+
+import requests
+from google.auth import jwt
+
+logger = logging.getLogger(__name__)
+
+# Yerel doğrulama kapalıysa firebase_admin kullanılır (sonuç yine önbelleğe alınır)
+FIREBASE_LOCAL_VERIFY = os.getenv("FIREBASE_LOCAL_VERIFY", "true").lower() == "true"
+FIREBASE_PROJECT_ID = os.getenv("FIREBASE_PROJECT_ID", "")
+FIREBASE_CERTS_URL = os.getenv(
+    "FIREBASE_CERTS_URL", "https://www.googleapis.com/robot/v1/metadata/x509/securetoken@system.gserviceaccount.com"
+)
+# Doluysa sertifikalar ağdan değil bu dosyadan okunur ({"kid": "-----BEGIN CERTIFICATE-----..."}); test/çevrimdışı için
+FIREBASE_CERTS_FILE = os.getenv("FIREBASE_CERTS_FILE", "")
+# Saniye; sertifikaların süresi dolmadan bu kadar önce arka planda yenilenir
+FIREBASE_CERTS_REFRESH_MARGIN = float(os.getenv("FIREBASE_CERTS_REFRESH_MARGIN", "300"))
+# Saniye; yenileme başarısız olursa süresi dolmuş sertifikalar en fazla bu kadar daha kullanılır
+FIREBASE_CERTS_MAX_STALE = float(os.getenv("FIREBASE_CERTS_MAX_STALE", "21600"))
+FIREBASE_CERTS_TIMEOUT = float(os.getenv("FIREBASE_CERTS_TIMEOUT", "5"))
+TOKEN_CACHE_MAX_ENTRIES = int(os.getenv("TOKEN_CACHE_MAX_ENTRIES", "10000"))
+TOKEN_CLOCK_SKEW = int(os.getenv("TOKEN_CLOCK_SKEW", "0"))
+
+_ISSUER = "https://securetoken.google.com/"
+_MAX_AGE = re.compile(r"max-age=(\d+)")
+# Bilinmeyen "kid" ya da süresi dolmuş sertifika varken arka plan yenilemesi en fazla bu sıklıkta tetiklenir
+_MIN_FORCED_REFRESH_INTERVAL = 30.0
+
+
+class TokenError(Exception):
+    """The ID token is malformed, expired or not signed for this project."""
+
+
+class StaticKeySource:
+    """Fixed signing certificates ({kid: PEM}), e.g. a self-signed pair for offline tests."""
+
+    def __init__(self, certs: dict):
+        self._certs = dict(certs)
+
+    @classmethod
+    def from_file(cls, path: str) -> "StaticKeySource":
+        with open(path) as f:
+            return cls(json.load(f))
+
+    def certs(self) -> dict:
+        return self._certs
+
+    def request_refresh(self):
+        pass
+
+    def start(self):
+        pass
+
+    def stop(self):
+        pass
+
+    def status(self) -> dict:
+        return {"source": "static", "keys": len(self._certs)}
+
+
+class GoogleCertKeySource:
+    """
+    Google's x509 certificates for Firebase ID tokens, fetched over HTTP.
+
+    A background thread refreshes them FIREBASE_CERTS_REFRESH_MARGIN seconds before the
+    Cache-Control max-age runs out, so requests never wait for Google. If a refresh fails the
+    current certificates keep serving for up to FIREBASE_CERTS_MAX_STALE seconds past their
+    expiry (stale-while-revalidate) while the thread keeps retrying. An unknown key id only wakes
+    the thread. Only the very first load, or certificates past the stale limit, block the caller;
+    token verification therefore runs off the event loop (see firebase.get_current_user).
+    """
+
+    def __init__(self, url: str = FIREBASE_CERTS_URL, timeout: float = FIREBASE_CERTS_TIMEOUT):
+        self.url = url
+        self.timeout = timeout
+        self._certs = {}
+        self._expires_at = 0.0
+        self._last_fetch = 0.0
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        self.stats = {"refreshes": 0, "failures": 0, "stale_reads": 0}
+
+    def certs(self) -> dict:
+        now = time.time()
+        if not self._certs:
+            self.refresh()
+        elif now >= self._expires_at:
+            # Süresi dolmuş ama henüz çok eski değilse beklemeden kullan, yenilemeyi arka plana bırak
+            if now < self._expires_at + FIREBASE_CERTS_MAX_STALE:
+                self.stats["stale_reads"] += 1
+                self.request_refresh()
+            else:
+                self.refresh()
+        if not self._certs:
+            raise TokenError("Token signing certificates are not available")
+        return self._certs
+
+    def request_refresh(self):
+        """Wake the background thread to fetch the certificates (at most once per 30 seconds) without waiting for it."""
+        # Yenileme art arda başarısız olurken ya da uydurma "kid"lerle her istek Google'a gitmesin
+        if time.time() - self._last_fetch >= _MIN_FORCED_REFRESH_INTERVAL:
+            self._wake.set()
+        self.start()
+
+    def refresh(self) -> bool:
+        """Fetch the certificates now. Blocking."""
+        with self._lock:
+            self._last_fetch = time.time()
+            try:
+                response = requests.get(self.url, timeout=self.timeout)
+                response.raise_for_status()
+                certs = response.json()
+            except (requests.RequestException, ValueError) as e:
+                self.stats["failures"] += 1
+                logger.warning(f"⚠️ Token signing certificates could not be refreshed: {e}")
+                return False
+            match = _MAX_AGE.search(response.headers.get("cache-control", ""))
+            self._certs = certs
+            self._expires_at = time.time() + (int(match.group(1)) if match else 3600)
+            self.stats["refreshes"] += 1
+            return True
+
+    def start(self):
+        if self._thread is None:
+            self._stop.clear()
+            # İş parçacığı ilk turda zaten indirir
+            self._wake.clear()
+            self._thread = threading.Thread(target=self._run, name="token-certs", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    def _run(self):
+        retry = 5.0
+        while not self._stop.is_set():
+            if self.refresh():
+                retry = 5.0
+                wait = max(self._expires_at - FIREBASE_CERTS_REFRESH_MARGIN - time.time(), 1.0)
+            else:
+                wait, retry = retry, min(retry * 2, 300.0)
+            self._wake.wait(wait)
+            self._wake.clear()
+
+    def status(self) -> dict:
+        return {
+            "source": "google",
+            "keys": len(self._certs),
+            "expires_in": round(self._expires_at - time.time(), 1) if self._certs else None,
+            **self.stats,
+        }
+
+
+class TokenVerifier:
+    """Local Firebase ID token verification: RS256 signature against the key source plus the claim checks firebase_admin does."""
+
+    def __init__(self, project_id: str, keys, clock_skew: int = TOKEN_CLOCK_SKEW):
+        self.project_id = project_id
+        self.keys = keys
+        self.clock_skew = clock_skew
+
+    def verify(self, token: str) -> dict:
+        try:
+            header = jwt.decode_header(token)
+        except (ValueError, TypeError) as e:
+            raise TokenError(f"Malformed token: {e}")
+        kid = header.get("kid")
+        if header.get("alg") != "RS256" or not kid:
+            raise TokenError('Token must be signed with RS256 and carry a "kid" header')
+
+        certs = self.keys.certs()
+        if kid not in certs:
+            # Google anahtarları döndürmüş olabilir; istek beklemez, yeni sertifikalar arka planda indirilir
+            self.keys.request_refresh()
+            raise TokenError(f"Token signed with an unknown key: {kid}")
+
+        try:
+            claims = jwt.decode(token, certs={kid: certs[kid]}, audience=self.project_id,
+                                clock_skew_in_seconds=self.clock_skew)
+        except ValueError as e:
+            raise TokenError(str(e))
+        if claims.get("iss") != _ISSUER + self.project_id:
+            raise TokenError(f'Token has incorrect "iss" claim: {claims.get("iss")}')
+        subject = claims.get("sub")
+        if not isinstance(subject, str) or not subject or len(subject) > 128:
+            raise TokenError('Token has an invalid "sub" claim')
+        claims["uid"] = subject
+        return claims
+
+
+class TokenCache:
+    """
+    Verified ID tokens keyed by the sha256 of the token. An entry lives until the token's own
+    "exp", so a cached answer is exactly what re-verifying would return.
+    """
+
+    def __init__(self, max_entries: int = TOKEN_CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "expired": 0}
+
+    @staticmethod
+    def _key(token: str) -> str:
+        return hashlib.sha256(token.encode("utf-8")).hexdigest()
+
+    def get(self, token: str) -> Optional[dict]:
+        key = self._key(token)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.stats["misses"] += 1
+                return None
+            expires_at, claims = entry
+            if expires_at <= time.time():
+                del self._entries[key]
+                self.stats["expired"] += 1
+                return None
+            self._entries.move_to_end(key)
+            self.stats["hits"] += 1
+            # Çağıran sözlüğü değiştirse de önbellekteki kayıt bozulmasın
+            return dict(claims)
+
+    def put(self, token: str, claims: dict):
+        expires_at = claims.get("exp")
+        if not isinstance(expires_at, (int, float)) or expires_at <= time.time():
+            return
+        with self._lock:
+            self._entries[self._key(token)] = (float(expires_at), dict(claims))
+            self._entries.move_to_end(self._key(token))
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def status(self) -> dict:
+        with self._lock:
+            return {"entries": len(self._entries), "max_entries": self.max_entries, **self.stats}
+
+
+token_cache = TokenCache()
+_verifier: Optional[TokenVerifier] = None
+
+
+def configure(project_id: Optional[str], keys=None):
+    """
+    Verify tokens locally for project_id. keys defaults to FIREBASE_CERTS_FILE when set, Google's
+    certificates otherwise. Without a project id, with FIREBASE_LOCAL_VERIFY=false or against the
+    auth emulator, verify() uses its fallback.
+    """
+    global _verifier
+    project_id = FIREBASE_PROJECT_ID or project_id
+    # Auth emülatörünün token'ları imzasızdır; onları firebase_admin doğrular
+    if not FIREBASE_LOCAL_VERIFY or not project_id or os.getenv("FIREBASE_AUTH_EMULATOR_HOST"):
+        _verifier = None
+        return
+    if keys is None:
+        keys = StaticKeySource.from_file(FIREBASE_CERTS_FILE) if FIREBASE_CERTS_FILE else GoogleCertKeySource()
+    _verifier = TokenVerifier(project_id, keys)
+
+
+def verify(token: str, fallback: Optional[Callable[[str], dict]] = None) -> dict:
+    """
+    Decoded claims of a Firebase ID token, from the cache when this token was verified before.
+    Raises:
+        TokenError: If local verification fails
+    """
+    claims = token_cache.get(token)
+    if claims is not None:
+        return claims
+    if _verifier is not None:
+        claims = _verifier.verify(token)
+    elif fallback is not None:
+        claims = fallback(token)
+    else:
+        raise TokenError("No token verifier configured")
+    token_cache.put(token, claims)
+    return dict(claims)
+
+
+def start_key_refresh():
+    """Start the background certificate refresh. Called on startup."""
+    if _verifier is not None:
+        _verifier.keys.start()
+
+
+def stop_key_refresh():
+    if _verifier is not None:
+        _verifier.keys.stop()
+
+
+def token_status() -> dict:
+    return {
+        "local": _verifier is not None,
+        "keys": _verifier.keys.status() if _verifier is not None else None,
+        "cache": token_cache.status(),
+    }
@@ -0,0 +1,352 @@
+import os
+import re
+import time
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from typing import Iterable, Optional
+
+from app.db.database import db_connection
+
+logger = logging.getLogger(__name__)
+
+# Boş bırakılırsa disk önbelleği kapalıdır
+IMAGE_DISK_CACHE_DIR = os.getenv("IMAGE_DISK_CACHE_DIR", "")
+IMAGE_DISK_CACHE_MAX_BYTES = int(os.getenv("IMAGE_DISK_CACHE_MAX_BYTES", str(1024 ** 3)))
+# true: bir dosya bu süreçte ilk kez servis edilmeden önce sha256'sı doğrulanır
+IMAGE_DISK_CACHE_VERIFY = os.getenv("IMAGE_DISK_CACHE_VERIFY", "true").lower() == "true"
+# Başlangıçta önbelleğe alınacak ürünler: virgülle ayrılmış id'ler veya satır başına bir id içeren dosya
+IMAGE_DISK_CACHE_WARMUP = os.getenv("IMAGE_DISK_CACHE_WARMUP", "")
+IMAGE_DISK_CACHE_WARMUP_FILE = os.getenv("IMAGE_DISK_CACHE_WARMUP_FILE", "")
+# Saniye; resim ve varyant metadata'sı bu süre boyunca veritabanına sorulmadan kullanılır
+IMAGE_META_TTL = float(os.getenv("IMAGE_META_TTL", "60"))
+IMAGE_META_MAX_ENTRIES = int(os.getenv("IMAGE_META_MAX_ENTRIES", "100000"))
+
+_HASH_RE = re.compile(r"^[0-9a-f]{64}$")
+_WARMUP_BATCH = 100
+
+
+class DiskImageCache:
+    """
+    Content-addressed, size-bounded LRU cache of image bytes on local disk.
+
+    Files are named by the sha256 of their content (the content_hash column), so an entry never
+    goes stale: changed images simply get a new name. Bytes are checked against their hash before
+    they are written, and (with verify=True) once more the first time a file is served by this
+    process. The LRU order is kept in memory and rebuilt from file mtimes on startup.
+    """
+
+    def __init__(self, directory: str, max_bytes: int = IMAGE_DISK_CACHE_MAX_BYTES, verify: bool = IMAGE_DISK_CACHE_VERIFY):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.verify = verify
+        self._entries = OrderedDict()
+        self._verified = set()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._counters = {"hits": 0, "misses": 0, "writes": 0, "evictions": 0, "integrity_failures": 0}
+
+    def open(self):
+        """Index the files already on disk, oldest first, and drop leftovers of interrupted writes."""
+        os.makedirs(self.directory, exist_ok=True)
+        found = []
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                path = os.path.join(root, name)
+                if not _HASH_RE.match(name):
+                    _unlink(path)
+                    continue
+                st = os.stat(path)
+                found.append((st.st_mtime, name, st.st_size))
+        with self._lock:
+            for _, name, size in sorted(found):
+                self._entries[name] = size
+                self._bytes += size
+            self._evict()
+        logger.info(f"✅ Image disk cache: {len(self._entries)} files, {self._bytes} bytes in {self.directory}")
+
+    def path(self, content_hash: str) -> str:
+        return os.path.join(self.directory, content_hash[:2], content_hash)
+
+    def contains(self, content_hash: Optional[str]) -> bool:
+        with self._lock:
+            return content_hash in self._entries
+
+    def get(self, content_hash: Optional[str]) -> Optional[str]:
+        """Path of the cached file for a hash, or None on a miss (or if the file failed verification)."""
+        with self._lock:
+            present = content_hash in self._entries
+            if present:
+                self._entries.move_to_end(content_hash)
+            needs_check = present and self.verify and content_hash not in self._verified
+        if present and needs_check and not self._check(content_hash):
+            present = False
+        with self._lock:
+            self._counters["hits" if present else "misses"] += 1
+        if not present:
+            return None
+        path = self.path(content_hash)
+        try:
+            os.utime(path)
+        except OSError:
+            # Dosya dışarıdan silinmiş
+            self._remove(content_hash)
+            return None
+        return path
+
+    def put(self, content_hash: Optional[str], data: bytes):
+        """Store bytes under their hash; bytes that do not match the hash are not cached."""
+        if not content_hash or not _HASH_RE.match(content_hash) or self.contains(content_hash):
+            return
+        if len(data) > self.max_bytes:
+            return
+        if hashlib.sha256(data).hexdigest() != content_hash:
+            with self._lock:
+                self._counters["integrity_failures"] += 1
+            logger.warning(f"⚠️ Image bytes do not match content_hash {content_hash}; not cached")
+            return
+
+        path = self.path(content_hash)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+        self._register(content_hash, len(data))
+
+    def writer(self, content_hash: Optional[str]) -> Optional["CacheFileWriter"]:
+        """Incremental writer for bytes that arrive in chunks, or None if the hash is invalid or already cached."""
+        if not content_hash or not _HASH_RE.match(content_hash) or self.contains(content_hash):
+            return None
+        return CacheFileWriter(self, content_hash)
+
+    def _register(self, content_hash: str, size: int):
+        with self._lock:
+            if content_hash not in self._entries:
+                self._entries[content_hash] = size
+                self._bytes += size
+            self._verified.add(content_hash)
+            self._counters["writes"] += 1
+            self._evict()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self._counters["hits"] + self._counters["misses"]
+            return {
+                "directory": self.directory,
+                "files": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                **self._counters,
+                "hit_rate": round(self._counters["hits"] / lookups, 4) if lookups else 0.0,
+            }
+
+    def _check(self, content_hash: str) -> bool:
+        digest = hashlib.sha256()
+        try:
+            with open(self.path(content_hash), "rb") as f:
+                for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                    digest.update(chunk)
+        except OSError:
+            self._remove(content_hash)
+            return False
+        if digest.hexdigest() != content_hash:
+            logger.warning(f"⚠️ Cached image {content_hash} is corrupt; removing it")
+            with self._lock:
+                self._counters["integrity_failures"] += 1
+            self._remove(content_hash)
+            return False
+        with self._lock:
+            self._verified.add(content_hash)
+        return True
+
+    def _remove(self, content_hash: str):
+        with self._lock:
+            size = self._entries.pop(content_hash, None)
+            if size is not None:
+                self._bytes -= size
+            self._verified.discard(content_hash)
+        _unlink(self.path(content_hash))
+
+    def _evict(self):
+        # self._lock tutulurken çağrılır
+        while self._bytes > self.max_bytes and self._entries:
+            content_hash, size = self._entries.popitem(last=False)
+            self._bytes -= size
+            self._verified.discard(content_hash)
+            self._counters["evictions"] += 1
+            _unlink(self.path(content_hash))
+
+
+class CacheFileWriter:
+    """
+    Writes one cache entry chunk by chunk. The file only becomes visible after commit() has checked
+    the sha256 of everything written against the content hash; abort() discards it.
+    """
+
+    def __init__(self, cache: DiskImageCache, content_hash: str):
+        self.cache = cache
+        self.content_hash = content_hash
+        self._path = cache.path(content_hash)
+        os.makedirs(os.path.dirname(self._path), exist_ok=True)
+        self._tmp = f"{self._path}.{os.getpid()}.{id(self)}.tmp"
+        self._file = open(self._tmp, "wb")
+        self._digest = hashlib.sha256()
+        self._size = 0
+
+    def write(self, chunk: bytes):
+        if self._file is None:
+            return
+        self._size += len(chunk)
+        if self._size > self.cache.max_bytes:
+            self.abort()
+            return
+        self._file.write(chunk)
+        self._digest.update(chunk)
+
+    def commit(self):
+        if self._file is None:
+            return
+        self._file.close()
+        self._file = None
+        if self._digest.hexdigest() != self.content_hash:
+            with self.cache._lock:
+                self.cache._counters["integrity_failures"] += 1
+            logger.warning(f"⚠️ Streamed image bytes do not match content_hash {self.content_hash}; not cached")
+            _unlink(self._tmp)
+            return
+        os.replace(self._tmp, self._path)
+        self.cache._register(self.content_hash, self._size)
+
+    def abort(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+            _unlink(self._tmp)
+
+
+def _unlink(path: str):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+# Negatif kayıt: ürünün (ya da istenen image_id'nin) resmi yok; TTL boyunca tekrar sorulmaz
+NO_IMAGE = object()
+
+
+class MetaCache:
+    """Small LRU + TTL memo of image/variant metadata so that cache hits need no database round-trip."""
+
+    def __init__(self, ttl: float = IMAGE_META_TTL, max_entries: int = IMAGE_META_MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: tuple):
+        if self.ttl <= 0:
+            return None
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def put(self, key: tuple, value):
+        if self.ttl <= 0 or value is None:
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def discard(self, key: tuple):
+        with self._lock:
+            self._entries.pop(key, None)
+
+
+meta_cache = MetaCache()
+_disk: Optional[DiskImageCache] = None
+
+
+def disk_cache() -> Optional[DiskImageCache]:
+    return _disk
+
+
+def open_disk_cache():
+    """Open the disk cache (if configured) and start warming it up in the background. Called on startup."""
+    global _disk
+    if not IMAGE_DISK_CACHE_DIR or _disk is not None:
+        return
+    cache = DiskImageCache(IMAGE_DISK_CACHE_DIR)
+    try:
+        cache.open()
+    except OSError as e:
+        logger.error(f"❌ Image disk cache could not be opened: {e}")
+        return
+    _disk = cache
+
+    product_ids = warmup_product_ids()
+    if product_ids:
+        threading.Thread(target=warm_up, args=(product_ids,), name="image-cache-warmup", daemon=True).start()
+
+
+def warmup_product_ids() -> list:
+    values = [v for v in IMAGE_DISK_CACHE_WARMUP.split(",") if v.strip()]
+    if IMAGE_DISK_CACHE_WARMUP_FILE:
+        try:
+            with open(IMAGE_DISK_CACHE_WARMUP_FILE) as f:
+                values += [line for line in f if line.strip()]
+        except OSError as e:
+            logger.warning(f"⚠️ Image cache warm-up list could not be read: {e}")
+    ids = []
+    for value in values:
+        try:
+            ids.append(int(value.strip()))
+        except ValueError:
+            logger.warning(f"⚠️ Ignoring invalid product id in warm-up list: {value.strip()}")
+    return ids
+
+
+def warm_up(product_ids: Iterable[int]) -> int:
+    """Write every image of the given products to the disk cache; only missing blobs are read. Returns the count."""
+    if _disk is None:
+        return 0
+    started = time.monotonic()
+    product_ids = list(product_ids)
+    written = 0
+    try:
+        for i in range(0, len(product_ids), _WARMUP_BATCH):
+            batch = product_ids[i:i + _WARMUP_BATCH]
+            with db_connection() as conn:
+                with conn.cursor() as cur:
+                    cur.execute(
+                        "SELECT id, content_hash FROM product_images WHERE product_id = ANY(%s)", (batch,)
+                    )
+                    missing = [image_id for image_id, content_hash in cur.fetchall() if not _disk.contains(content_hash)]
+                    if not missing:
+                        continue
+                    cur.execute(
+                        "SELECT content_hash, image_data FROM product_images WHERE id = ANY(%s)", (missing,)
+                    )
+                    for content_hash, image_data in cur:
+                        if image_data is not None:
+                            _disk.put(content_hash, bytes(image_data))
+                            written += 1
+    except Exception as e:
+        logger.error(f"❌ Image cache warm-up failed: {e}")
+    logger.info(f"✅ Image cache warm-up: {written} images for {len(product_ids)} products in {time.monotonic() - started:.2f}s")
+    return written
+
+
+def cache_stats() -> dict:
+    return {"disk": _disk.stats() if _disk else None}
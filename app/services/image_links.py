@@ -0,0 +1,91 @@
+import os
+import logging
+from typing import Dict, Iterable, List, Optional
+
+from fastapi import Request
+
+from app.db.async_db import run_db
+from app.services import http_cache, image_cache, images
+
+logger = logging.getLogger(__name__)
+
+# true: öneri yanıtlarındaki her ürüne thumbnail URL'si ve ETag'i eklenir
+RECOMMENDATION_THUMBNAILS = os.getenv("RECOMMENDATION_THUMBNAILS", "true").lower() == "true"
+# Toplu resim endpoint'lerinde tek istekte sorulabilecek en fazla ürün
+MAX_BATCH_PRODUCTS = int(os.getenv("MAX_BATCH_PRODUCTS", "100"))
+
+PUBLIC_PRODUCTS_PREFIX = "/api/public/products"
+
+
+def image_version(content_hash: Optional[str]) -> Optional[str]:
+    # URL'deki v= parametresi; içerik değişince URL de değişir
+    return content_hash[:16] if content_hash else None
+
+
+def _versioned(url: str, content_hash: Optional[str], separator: str) -> str:
+    return url + (f"{separator}v={image_version(content_hash)}" if content_hash else "")
+
+
+def image_listing(url_prefix: str, product_id: int, rows: List[tuple]) -> List[dict]:
+    """Image list entries with versioned URLs from (image_id, image_order, content_hash) rows."""
+    return [
+        {
+            "image_id": image_id,
+            "order": image_order,
+            "url": _versioned(f"{url_prefix}/{product_id}/images?image_id={image_id}", content_hash, "&"),
+        } for image_id, image_order, content_hash in rows
+    ]
+
+
+def thumbnail_link(url_prefix: str, product_id: int, content_hash: Optional[str]) -> dict:
+    """
+    Versioned thumbnail URL and the ETag the unsized thumbnail is served with. Clients append
+    `&size=` for a resized variant; the URL stays valid (and immutable) until the first image changes.
+    """
+    return {
+        "url": _versioned(f"{url_prefix}/{product_id}/thumbnail", content_hash, "?"),
+        "etag": http_cache.make_etag(content_hash) if content_hash else None,
+    }
+
+
+async def thumbnail_metas(product_ids: Iterable[int], request: Request = None) -> Dict[int, images.ImageMeta]:
+    """
+    First-image metadata of many products. Memoized entries (shared with the thumbnail endpoints)
+    are used as they are; the rest is read in a single query. Products without an image are
+    memoized as image_cache.NO_IMAGE and left out of the result.
+    """
+    metas, missing = {}, []
+    for product_id in product_ids:
+        meta = image_cache.meta_cache.get(("image", product_id, None))
+        if meta is None:
+            missing.append(product_id)
+        elif meta is not image_cache.NO_IMAGE:
+            metas[product_id] = meta
+    if missing:
+        fetched = await run_db(images.fetch_thumbnail_metas, missing, request=request)
+        for product_id in missing:
+            image_cache.meta_cache.put(("image", product_id, None), fetched.get(product_id, image_cache.NO_IMAGE))
+        metas.update(fetched)
+    return metas
+
+
+async def attach_thumbnails(result: dict, request: Request = None) -> dict:
+    """
+    Add a `thumbnail` link (or None) to every product of a recommendation result, so that a
+    result page needs no per-product metadata requests. Failures leave the result unchanged.
+    """
+    products = result.get("products") or []
+    if not RECOMMENDATION_THUMBNAILS or not products:
+        return result
+    try:
+        metas = await thumbnail_metas([p["id"] for p in products], request)
+    except Exception as e:
+        logger.warning(f"⚠️ Thumbnail links could not be added to recommendations: {e}")
+        return result
+    return {
+        **result,
+        "products": [
+            {**p, "thumbnail": thumbnail_link(PUBLIC_PRODUCTS_PREFIX, p["id"], metas[p["id"]].content_hash) if p["id"] in metas else None}
+            for p in products
+        ],
+    }
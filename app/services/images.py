@@ -0,0 +1,140 @@
+import os
+from datetime import datetime
+from typing import Callable, Dict, List, NamedTuple, Optional, Tuple
+
+# content_hash ve updated_at kolonları app/db/sql/image_etags.sql ile eklenir
+
+# Bu boyuttan (bayt) büyük resimler belleğe alınmaz, parça parça okunup akış olarak gönderilir
+IMAGE_STREAM_THRESHOLD = int(os.getenv("IMAGE_STREAM_THRESHOLD", str(1024 * 1024)))
+IMAGE_STREAM_CHUNK_SIZE = int(os.getenv("IMAGE_STREAM_CHUNK_SIZE", str(256 * 1024)))
+
+
+_SIGNATURES = (
+    (b"\x89PNG\r\n\x1a\n", "image/png"),
+    (b"\xff\xd8\xff", "image/jpeg"),
+    (b"GIF87a", "image/gif"),
+    (b"GIF89a", "image/gif"),
+)
+
+
+def sniff_media_type(data: bytes) -> str:
+    """Media type from the file signature; image/png when it is not recognised."""
+    if data[:4] == b"RIFF" and data[8:12] == b"WEBP":
+        return "image/webp"
+    for signature, media_type in _SIGNATURES:
+        if data.startswith(signature):
+            return media_type
+    return "image/png"
+
+
+class ImageMeta(NamedTuple):
+    image_id: int
+    content_hash: Optional[str]
+    updated_at: Optional[datetime]
+    size: Optional[int] = None
+
+
+def is_streamed(meta: ImageMeta) -> bool:
+    return meta.size is not None and meta.size > IMAGE_STREAM_THRESHOLD
+
+
+def fetch_image_meta(conn, product_id: int, image_id: Optional[int] = None) -> Optional[ImageMeta]:
+    """
+    Cache validators and byte size of one product image, or of the first image (by image_order)
+    when image_id is None. The blob itself is not read.
+    """
+    with conn.cursor() as cur:
+        if image_id is None:
+            cur.execute(
+                "SELECT id, content_hash, updated_at, octet_length(image_data) FROM product_images WHERE product_id = %s ORDER BY image_order LIMIT 1",
+                (product_id,)
+            )
+        else:
+            cur.execute(
+                "SELECT id, content_hash, updated_at, octet_length(image_data) FROM product_images WHERE product_id = %s AND id = %s",
+                (product_id, image_id)
+            )
+        result = cur.fetchone()
+    return ImageMeta(*result) if result else None
+
+
+def fetch_image_data(conn, image_id: int) -> Optional[bytes]:
+    """Return the raw bytes of an image, or None if it does not exist."""
+    with conn.cursor() as cur:
+        cur.execute("SELECT image_data FROM product_images WHERE id = %s", (image_id,))
+        result = cur.fetchone()
+    return bytes(result[0]) if result else None
+
+
+def fetch_image_chunk(conn, image_id: int, offset: int, length: int, content_hash: Optional[str] = None) -> Optional[bytes]:
+    """
+    Read `length` bytes of an image starting at the 0-based `offset` without loading the whole blob.
+    With content_hash, None is returned once the image has changed, so a stream never mixes versions.
+    """
+    with conn.cursor() as cur:
+        if content_hash is None:
+            cur.execute(
+                "SELECT substring(image_data FROM %s FOR %s) FROM product_images WHERE id = %s",
+                (offset + 1, length, image_id)
+            )
+        else:
+            cur.execute(
+                "SELECT substring(image_data FROM %s FOR %s) FROM product_images WHERE id = %s AND content_hash = %s",
+                (offset + 1, length, image_id, content_hash)
+            )
+        result = cur.fetchone()
+    return bytes(result[0]) if result else None
+
+
+def fetch_image_if_modified(
+    conn, product_id: int, image_id: Optional[int], not_modified: Callable[[ImageMeta], bool],
+) -> Tuple[Optional[ImageMeta], Optional[bytes]]:
+    """
+    Read an image's metadata and load its bytes only when not_modified(meta) is False.
+    Returns (None, None) if the image does not exist and (meta, None) when the client copy is current
+    or the image is large enough to be streamed (see is_streamed).
+    """
+    meta = fetch_image_meta(conn, product_id, image_id)
+    if meta is None or not_modified(meta) or is_streamed(meta):
+        return meta, None
+    return meta, fetch_image_data(conn, meta.image_id)
+
+
+def list_images(conn, product_id: int) -> List[tuple]:
+    """Return (image_id, image_order, content_hash) rows of a product, ordered by image_order."""
+    with conn.cursor() as cur:
+        cur.execute(
+            "SELECT id, image_order, content_hash FROM product_images WHERE product_id = %s ORDER BY image_order",
+            (product_id,)
+        )
+        return cur.fetchall()
+
+
+def list_images_batch(conn, product_ids: List[int]) -> Dict[int, List[tuple]]:
+    """(image_id, image_order, content_hash) rows of many products in one query, keyed by product id."""
+    listings = {product_id: [] for product_id in product_ids}
+    with conn.cursor() as cur:
+        cur.execute(
+            """
+            SELECT product_id, id, image_order, content_hash FROM product_images
+            WHERE product_id = ANY(%s) ORDER BY product_id, image_order
+            """,
+            (list(product_ids),)
+        )
+        for product_id, image_id, image_order, content_hash in cur.fetchall():
+            listings[product_id].append((image_id, image_order, content_hash))
+    return listings
+
+
+def fetch_thumbnail_metas(conn, product_ids: List[int]) -> Dict[int, ImageMeta]:
+    """Metadata of the first image of each product that has one, in one query."""
+    with conn.cursor() as cur:
+        cur.execute(
+            """
+            SELECT DISTINCT ON (product_id) product_id, id, content_hash, updated_at, octet_length(image_data)
+            FROM product_images
+            WHERE product_id = ANY(%s) ORDER BY product_id, image_order
+            """,
+            (list(product_ids),)
+        )
+        return {row[0]: ImageMeta(*row[1:]) for row in cur.fetchall()}
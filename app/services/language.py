@@ -0,0 +1,135 @@
+import os
+import re
+import math
+import threading
+from collections import OrderedDict
+from typing import NamedTuple, Optional
+
+# Bu güvenin altındaki tespitlerde sohbetin önceki dili, o da yoksa LLM'in cevabı kullanılır
+LANGUAGE_MIN_CONFIDENCE = float(os.getenv("LANGUAGE_MIN_CONFIDENCE", "0.85"))
+LANGUAGE_MEMO_MAX_ENTRIES = int(os.getenv("LANGUAGE_MEMO_MAX_ENTRIES", "10000"))
+
+# Türkçeye özgü harfler (noktasız büyük I İngilizcede de geçtiği için yok)
+_TURKISH_LETTERS = set("çğıöşüÇĞİÖŞÜ")
+# Türk alfabesinde olmayan harfler
+_FOREIGN_LETTERS = set("qwxQWX")
+
+_TURKISH_WORDS = frozenset("""
+    ve bir bu şu için ile çok daha ama de da ki mi mı mu mü ne var yok gibi olsun olarak benim bana beni onun
+    ona her hiç kadar arası arasında civarı civarında yaşında yaş yaşları hediye hediyesi arkadaşım annem babam
+    kardeşim eşim sevgilim kızım oğlum doğum günü yıl dönümü seviyor sever hoşlanır istiyorum arıyorum düşünüyorum
+    evet hayır tamam olur bilmiyorum fark etmez lira tl bütçem bütçe erkek kadın kız çocuk genç yaşlı
+    özel gün spor müzik kitap oyun teknoloji seyahat sanat yemek ucuz pahalı lüks şey bir şey biraz belki
+""".split())
+
+_ENGLISH_WORDS = frozenset("""
+    the a an and or for to of in with my is are was it this that i me he she her his they them you your
+    likes loves enjoys years year old gift present birthday anniversary friend wife husband mother mom father
+    dad brother sister son daughter boyfriend girlfriend want looking something around between budget yes no
+    ok okay not don't what about would like cheap expensive dollars any some really just be have has who
+    man woman boy girl kid young music sports books travel cooking art games under over than maybe sure
+""".split())
+
+_TURKISH_SUFFIXES = ("lar", "ler", "ları", "leri", "yor", "yorum", "mış", "miş", "acak", "ecek", "ında", "inde",
+                     "dan", "den", "tan", "ten", "lık", "lik", "sız", "siz", "ımız", "imiz", "ım", "im")
+_ENGLISH_SUFFIXES = ("ing", "tion", "ness", "ful", "ly", "ed", "'s")
+
+_WORD_RE = re.compile(r"[a-zçğıöşü']+")
+
+_LETTER_WEIGHT = 1.5
+_WORD_WEIGHT = 2.0
+_SUFFIX_WEIGHT = 0.5
+# Bu kadar kısa mesajlarda ("ok", "500 TL", "erkek") sohbetin bilinen dili korunur
+_SHORT_MESSAGE_TOKENS = 2
+
+
+class Detection(NamedTuple):
+    language: Optional[str]
+    confidence: float
+
+
+def lower(text: str) -> str:
+    # Türkçe büyük İ, "i" + birleşik nokta yerine düz "i" olsun
+    return text.replace("İ", "i").lower()
+
+
+def detect(text: str) -> Detection:
+    """
+    Turkish or English from letter, stop-word and suffix evidence. Confidence is the logistic of
+    the evidence margin less one stop word, so a single word ("ok", "tl", "erkek") scores 0.5 and
+    it takes at least two units of evidence to pass LANGUAGE_MIN_CONFIDENCE; no evidence at all
+    gives Detection(None, 0.0).
+    """
+    tr = en = 0.0
+    for ch in text:
+        if ch in _TURKISH_LETTERS:
+            tr += _LETTER_WEIGHT
+        elif ch in _FOREIGN_LETTERS:
+            en += _LETTER_WEIGHT
+
+    for word in _WORD_RE.findall(lower(text)):
+        if word in _TURKISH_WORDS:
+            tr += _WORD_WEIGHT
+        elif word in _ENGLISH_WORDS:
+            en += _WORD_WEIGHT
+        elif len(word) > 4:
+            if word.endswith(_TURKISH_SUFFIXES):
+                tr += _SUFFIX_WEIGHT
+            if word.endswith(_ENGLISH_SUFFIXES):
+                en += _SUFFIX_WEIGHT
+
+    if tr == en == 0:
+        return Detection(None, 0.0)
+    margin = max(min(abs(tr - en) - _WORD_WEIGHT, 50.0), -50.0)
+    confidence = 1 / (1 + math.exp(-margin))
+    return Detection("tr" if tr >= en else "en", confidence)
+
+
+class LanguageMemo:
+    """LRU of the last confidently known language per conversation."""
+
+    def __init__(self, max_entries: int = LANGUAGE_MEMO_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, conversation) -> Optional[str]:
+        with self._lock:
+            language = self._entries.get(conversation)
+            if language is not None:
+                self._entries.move_to_end(conversation)
+            return language
+
+    def put(self, conversation, language: str):
+        with self._lock:
+            self._entries[conversation] = language
+            self._entries.move_to_end(conversation)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+_memo = LanguageMemo()
+
+
+def resolve(text: str, conversation=None) -> Optional[str]:
+    """
+    Language of a message without calling the LLM: the language remembered for the conversation
+    for one or two token answers, else the local detection when it is confident, else the
+    remembered language. None means the caller should ask the LLM (and pass its answer to
+    remember()).
+    """
+    if conversation is not None and len(text.split()) <= _SHORT_MESSAGE_TOKENS:
+        remembered = _memo.get(conversation)
+        if remembered is not None:
+            return remembered
+    detection = detect(text)
+    if detection.language is not None and detection.confidence >= LANGUAGE_MIN_CONFIDENCE:
+        if conversation is not None:
+            _memo.put(conversation, detection.language)
+        return detection.language
+    return _memo.get(conversation) if conversation is not None else None
+
+
+def remember(conversation, language: str):
+    if conversation is not None and language:
+        _memo.put(conversation, language)
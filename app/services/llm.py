@@ -0,0 +1,200 @@
+import os
+import time
+import random
+import asyncio
+import logging
+from typing import Optional
+
+import openai
+
+logger = logging.getLogger(__name__)
+
+# Boşsa OpenAI'nin kendi adresi kullanılır; test için ör. http://127.0.0.1:8900/v1 (benchmarks/fake_openai.py)
+OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL", "") or None
+# Saniye; tek bir denemenin süresi
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "20"))
+# Saniye; sıra bekleme ve tekrar denemeler dahil bir çağrının toplam süresi
+LLM_DEADLINE = float(os.getenv("LLM_DEADLINE", "45"))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "2"))
+LLM_RETRY_BASE_DELAY = float(os.getenv("LLM_RETRY_BASE_DELAY", "0.5"))
+LLM_RETRY_MAX_DELAY = float(os.getenv("LLM_RETRY_MAX_DELAY", "8"))
+# Aynı anda sağlayıcıya gidebilecek en fazla istek; fazlası sırada bekler
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "16"))
+
+# Geçici hatalar: bağlantı/zaman aşımı, 429 ve 5xx
+_RETRYABLE = (openai.APIConnectionError, openai.RateLimitError, openai.InternalServerError, asyncio.TimeoutError)
+
+
+class LlmError(Exception):
+    """The LLM call failed after all retries."""
+
+
+class LlmTimeout(LlmError):
+    """The call's deadline passed (waiting for a slot or for the provider)."""
+
+
+class LlmClient:
+    """
+    Application-scoped async OpenAI client.
+
+    One AsyncOpenAI instance is shared so HTTP connections are kept alive between calls. Every
+    call takes a slot of a global semaphore (bursts queue instead of tripping provider rate
+    limits), each attempt has its own timeout, transient failures are retried with full-jitter
+    exponential backoff (honouring Retry-After), and the whole call, queueing included, is
+    bounded by a deadline.
+    """
+
+    def __init__(
+        self,
+        api_key: Optional[str] = None,
+        base_url: Optional[str] = OPENAI_BASE_URL,
+        max_concurrency: int = LLM_MAX_CONCURRENCY,
+        timeout: float = LLM_TIMEOUT,
+        deadline: float = LLM_DEADLINE,
+        max_retries: int = LLM_MAX_RETRIES,
+    ):
+        # Tekrar denemeler burada yapılır; SDK'nın kendi denemeleri kapalı
+        self._client = openai.AsyncOpenAI(
+            api_key=api_key or os.getenv("OPENAI_API_KEY"), base_url=base_url, timeout=timeout, max_retries=0,
+        )
+        self._slots = asyncio.Semaphore(max_concurrency)
+        self.max_concurrency = max_concurrency
+        self.timeout = timeout
+        self.deadline = deadline
+        self.max_retries = max_retries
+        self.stats = {"calls": 0, "retries": 0, "failures": 0, "timeouts": 0, "in_flight": 0, "waiting": 0}
+
+    async def chat(self, deadline: Optional[float] = None, **kwargs):
+        """
+        chat.completions.create(**kwargs) under the concurrency limit, timeouts and retry policy.
+        Raises:
+            LlmTimeout: If no slot was free or no attempt succeeded before the deadline
+            LlmError: If every retry failed
+            openai.APIStatusError: For non-transient errors (400, 401, ...), which are not retried
+        """
+        deadline_at = time.monotonic() + (self.deadline if deadline is None else deadline)
+        await self._acquire(deadline_at)
+        self.stats["calls"] += 1
+        self.stats["in_flight"] += 1
+        try:
+            attempt = 0
+            while True:
+                try:
+                    return await asyncio.wait_for(
+                        self._client.chat.completions.create(**kwargs), self._attempt_timeout(deadline_at)
+                    )
+                except _RETRYABLE as e:
+                    await self._retry_or_raise(attempt, e, deadline_at)
+                    attempt += 1
+        finally:
+            self.stats["in_flight"] -= 1
+            self._slots.release()
+
+    async def stream(self, deadline: Optional[float] = None, **kwargs):
+        """
+        Streaming chat.completions.create(**kwargs); yields the delta of every chunk (content / refusal).
+        Opening the stream follows the same retry policy as chat; once tokens have arrived a failure
+        is raised as LlmError without retrying. Each chunk must arrive within the attempt timeout.
+        """
+        deadline_at = time.monotonic() + (self.deadline if deadline is None else deadline)
+        await self._acquire(deadline_at)
+        self.stats["calls"] += 1
+        self.stats["in_flight"] += 1
+        response = None
+        try:
+            attempt = 0
+            while response is None:
+                try:
+                    response = await asyncio.wait_for(
+                        self._client.chat.completions.create(stream=True, **kwargs), self._attempt_timeout(deadline_at)
+                    )
+                except _RETRYABLE as e:
+                    await self._retry_or_raise(attempt, e, deadline_at)
+                    attempt += 1
+
+            chunks = response.__aiter__()
+            while True:
+                try:
+                    chunk = await asyncio.wait_for(chunks.__anext__(), self._attempt_timeout(deadline_at))
+                except StopAsyncIteration:
+                    return
+                except asyncio.TimeoutError as e:
+                    self.stats["failures"] += 1
+                    self.stats["timeouts"] += 1
+                    raise LlmTimeout("LLM stream stalled") from e
+                except openai.APIError as e:
+                    self.stats["failures"] += 1
+                    raise LlmError(f"LLM stream failed: {e}") from e
+                if chunk.choices:
+                    yield chunk.choices[0].delta
+        finally:
+            if response is not None:
+                await response.close()
+            self.stats["in_flight"] -= 1
+            self._slots.release()
+
+    def _attempt_timeout(self, deadline_at: float) -> float:
+        return min(self.timeout, max(deadline_at - time.monotonic(), 0.001))
+
+    async def _retry_or_raise(self, attempt: int, error: Exception, deadline_at: float):
+        """Sleep before the next attempt, or raise when retries or time ran out."""
+        delay = self._backoff(attempt, error)
+        out_of_time = time.monotonic() + delay >= deadline_at
+        if attempt >= self.max_retries or out_of_time:
+            self.stats["failures"] += 1
+            if out_of_time or isinstance(error, asyncio.TimeoutError):
+                self.stats["timeouts"] += 1
+                raise LlmTimeout(f"LLM call did not finish in time after {attempt + 1} attempts") from error
+            raise LlmError(f"LLM call failed after {attempt + 1} attempts: {error}") from error
+        self.stats["retries"] += 1
+        logger.warning(f"⚠️ LLM call failed ({type(error).__name__}); retry {attempt + 1} in {delay:.2f}s")
+        await asyncio.sleep(delay)
+
+    async def _acquire(self, deadline_at: float):
+        self.stats["waiting"] += 1
+        try:
+            await asyncio.wait_for(self._slots.acquire(), max(deadline_at - time.monotonic(), 0.001))
+        except asyncio.TimeoutError:
+            self.stats["timeouts"] += 1
+            raise LlmTimeout("No free LLM slot before the deadline")
+        finally:
+            self.stats["waiting"] -= 1
+
+    def _backoff(self, attempt: int, error: Exception) -> float:
+        response = getattr(error, "response", None)
+        retry_after = response.headers.get("retry-after") if response is not None else None
+        if retry_after:
+            try:
+                return min(float(retry_after), LLM_RETRY_MAX_DELAY)
+            except ValueError:
+                pass
+        # Full jitter: aynı anda hata alan istekler aynı anda tekrar denemesin
+        return random.uniform(0, min(LLM_RETRY_MAX_DELAY, LLM_RETRY_BASE_DELAY * 2 ** attempt))
+
+    async def close(self):
+        await self._client.close()
+
+    def status(self) -> dict:
+        return {"max_concurrency": self.max_concurrency, "timeout": self.timeout, "deadline": self.deadline, **self.stats}
+
+
+_client: Optional[LlmClient] = None
+
+
+def client() -> LlmClient:
+    """The shared client, created on first use."""
+    global _client
+    if _client is None:
+        _client = LlmClient()
+    return _client
+
+
+async def close_client():
+    global _client
+    if _client is not None:
+        await _client.close()
+        _client = None
+
+
+def llm_status() -> dict:
+    return _client.status() if _client is not None else {"open": False}
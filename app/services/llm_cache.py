@@ -0,0 +1,243 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import asyncio
+import logging
+import threading
+from collections import OrderedDict
+from typing import Optional
+
+from app.services.language import lower
+
+logger = logging.getLogger(__name__)
+
+LLM_CACHE_ENABLED = os.getenv("LLM_CACHE_ENABLED", "true").lower() == "true"
+LLM_CACHE_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "2048"))
+# Boşsa yalnızca bellek; doluysa SQLite dosyası (yeniden başlatmalarda korunur)
+LLM_CACHE_PATH = os.getenv("LLM_CACHE_PATH", "")
+# Saniye; sınıfa özel süre yoksa kullanılır
+LLM_CACHE_TTL = float(os.getenv("LLM_CACHE_TTL", "3600"))
+# Sınıf başına süre, ör. "premium_turn=86400,other=600"
+LLM_CACHE_TTLS = os.getenv("LLM_CACHE_TTLS", "premium_turn=86400")
+# Disk isabetlerinin used_at güncellemeleri biriktirilir; bir sonraki yazmada veya bu sayıya ulaşınca tek commit ile yazılır
+_USED_AT_BATCH = 256
+
+
+def _parse_ttls(value: str) -> dict:
+    ttls = {}
+    for item in value.split(","):
+        name, _, seconds = item.partition("=")
+        if name.strip() and seconds.strip():
+            try:
+                ttls[name.strip()] = float(seconds)
+            except ValueError:
+                logger.warning(f"⚠️ Ignoring invalid LLM cache TTL: {item.strip()}")
+    return ttls
+
+
+def _normalize(content) -> str:
+    # Büyük/küçük harf ve boşluk farkları aynı anahtarı üretsin
+    return " ".join(lower(content).split()) if isinstance(content, str) else content
+
+
+def prompt_key(model: str, messages: list, **params) -> str:
+    """sha256 of the model, the normalized messages and any other request parameters (response_format, ...)."""
+    normalized = [{**m, "content": _normalize(m.get("content"))} for m in messages]
+    payload = json.dumps({"model": model, "messages": normalized, **params}, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class LlmCache:
+    """
+    Cache of LLM response contents keyed by prompt_key.
+
+    An LRU in memory in front of an optional SQLite file; every entry belongs to a prompt class
+    with its own TTL. Disk reads and writes are meant to run off the event loop (see get/put).
+    The SQLite connection has its own lock so that memory lookups on the event loop never wait
+    for a disk query or commit.
+    """
+
+    def __init__(self, max_entries: int = LLM_CACHE_MAX_ENTRIES, path: str = LLM_CACHE_PATH,
+                 ttl: float = LLM_CACHE_TTL, ttls: Optional[dict] = None):
+        self.max_entries = max_entries
+        self.path = path
+        self.ttl = ttl
+        self.ttls = _parse_ttls(LLM_CACHE_TTLS) if ttls is None else ttls
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._db_lock = threading.Lock()
+        self._db = None
+        # key -> son disk isabeti zamanı; henüz yazılmadı
+        self._used = {}
+        self._stats = {}
+
+    def ttl_for(self, prompt_class: str) -> float:
+        return self.ttls.get(prompt_class, self.ttl)
+
+    def open(self):
+        """Open the disk tier and drop expired rows."""
+        if not self.path or self._db is not None:
+            return
+        db = sqlite3.connect(self.path, check_same_thread=False)
+        db.execute(
+            "CREATE TABLE IF NOT EXISTS llm_cache ("
+            "key TEXT PRIMARY KEY, prompt_class TEXT, content TEXT, expires_at REAL, used_at REAL)"
+        )
+        db.execute("DELETE FROM llm_cache WHERE expires_at <= ?", (time.time(),))
+        db.commit()
+        self._db = db
+
+    def close(self):
+        with self._db_lock:
+            if self._db is not None:
+                self._flush_used()
+                self._db.commit()
+                self._db.close()
+                self._db = None
+
+    def get_memory(self, key: str, prompt_class: str) -> Optional[str]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, content = entry
+            if expires_at <= time.time():
+                del self._entries[key]
+                self._count(prompt_class, "expired")
+                return None
+            self._entries.move_to_end(key)
+            self._count(prompt_class, "hits")
+            return content
+
+    def get_disk(self, key: str, prompt_class: str) -> Optional[str]:
+        """Disk lookup; a hit is promoted to memory. Blocking."""
+        with self._db_lock:
+            row = None
+            if self._db is not None:
+                row = self._db.execute("SELECT content, expires_at FROM llm_cache WHERE key = ?", (key,)).fetchone()
+            if row is not None and row[1] > time.time():
+                self._used[key] = time.time()
+                if len(self._used) >= _USED_AT_BATCH:
+                    self._flush_used()
+                    self._db.commit()
+        with self._lock:
+            if row is None or row[1] <= time.time():
+                self._count(prompt_class, "misses")
+                return None
+            self._remember(key, row[1], row[0])
+            self._count(prompt_class, "disk_hits")
+            return row[0]
+
+    def put_memory(self, key: str, prompt_class: str, content: str) -> float:
+        expires_at = time.time() + self.ttl_for(prompt_class)
+        with self._lock:
+            self._remember(key, expires_at, content)
+        return expires_at
+
+    def put_disk(self, key: str, prompt_class: str, content: str, expires_at: float):
+        """Blocking. Pending used_at updates of disk hits go out with the same commit."""
+        with self._db_lock:
+            if self._db is None:
+                return
+            self._used.pop(key, None)
+            self._flush_used()
+            self._db.execute(
+                "INSERT OR REPLACE INTO llm_cache VALUES (?, ?, ?, ?, ?)",
+                (key, prompt_class, content, expires_at, time.time()),
+            )
+            self._db.commit()
+
+    async def get(self, key: str, prompt_class: str) -> Optional[str]:
+        content = self.get_memory(key, prompt_class)
+        if content is None:
+            if self._db is None:
+                self._count_locked(prompt_class, "misses")
+                return None
+            content = await asyncio.to_thread(self.get_disk, key, prompt_class)
+        return content
+
+    async def put(self, key: str, prompt_class: str, content: str):
+        expires_at = self.put_memory(key, prompt_class, content)
+        if self._db is not None:
+            await asyncio.to_thread(self.put_disk, key, prompt_class, content, expires_at)
+
+    def warm(self) -> int:
+        """Load the most recently used unexpired disk entries into memory. Returns the count."""
+        with self._db_lock:
+            if self._db is None:
+                return 0
+            rows = self._db.execute(
+                "SELECT key, content, expires_at FROM llm_cache WHERE expires_at > ? ORDER BY used_at DESC LIMIT ?",
+                (time.time(), self.max_entries),
+            ).fetchall()
+        with self._lock:
+            # En son kullanılan LRU'nun sonunda kalsın
+            for key, content, expires_at in reversed(rows):
+                self._remember(key, expires_at, content)
+            return len(rows)
+
+    def stats(self) -> dict:
+        with self._lock:
+            classes = {}
+            for prompt_class, counters in self._stats.items():
+                lookups = counters.get("hits", 0) + counters.get("disk_hits", 0) + counters.get("misses", 0)
+                hits = counters.get("hits", 0) + counters.get("disk_hits", 0)
+                classes[prompt_class] = {
+                    **counters,
+                    "ttl": self.ttl_for(prompt_class),
+                    "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+                }
+            return {
+                "enabled": LLM_CACHE_ENABLED,
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "disk": self.path or None,
+                "classes": classes,
+            }
+
+    def _flush_used(self):
+        """Write the batched used_at updates; the caller holds _db_lock and commits."""
+        if self._used:
+            self._db.executemany("UPDATE llm_cache SET used_at = ? WHERE key = ?", [(t, k) for k, t in self._used.items()])
+            self._used.clear()
+
+    def _remember(self, key: str, expires_at: float, content: str):
+        self._entries[key] = (expires_at, content)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def _count_locked(self, prompt_class: str, event: str):
+        with self._lock:
+            self._count(prompt_class, event)
+
+    def _count(self, prompt_class: str, event: str):
+        counters = self._stats.setdefault(prompt_class, {})
+        counters[event] = counters.get(event, 0) + 1
+
+
+llm_cache = LlmCache()
+
+
+def open_llm_cache():
+    """Open the disk tier (if configured) and warm the memory tier from it. Called on startup."""
+    if not LLM_CACHE_ENABLED or not LLM_CACHE_PATH:
+        return
+    started = time.monotonic()
+    try:
+        llm_cache.open()
+        loaded = llm_cache.warm()
+    except sqlite3.Error as e:
+        logger.error(f"❌ LLM cache could not be opened: {e}")
+        return
+    logger.info(f"✅ LLM cache warm-up: {loaded} responses in {time.monotonic() - started:.2f}s")
+
+
+def close_llm_cache():
+    llm_cache.close()
+
+
+def cache_stats() -> dict:
+    return llm_cache.stats()
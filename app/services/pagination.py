@@ -0,0 +1,47 @@
+import json
+import base64
+import hashlib
+import binascii
+
+from fastapi import HTTPException
+
+from app.services.result_cache import filter_bitmask
+
+# Bir sayfada döndürülebilecek en fazla ürün
+MAX_PAGE_SIZE = 50
+
+
+def filter_signature(endpoint: str, filters: dict) -> str:
+    """Short hash of everything that defines a ranking; a cursor is only valid for the same one."""
+    key = repr((endpoint, filter_bitmask(filters), filters.get("min_budget"), filters.get("max_budget")))
+    return hashlib.sha1(key.encode()).hexdigest()[:12]
+
+
+def encode_cursor(score: float, product_id: int, signature: str) -> str:
+    """Opaque cursor pointing just after the (score, id) position of the last product on a page."""
+    payload = json.dumps({"s": score, "i": product_id, "f": signature}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, signature: str) -> tuple:
+    """
+    Return the (score, id) keyset position stored in a cursor.
+    Raises:
+        HTTPException: 400 if the cursor is malformed or was issued for different filters
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        score, product_id, cursor_signature = float(payload["s"]), int(payload["i"]), payload["f"]
+    except (binascii.Error, UnicodeDecodeError, ValueError, KeyError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if cursor_signature != signature:
+        raise HTTPException(status_code=400, detail="Cursor does not match the selected filters")
+    return score, product_id
+
+
+def with_next_cursor(result: dict, limit: int, signature: str) -> dict:
+    """Add `next_cursor` to a page: None when the page was not full, i.e. there is nothing more."""
+    products = result.get("products", [])
+    last = products[-1] if len(products) >= limit else None
+    return {**result, "next_cursor": encode_cursor(last["score"], last["id"], signature) if last else None}
@@ -0,0 +1,429 @@
+import os
+import re
+import json
+from typing import NamedTuple, Optional, Tuple
+
+from app.schemas.schemas import ProductFilterSchema
+from app.services import filter_rules, language, llm, llm_cache
+from app.services.llm_cache import LLM_CACHE_ENABLED
+
+PREMIUM_MODEL = os.getenv("PREMIUM_MODEL", "gpt-4o-mini")
+# LLM önbelleğinde bu çağrıların sınıfı (süre LLM_CACHE_TTLS ile ayarlanır)
+PROMPT_CLASS = "premium_turn"
+
+LANGUAGES = ("tr", "en")
+# Sorulma sırası: önce zorunlu alanlar, en son bütçe
+FOLLOW_UP_FIELDS = ("age", "gender", "special", "interests", "budget")
+
+# ProductFilterSchema.get_missing_fields mesajlarının alan karşılıkları
+MISSING_FIELD_KEYS = {
+    "Yaş aralığını belirtir misiniz?": "age",
+    "Hediye alacağınız kişinin cinsiyeti nedir?": "gender",
+    "Bu hediye özel bir gün için mi? (Doğum günü, yıl dönümü vb.)": "special",
+    "Kişinin ilgi alanlarından birkaçını paylaşır mısınız? (Örneğin, spor, müzik, teknoloji vb.)": "interests",
+}
+
+# Modelin sorusu kullanılamadığında gönderilen sabit sorular
+FOLLOW_UP_QUESTIONS = {
+    "age": {
+        "tr": "Aslında hediyeyi düşündüğünüz kişinin yaş aralığını bilmem çok yardımcı olacak. Genç biri mi yoksa yetişkin biri için mi bakıyorsunuz?",
+        "en": "It would really help to know the age range of the person you're shopping for. Are they young, or an adult?",
+    },
+    "gender": {
+        "tr": "Bu hediyeyi bir erkek için mi yoksa bir kadın için mi düşünüyorsunuz? Bu bilgi önerilerimi daha isabetli yapacak.",
+        "en": "Are you thinking of this gift for a man or a woman? That will make my suggestions more accurate.",
+    },
+    "special": {
+        "tr": "Merak ediyorum, bu hediye özel bir kutlama için mi? Doğum günü, yıldönümü veya başka özel bir gün olabilir mi?",
+        "en": "Is this gift for a special occasion, like a birthday, an anniversary or another celebration?",
+    },
+    "interests": {
+        "tr": "Hediye düşündüğünüz kişi nelerden hoşlanır? Belki spor, müzik, kitap okumak ya da başka hobiler... Biraz bahsedebilir misiniz?",
+        "en": "What does the person enjoy? Sports, music, reading or other hobbies... Could you tell me a little about them?",
+    },
+    "budget": {
+        "tr": "Hediye için düşündüğünüz bir bütçe var mı? Uygun önerilerim için bilmem yardımcı olur.",
+        "en": "Do you have a budget in mind for the gift? It would help me make better recommendations.",
+    },
+}
+
+MESSAGES = {
+    "no_products": {
+        "tr": "Hmm, aradığınız kriterlere tam uyan bir ürün bulamadım. Biraz daha geniş bir arama yapmamı ister misiniz?",
+        "en": "Hmm, I couldn't find any products that exactly match your criteria. Would you like me to try a broader search?",
+    },
+    "all_shown": {
+        "tr": "Bu kriterlere uyan tüm ürünleri size zaten gösterdim. Aramayı değiştirmek ister misiniz?",
+        "en": "I've already shown you every product that matches these criteria. Would you like to change the search?",
+    },
+    "success": {
+        "tr": "Harika! Size özel hediye önerilerim hazır. Umarım beğenirsiniz!",
+        "en": "Great! I've prepared some gift recommendations just for you. I hope you like them!",
+    },
+}
+
+SYSTEM_PROMPT = (
+    "Sen bir hediye asistanısın. Kullanıcı girdisine göre filtre tablosunu tamamlıyor, kullanıcının dilini "
+    "belirliyor ve eksik bilgi için kullanıcının dilinde kısa, doğal bir soru yazıyorsun. "
+    "Daha önce doldurulmuş bilgileri değiştirme."
+)
+
+
+class ExtractionError(Exception):
+    """The model did not return a usable structured response."""
+
+    def __init__(self, message: str, raw_content: Optional[str] = None):
+        super().__init__(message)
+        self.raw_content = raw_content
+
+
+class PremiumTurn(NamedTuple):
+    filters: dict
+    language: str
+    follow_up_field: Optional[str]
+    follow_up_question: Optional[str]
+
+
+def _filters_schema() -> dict:
+    properties = {}
+    for name, field in ProductFilterSchema.model_fields.items():
+        properties[name] = {"type": "boolean"} if field.annotation is bool else {"type": ["number", "null"]}
+    return {"type": "object", "properties": properties, "required": list(properties), "additionalProperties": False}
+
+
+def response_format() -> dict:
+    """Structured-output schema: the updated filter table, the user's language and the follow-up question."""
+    return {
+        "type": "json_schema",
+        "json_schema": {
+            "name": "premium_turn",
+            "strict": True,
+            "schema": {
+                "type": "object",
+                # Model alanları bu sırayla yazar; soru filtrelerden önce gelir ki akışta hemen gösterilebilsin
+                "properties": {
+                    "language": {"type": "string", "enum": list(LANGUAGES)},
+                    "follow_up_field": {"type": "string", "enum": [*FOLLOW_UP_FIELDS, "none"]},
+                    "follow_up_question": {"type": ["string", "null"]},
+                    "filters": _filters_schema(),
+                },
+                "required": ["language", "follow_up_field", "follow_up_question", "filters"],
+                "additionalProperties": False,
+            },
+        },
+    }
+
+
+def compact_table(filter_dict: dict) -> str:
+    """The filled fields only, as compact JSON; the model still returns the full table through the schema."""
+    filled = {key: value for key, value in filter_dict.items() if value is not False and value is not None}
+    return json.dumps(filled, ensure_ascii=False, separators=(",", ":"))
+
+
+def build_messages(user_input: str, filter_dict: dict) -> list:
+    prompt = f"""
+    Kullanıcıdan şu giriş alındı: {user_input}
+    Mevcut doldurulmuş tablo (yalnızca dolu alanlar; listede olmayanlar false/null):
+    {compact_table(filter_dict)}
+
+    Bu tabloyu kullanıcı bilgisine göre **güncelle** ve sadece eksik bilgileri tamamla.
+    Daha önce doldurulmuş bilgileri değiştirme.
+    Boolean değişkenleri true veya false olarak döndür.
+
+    NOT: Kullanıcı bütçe konusunda konuştuğunda MUTLAKA şu şekilde davran:
+    1. Eğer kullanıcı net bir aralık belirttiyse (örn. "200-300 TL arası" gibi) min_budget ve max_budget'i o şekilde ayarla.
+    2. Eğer kullanıcı tek bir değer belirttiyse (örn. "500 TL civarı" gibi) bir aralık oluştur:
+       - min_budget = belirtilen değerin %20 altı
+       - max_budget = belirtilen değerin %20 üstü
+    3. Eğer kullanıcı "ucuz olsun" gibi belirsiz ifadeler kullandıysa, min_budget=0, max_budget=500 gibi belirleme yapabilirsin.
+    4. Eğer kullanıcı "pahalı olsun" veya "lüks" gibi ifadeler kullandıysa, min_budget=1000 gibi bir alt sınır belirleyebilirsin.
+    5. Kullanıcı bütçe konusunda hiçbir şey söylemediyse, min_budget ve max_budget'i null bırak.
+
+    ÖZEL GÜN KURALLARI:
+    1. Eğer kullanıcı özel bir gün istemediğini belirttiğinde veya farklı bir özel gün belirttiğinde, special_other'ı true yap.
+    2. Eğer kullanıcı doğum günü, yıl dönümü gibi standart özel günlerden birini belirttiğinde, ilgili alanı true yap ve special_other'ı false yap.
+
+    DİL VE SORU:
+    - language: kullanıcının girişi İngilizce ise "en", değilse "tr".
+    - follow_up_field: güncellenmiş tabloda hâlâ eksik olan ilk bilgi, şu sırayla: age (yaş aralığı), gender (cinsiyet),
+      special (özel gün), interests (ilgi alanları), budget (min_budget ve max_budget ikisi de null). Hiçbiri eksik değilse "none".
+    - follow_up_question: follow_up_field'ı kullanıcıya soran, kullanıcının dilinde doğal, sohbet tarzında ve kısa bir soru.
+      follow_up_field "none" ise null.
+    """
+    return [
+        {"role": "system", "content": SYSTEM_PROMPT},
+        {"role": "user", "content": prompt},
+    ]
+
+
+def parse_turn(content: Optional[str]) -> PremiumTurn:
+    """
+    Validate a structured response.
+    Raises:
+        ExtractionError: If the content is not the expected JSON object
+    """
+    try:
+        data = json.loads(content or "")
+        filters = data["filters"]
+        detected = data["language"] if data["language"] in LANGUAGES else "tr"
+        field = data["follow_up_field"] if data["follow_up_field"] in FOLLOW_UP_FIELDS else None
+        question = (data.get("follow_up_question") or "").strip() or None
+    except (ValueError, KeyError, TypeError) as e:
+        raise ExtractionError(f"Invalid structured response: {e}", content)
+    if not isinstance(filters, dict):
+        raise ExtractionError("Invalid structured response: filters is not an object", content)
+    return PremiumTurn(filters, detected, field, question)
+
+
+def _cache_key(messages: list) -> str:
+    return llm_cache.prompt_key(PREMIUM_MODEL, messages, response_format=response_format())
+
+
+async def extract_turn(user_input: str, filter_dict: dict, client: Optional[llm.LlmClient] = None) -> PremiumTurn:
+    """
+    One structured chat completion that updates the filters, detects the language and writes the follow-up.
+    Valid answers are cached per normalized prompt (see llm_cache), so a repeated message on the
+    same table does not reach the provider.
+    """
+    messages = build_messages(user_input, filter_dict)
+    key = _cache_key(messages)
+    if LLM_CACHE_ENABLED:
+        cached = await llm_cache.llm_cache.get(key, PROMPT_CLASS)
+        if cached is not None:
+            return parse_turn(cached)
+
+    response = await (client or llm.client()).chat(
+        model=PREMIUM_MODEL,
+        messages=messages,
+        response_format=response_format(),
+    )
+    message = response.choices[0].message
+    if getattr(message, "refusal", None):
+        raise ExtractionError(f"Model refused: {message.refusal}", message.refusal)
+    turn = parse_turn(message.content)
+    if LLM_CACHE_ENABLED:
+        await llm_cache.llm_cache.put(key, PROMPT_CLASS, message.content)
+    return turn
+
+
+_ESCAPES = {'"': '"', "\\": "\\", "/": "/", "b": "\b", "f": "\f", "n": "\n", "r": "\r", "t": "\t"}
+_LANGUAGE_VALUE = re.compile(r'"language"\s*:\s*"(\w+)"')
+_FIELD_VALUE = re.compile(r'"follow_up_field"\s*:\s*"(\w+)"')
+_QUESTION_START = re.compile(r'"follow_up_question"\s*:\s*(\S)')
+
+
+class QuestionStream:
+    """
+    Incremental reader of a streamed premium_turn answer. feed() takes raw content chunks and
+    returns the newly decoded characters of follow_up_question; language and follow_up_field are
+    set as soon as they have been written (the schema orders all three before the filters).
+    """
+
+    def __init__(self):
+        self.language: Optional[str] = None
+        self.follow_up_field: Optional[str] = None
+        self.done = False
+        self._buffer = ""
+        self._pos: Optional[int] = None
+
+    def feed(self, text: str) -> str:
+        self._buffer += text
+        if self.language is None:
+            match = _LANGUAGE_VALUE.search(self._buffer)
+            if match:
+                self.language = match.group(1)
+        if self.follow_up_field is None:
+            match = _FIELD_VALUE.search(self._buffer)
+            if match:
+                self.follow_up_field = match.group(1)
+        if self.done:
+            return ""
+        if self._pos is None:
+            match = _QUESTION_START.search(self._buffer)
+            if match is None:
+                return ""
+            if match.group(1) != '"':
+                # null
+                self.done = True
+                return ""
+            self._pos = match.end()
+        return self._read()
+
+    def _read(self) -> str:
+        buffer, i, out = self._buffer, self._pos, []
+        while i < len(buffer):
+            ch = buffer[i]
+            if ch == '"':
+                self.done = True
+                i += 1
+                break
+            if ch != "\\":
+                out.append(ch)
+                i += 1
+                continue
+            # Kaçış dizisi tamamlanmadıysa sonraki parçayı bekle
+            if i + 1 >= len(buffer):
+                break
+            if buffer[i + 1] != "u":
+                out.append(_ESCAPES.get(buffer[i + 1], buffer[i + 1]))
+                i += 2
+                continue
+            width = 12 if buffer[i + 2:i + 4].lower() in ("d8", "d9", "da", "db") else 6
+            if i + width > len(buffer):
+                break
+            out.append(json.loads(f'"{buffer[i:i + width]}"'))
+            i += width
+        self._pos = i
+        return "".join(out)
+
+
+async def stream_extract(user_input: str, filter_dict: dict, client: Optional[llm.LlmClient] = None,
+                         expected_language: Optional[str] = None, expected_field: Optional[str] = None):
+    """
+    Streaming variant of extract_turn. Yields ("delta", text) for the follow-up question as the
+    model writes it, then ("turn", PremiumTurn) once the answer is complete. With
+    expected_language / expected_field, deltas of a question written in another language or
+    asking for another field are held back. A cached answer yields only the turn.
+    """
+    messages = build_messages(user_input, filter_dict)
+    key = _cache_key(messages)
+    if LLM_CACHE_ENABLED:
+        cached = await llm_cache.llm_cache.get(key, PROMPT_CLASS)
+        if cached is not None:
+            yield "turn", parse_turn(cached)
+            return
+
+    reader = QuestionStream()
+    content, refusal = [], []
+    async for delta in (client or llm.client()).stream(
+        model=PREMIUM_MODEL,
+        messages=messages,
+        response_format=response_format(),
+    ):
+        if getattr(delta, "refusal", None):
+            refusal.append(delta.refusal)
+        if not delta.content:
+            continue
+        content.append(delta.content)
+        text = reader.feed(delta.content)
+        if text and (expected_language is None or reader.language == expected_language) \
+                and (expected_field is None or reader.follow_up_field == expected_field):
+            yield "delta", text
+
+    if refusal:
+        raise ExtractionError(f"Model refused: {''.join(refusal)}", "".join(refusal))
+    turn = parse_turn("".join(content))
+    if LLM_CACHE_ENABLED:
+        await llm_cache.llm_cache.put(key, PROMPT_CLASS, "".join(content))
+    yield "turn", turn
+
+
+def merge_filters(filter_dict: dict, extracted: dict) -> dict:
+    """Fill gaps in the model's table from the previous one and widen a single budget value to ±20%."""
+    updated_data = {key: value for key, value in extracted.items() if key in ProductFilterSchema.model_fields}
+
+    # Eksik alanlar önceki verilerle doldurulsun
+    for key, value in filter_dict.items():
+        if key not in updated_data or updated_data[key] is None:
+            updated_data[key] = value
+
+    # Hem min hem max aynı değere sahipse ve null değilse aynı değeri merkez alarak aralık oluştur
+    min_budget = updated_data.get("min_budget")
+    max_budget = updated_data.get("max_budget")
+    if min_budget is not None and max_budget is not None and min_budget == max_budget:
+        updated_data["min_budget"] = round(min_budget * 0.8)  # %20 altı
+        updated_data["max_budget"] = round(max_budget * 1.2)  # %20 üstü
+    return updated_data
+
+
+def missing_field(filled_filters: ProductFilterSchema) -> Optional[str]:
+    """First field still to ask for (see FOLLOW_UP_FIELDS), or None when the table is complete."""
+    missing_fields = filled_filters.get_missing_fields()
+    if missing_fields:
+        return MISSING_FIELD_KEYS.get(missing_fields[0], "unknown")
+    if filled_filters.min_budget is None and filled_filters.max_budget is None:
+        return "budget"
+    return None
+
+
+def follow_up_message(turn: PremiumTurn, field_key: str) -> str:
+    """The model's question when it asks for the same field we need, a fixed question otherwise."""
+    if turn.follow_up_question and turn.follow_up_field == field_key:
+        return turn.follow_up_question
+    fallback = FOLLOW_UP_QUESTIONS.get(field_key)
+    if fallback is None:
+        return "Bana biraz daha bilgi verebilir misiniz?" if turn.language == "tr" else "Could you tell me a bit more?"
+    return fallback[turn.language]
+
+
+class _TurnStart(NamedTuple):
+    local_language: Optional[str]
+    extraction: filter_rules.RuleExtraction
+    ruled: dict
+    report: dict
+
+
+def _start_turn(user_input: str, filter_dict: dict, conversation) -> _TurnStart:
+    # Dil önce yerel olarak tespit edilir; emin olunamazsa sohbetin önceki dili, o da yoksa LLM'in cevabı kullanılır
+    local_language = language.resolve(user_input, conversation)
+    extraction = filter_rules.extract(user_input)
+    ruled = filter_rules.apply(filter_dict, extraction)
+    return _TurnStart(local_language, extraction, ruled, {"source": "rules", "confidence": extraction.confidence})
+
+
+def _rules_only(start: _TurnStart, filter_dict: dict) -> Optional[Tuple[PremiumTurn, dict, dict]]:
+    if filter_rules.needs_llm(start.ruled, start.extraction):
+        return None
+    turn = PremiumTurn(start.ruled, start.local_language or "tr", None, None)
+    return turn, merge_filters(filter_dict, start.ruled), start.report
+
+
+def _finish_turn(start: _TurnStart, turn: PremiumTurn, conversation) -> Tuple[PremiumTurn, dict, dict]:
+    if start.local_language and start.local_language != turn.language:
+        # Modelin sorusu diğer dilde yazılmış olabilir; sabit soru kullanılır
+        turn = turn._replace(language=start.local_language, follow_up_question=None)
+    elif not start.local_language:
+        language.remember(conversation, turn.language)
+    return turn, merge_filters(start.ruled, turn.filters), {**start.report, "source": "rules+llm"}
+
+
+async def process_turn(
+    user_input: str, filter_dict: dict, conversation=None, client: Optional[llm.LlmClient] = None
+) -> Tuple[PremiumTurn, dict, dict]:
+    """
+    Update the filter table from one user message.
+    Fields the local rules resolve confidently are filled first; the LLM is only called when a
+    required field is still empty or the message mentions something the rules could not resolve,
+    and then sees the rule results as already filled. client defaults to the shared LLM client.
+    Returns (turn, updated table, extraction report with per-field confidence and the source).
+    """
+    start = _start_turn(user_input, filter_dict, conversation)
+    result = _rules_only(start, filter_dict)
+    if result is not None:
+        return result
+
+    # Tek yapılandırılmış çağrı: güncel tablo, kullanıcının dili ve eksik alan sorusu birlikte döner
+    turn = await extract_turn(user_input, start.ruled, client)
+    return _finish_turn(start, turn, conversation)
+
+
+async def stream_turn(user_input: str, filter_dict: dict, conversation=None, client: Optional[llm.LlmClient] = None):
+    """
+    Streaming variant of process_turn. Yields ("delta", text) for the model's follow-up question
+    while it is written, then ("turn", (turn, updated table, extraction report)). Only a question
+    for the field that is missing before the model's update is streamed; the final follow-up can
+    still differ when the model's filters change what is missing.
+    """
+    start = _start_turn(user_input, filter_dict, conversation)
+    result = _rules_only(start, filter_dict)
+    if result is not None:
+        yield "turn", result
+        return
+
+    # Tablo zaten tamamsa ("none") hiçbir soru akıtılmaz
+    expected_field = missing_field(ProductFilterSchema(**start.ruled)) or "none"
+    async for kind, value in stream_extract(user_input, start.ruled, client, start.local_language, expected_field):
+        if kind == "delta":
+            yield kind, value
+        else:
+            yield "turn", _finish_turn(start, value, conversation)
@@ -0,0 +1,238 @@
+import os
+import math
+import time
+import threading
+from collections import OrderedDict
+
+from fastapi import Request
+
+from app.services.catalog_sync import catalog_version
+from app.services.features import FEATURE_COLUMNS
+
+RESULT_CACHE_ENABLED = os.getenv("RESULT_CACHE_ENABLED", "true").lower() == "true"
+RESULT_CACHE_MAX_ENTRIES = int(os.getenv("RESULT_CACHE_MAX_ENTRIES", "4096"))
+RESULT_CACHE_TTL = float(os.getenv("RESULT_CACHE_TTL", "300"))
+# Bütçe bu adımlara yuvarlanarak anahtara girer; yakın bütçeler aynı kaydı paylaşır
+RESULT_CACHE_BUDGET_STEP = float(os.getenv("RESULT_CACHE_BUDGET_STEP", "50"))
+# Her kayıtta saklanan sıralı ürün sayısı; tam bütçeye göre süzüldükten sonra limit kadarı döner
+RESULT_CACHE_DEPTH = int(os.getenv("RESULT_CACHE_DEPTH", "50"))
+
+_BYPASS_DIRECTIVES = ("no-cache", "no-store")
+
+
+def filter_bitmask(filters: dict) -> int:
+    """Canonical bitmask of the scoring columns switched on in `filters`."""
+    mask = 0
+    for i, col in enumerate(FEATURE_COLUMNS):
+        if filters.get(col):
+            mask |= 1 << i
+    return mask
+
+
+def quantize_budget(min_budget=None, max_budget=None) -> tuple:
+    """Widen the budget outwards to RESULT_CACHE_BUDGET_STEP boundaries."""
+    step = RESULT_CACHE_BUDGET_STEP
+    low = None if min_budget is None else math.floor(min_budget / step) * step
+    high = None if max_budget is None else math.ceil(max_budget / step) * step
+    return low, high
+
+
+def bypass_requested(request: Request) -> bool:
+    """True when the client opted out with `Cache-Control: no-cache` or `no-store`."""
+    if request is None:
+        return False
+    header = request.headers.get("cache-control", "").lower()
+    return any(d in header for d in _BYPASS_DIRECTIVES)
+
+
+def _within(price: float, min_budget, max_budget) -> bool:
+    return (min_budget is None or price >= min_budget) and (max_budget is None or price <= max_budget)
+
+
+def _after(product: dict, after) -> bool:
+    if after is None:
+        return True
+    score, product_id = after
+    return product["score"] < score or (product["score"] == score and product["id"] > product_id)
+
+
+def _trim(result: dict, min_budget, max_budget, limit: int, depth: int, after: tuple = None):
+    """
+    Cut a ranked result computed for the widened budget down to the exact budget and limit.
+    Every list in `result` is a ranked product list with a "price" key. With `after` (a keyset
+    position (score, id)) only products ranked after it are kept. Returns None when a list was
+    truncated at `depth` and still has fewer than `limit` such products inside the exact budget:
+    products beyond the stored depth might then belong to the answer.
+    """
+    trimmed = {}
+    for key, value in result.items():
+        if not isinstance(value, list):
+            trimmed[key] = value
+            continue
+        inside = [dict(p) for p in value if _within(p["price"], min_budget, max_budget) and _after(p, after)]
+        if len(inside) < limit and len(value) >= depth:
+            return None
+        trimmed[key] = inside[:limit]
+    return trimmed
+
+
+class ResultCache:
+    """
+    Bounded LRU + TTL cache of ranked recommendation results.
+
+    Entries remember the catalog version they were computed against and are dropped
+    on read once the catalog has moved on.
+    """
+
+    def __init__(self, max_entries: int = RESULT_CACHE_MAX_ENTRIES, ttl: float = RESULT_CACHE_TTL):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {}
+
+    def get(self, key: tuple, version: int):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, entry_version, value = entry
+            if expires_at <= now:
+                del self._entries[key]
+                self._count(key[0], "expired")
+                return None
+            if entry_version != version:
+                del self._entries[key]
+                self._count(key[0], "invalidated")
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def put(self, key: tuple, version: int, value):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, version, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                evicted, _ = self._entries.popitem(last=False)
+                self._count(evicted[0], "evictions")
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def record(self, endpoint: str, event: str):
+        with self._lock:
+            self._count(endpoint, event)
+
+    def stats(self) -> dict:
+        with self._lock:
+            endpoints = {}
+            for endpoint, counters in self._stats.items():
+                lookups = counters.get("hits", 0) + counters.get("misses", 0)
+                endpoints[endpoint] = {
+                    **counters,
+                    "hit_rate": round(counters.get("hits", 0) / lookups, 4) if lookups else 0.0,
+                }
+            return {
+                "enabled": RESULT_CACHE_ENABLED,
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl": self.ttl,
+                "endpoints": endpoints,
+            }
+
+    def _count(self, endpoint: str, event: str):
+        counters = self._stats.setdefault(endpoint, {})
+        counters[event] = counters.get(event, 0) + 1
+
+
+result_cache = ResultCache()
+
+
+class CachedQuery:
+    """
+    One recommendation lookup against the cache; see cached_call for the full flow.
+
+    The entry is computed for the budget widened to RESULT_CACHE_BUDGET_STEP boundaries and
+    RESULT_CACHE_DEPTH products, then trimmed to the exact budget and limit on every read.
+    """
+
+    def __init__(self, endpoint: str, filters: dict, limit: int, request: Request = None, extra: tuple = (), after: tuple = None):
+        self.endpoint = endpoint
+        self.limit = limit
+        self.after = after
+        self.min_budget = filters.get("min_budget")
+        self.max_budget = filters.get("max_budget")
+        self.version = catalog_version()
+        self.enabled = RESULT_CACHE_ENABLED and limit <= RESULT_CACHE_DEPTH
+        self.bypass = bypass_requested(request)
+
+        low, high = quantize_budget(self.min_budget, self.max_budget)
+        self.key = (endpoint, filter_bitmask(filters), low, high, *extra)
+        self.widened_filters = {**filters, "min_budget": low, "max_budget": high}
+        self.depth = RESULT_CACHE_DEPTH
+        # Güncel kayıt var ama tam bütçeyi dolduramıyor; geniş sorguyu tekrar çalıştırmak aynı kaydı üretir
+        self.underfilled = False
+
+    def get(self):
+        if not self.enabled:
+            return None
+        if self.bypass:
+            result_cache.record(self.endpoint, "bypass")
+            return None
+        cached = result_cache.get(self.key, self.version)
+        result = None if cached is None else _trim(cached, self.min_budget, self.max_budget, self.limit, self.depth, self.after)
+        if cached is not None and result is None:
+            self.underfilled = True
+            result_cache.record(self.endpoint, "underfilled")
+        result_cache.record(self.endpoint, "hits" if result is not None else "misses")
+        return result
+
+    def store(self, result: dict):
+        """
+        Cache a result computed for widened_filters/depth and return it trimmed for this request,
+        or None if the stored depth is not enough to answer the exact budget.
+        """
+        result_cache.put(self.key, self.version, result)
+        return _trim(result, self.min_budget, self.max_budget, self.limit, self.depth, self.after)
+
+
+def cached_call(endpoint: str, filters: dict, limit: int, compute, request: Request = None, extra: tuple = ()):
+    """
+    Return compute(filters, limit) through the result cache.
+    compute must return a dict whose list values are ranked products with a "price" key.
+    """
+    lookup = CachedQuery(endpoint, filters, limit, request, extra)
+    if not lookup.enabled:
+        return compute(filters, limit)
+    result = lookup.get()
+    if result is None and not lookup.underfilled:
+        result = lookup.store(compute(lookup.widened_filters, lookup.depth))
+    if result is None:
+        # Derinlik yetmedi; tam bütçe ile doğrudan hesapla
+        result = compute(filters, limit)
+    return result
+
+
+async def cached_call_async(
+    endpoint: str, filters: dict, limit: int, compute, request: Request = None, extra: tuple = (), after: tuple = None,
+):
+    """
+    Async variant of cached_call; compute(filters, limit, after) is awaited.
+    `after` is a keyset position (score, id): pages past it are served from the cached ranking
+    while it is deep enough, otherwise compute is called with the position.
+    """
+    lookup = CachedQuery(endpoint, filters, limit, request, extra, after)
+    if not lookup.enabled:
+        return await compute(filters, limit, after)
+    result = lookup.get()
+    if result is None and after is None and not lookup.underfilled:
+        result = lookup.store(await compute(lookup.widened_filters, lookup.depth, None))
+    if result is None:
+        result = await compute(filters, limit, after)
+    return result
+
+
+def cache_stats() -> dict:
+    return result_cache.stats()
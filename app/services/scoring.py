@@ -0,0 +1,163 @@
+import os
+import logging
+from typing import Dict, Optional
+
+import numpy as np
+
+from app.db.database import db_connection
+from app.services import ann, segments
+from app.services.catalog import CatalogSnapshot, load_snapshot
+from app.services.features import FEATURE_INDEX, FEATURE_WEIGHTS, NORMALIZE, selected_columns
+
+logger = logging.getLogger(__name__)
+
+# "sql": skor Postgres'te hesaplanır (varsayılan), "memory": bellekteki NumPy matrisi üzerinde hesaplanır
+SCORING_ENGINE = os.getenv("SCORING_ENGINE", "sql").lower()
+
+_snapshot: Optional[CatalogSnapshot] = None
+
+
+def engine_enabled() -> bool:
+    return SCORING_ENGINE == "memory" and _snapshot is not None
+
+
+def get_snapshot() -> Optional[CatalogSnapshot]:
+    return _snapshot
+
+
+def set_snapshot(snapshot: CatalogSnapshot):
+    # Referans ataması atomiktir; devam eden istekler eski snapshot ile bitirir
+    global _snapshot
+    _snapshot = snapshot
+
+
+def init_engine():
+    """Load the catalog snapshot at startup when the in-memory engine is configured."""
+    if SCORING_ENGINE != "memory":
+        return
+    try:
+        with db_connection() as conn:
+            set_snapshot(load_snapshot(conn))
+    except Exception as e:
+        logger.error(f"❌ Catalog snapshot could not be loaded, falling back to SQL scoring: {e}")
+
+
+def distances(snapshot: CatalogSnapshot, cols: list, rows: np.ndarray = None) -> np.ndarray:
+    """
+    Weighted squared distance to the all-ones target over the selected columns.
+
+    Same quantity as sum(w * POWER(COALESCE(col,0)/10 - 1, 2)) in the SQL path, written as
+    sum(w * (10 - col)^2) / 100 so that integer feature values are summed exactly.
+    """
+    idx = [FEATURE_INDEX[c] for c in cols]
+    weights = np.array([FEATURE_WEIGHTS[c] for c in cols], dtype=np.float64)
+    block = snapshot.features[:, idx] if rows is None else snapshot.features[np.ix_(rows, idx)]
+    diff = NORMALIZE - block.astype(np.float64)
+    return (diff * diff) @ weights / (NORMALIZE * NORMALIZE)
+
+
+def scores_from_distances(dist: np.ndarray) -> np.ndarray:
+    return 1.0 / (1.0 + np.sqrt(dist))
+
+
+def rank_top_k(dist: np.ndarray, ids: np.ndarray, k: int) -> np.ndarray:
+    """
+    Positions of the k smallest distances, ordered by (distance, id) like ORDER BY score DESC, p.id.
+    argpartition finds the k-th distance; every row tied with it is kept before the final sort
+    so that ties are broken by id exactly as in SQL.
+    """
+    n = len(dist)
+    if n == 0 or k <= 0:
+        return np.empty(0, dtype=np.int64)
+    if n > k:
+        kth = dist[np.argpartition(dist, k - 1)[:k]].max()
+        candidates = np.flatnonzero(dist <= kth)
+    else:
+        candidates = np.arange(n)
+    order = np.lexsort((ids[candidates], dist[candidates]))
+    return candidates[order][:k]
+
+
+def budget_rows(snapshot: CatalogSnapshot, min_budget=None, max_budget=None) -> Optional[np.ndarray]:
+    """Live row indices inside the budget window (from the price index), or None when no budget is set."""
+    if min_budget is None and max_budget is None:
+        return None
+    return snapshot.rows_in_price_range(min_budget, max_budget)
+
+
+def _in_budget(snapshot: CatalogSnapshot, rows: np.ndarray, min_budget=None, max_budget=None) -> np.ndarray:
+    prices = snapshot.prices[rows]
+    keep = np.ones(len(rows), dtype=bool)
+    if min_budget is not None:
+        keep &= prices >= min_budget
+    if max_budget is not None:
+        keep &= prices <= max_budget
+    return rows[keep]
+
+
+def _after(snapshot: CatalogSnapshot, rows: np.ndarray, dist: np.ndarray, after: tuple) -> np.ndarray:
+    """Mask of rows ranked after the keyset position (score, id) in ORDER BY score DESC, id order."""
+    score, product_id = after
+    scores = scores_from_distances(dist)
+    return (scores < score) | ((scores == score) & (snapshot.ids[rows] > product_id))
+
+
+def _rank(snapshot: CatalogSnapshot, cols: list, rows: np.ndarray, limit: int, after: tuple = None):
+    dist = distances(snapshot, cols, rows)
+    if after is not None:
+        keep = _after(snapshot, rows, dist, after)
+        rows, dist = rows[keep], dist[keep]
+    return rows, dist, rank_top_k(dist, snapshot.ids[rows], limit)
+
+
+def _segment_top(snapshot: CatalogSnapshot, cols: list, filters: dict, limit: int, after: tuple = None):
+    """
+    Rank only the precomputed segment candidates (see app/services/segments.py).
+    Returns (rows, dist, top), or None when the shortlist cannot prove the answer exact and a
+    full scan is needed, e.g. when it under-fills after budget filtering.
+    """
+    found = segments.lookup(snapshot, filters)
+    if found is None:
+        return None
+    rows, cutoff = found
+    rows = _in_budget(snapshot, rows, filters.get("min_budget"), filters.get("max_budget"))
+    rows, dist, top = _rank(snapshot, cols, rows, limit, after)
+    if np.isfinite(cutoff) and (len(top) < limit or not dist[top[-1]] < cutoff):
+        segments.record("fallbacks")
+        return None
+    segments.record("exact")
+    return rows, dist, top
+
+
+def top_products(filters: Dict[str, bool], limit: int = 10, snapshot: CatalogSnapshot = None, after: tuple = None) -> dict:
+    """
+    In-memory equivalent of crud.query_products; returns the same response shape.
+    `after` is a keyset position (score, id): only products ranked after it are returned.
+    """
+    snapshot = snapshot or _snapshot
+    cols = selected_columns(filters)
+    if not cols:
+        return {"message": "No filters selected", "products": []}
+
+    shortlist = _segment_top(snapshot, cols, filters, limit, after)
+    # Sonraki sayfalar tam taramayla hesaplanır: ANN adayları imleçten sonra erken tükenebilir
+    approximate = None if shortlist is not None or after is not None else ann.lookup(snapshot, cols, filters, limit)
+    if shortlist is not None:
+        rows, dist, top = shortlist
+    elif approximate is not None:
+        # ANN modu: yalnızca en yakın IVF listelerindeki ürünler tam olarak puanlanır
+        rows, dist, top = _rank(snapshot, cols, approximate, limit, after)
+    else:
+        rows = budget_rows(snapshot, filters.get("min_budget"), filters.get("max_budget"))
+        if rows is None:
+            rows = snapshot.active_rows()
+        if rows is None:
+            rows = np.arange(len(snapshot))
+        if len(rows) == 0:
+            return {"products": []}
+        rows, dist, top = _rank(snapshot, cols, rows, limit, after)
+
+    scores = scores_from_distances(dist[top])
+    return {
+        "products": [snapshot.product(int(rows[pos]), score) for pos, score in zip(top, scores)],
+    }
@@ -0,0 +1,310 @@
+import os
+import time
+import hashlib
+import logging
+import threading
+from typing import Optional
+
+import numpy as np
+
+from app.services.catalog import CatalogSnapshot
+from app.services.features import (
+    AGE_COLUMNS, GENDER_COLUMNS, SPECIAL_COLUMNS, FEATURE_INDEX, FEATURE_WEIGHTS, NORMALIZE,
+)
+
+logger = logging.getLogger(__name__)
+
+# Yaş (8) x cinsiyet (2) x özel gün (7 + seçilmemiş) = 128 segment; yalnızca SCORING_ENGINE=memory ile kullanılır
+SEGMENT_INDEX_ENABLED = os.getenv("SEGMENT_INDEX_ENABLED", "true").lower() == "true"
+SEGMENT_CANDIDATES = int(os.getenv("SEGMENT_CANDIDATES", "300"))
+SEGMENT_REFRESH_INTERVAL = float(os.getenv("SEGMENT_REFRESH_INTERVAL", "3600"))
+SEGMENT_MAX_PENDING_CHANGES = int(os.getenv("SEGMENT_MAX_PENDING_CHANGES", "5000"))
+SEGMENT_CHECK_INTERVAL = float(os.getenv("SEGMENT_CHECK_INTERVAL", "60"))
+SEGMENT_INDEX_PATH = os.getenv("SEGMENT_INDEX_PATH", "")
+# Eşit segment mesafeli ürünler listeye en fazla bu kat kadar eklenir
+SEGMENT_TIE_EXPANSION = 4
+# Kayıtlı .npz biçimi; kesim değerlerinin hesabı değişince artırılır ve eski dosyalar yeniden kurulur
+_INDEX_FORMAT = 2
+
+SEGMENT_COLUMNS = AGE_COLUMNS + GENDER_COLUMNS + SPECIAL_COLUMNS
+_NO_SPECIAL = len(SPECIAL_COLUMNS)
+
+
+def segment_key(filters: dict) -> Optional[tuple]:
+    """
+    (age, gender, special) indices of the segment used for `filters`, or None without an age and a gender.
+    special is len(SPECIAL_COLUMNS) when no special day is selected.
+
+    When several ages, genders or special days are selected the first of each is used: any
+    subset of the selected columns still gives a lower bound on the full distance.
+    """
+    age = next((i for i, c in enumerate(AGE_COLUMNS) if filters.get(c)), None)
+    gender = next((i for i, c in enumerate(GENDER_COLUMNS) if filters.get(c)), None)
+    if age is None or gender is None:
+        return None
+    special = next((i for i, c in enumerate(SPECIAL_COLUMNS) if filters.get(c)), _NO_SPECIAL)
+    return age, gender, special
+
+
+def _terms(features: np.ndarray, columns: list) -> np.ndarray:
+    """
+    Per-column w * (10 - x)^2, the integer-valued terms scoring.distances sums before dividing by 100.
+    Segment distances are divided once after summing too, so a tie with a full distance is an exact tie.
+    """
+    idx = [FEATURE_INDEX[c] for c in columns]
+    weights = np.array([FEATURE_WEIGHTS[c] for c in columns], dtype=np.float64)
+    diff = NORMALIZE - features[:, idx].astype(np.float64)
+    return diff * diff * weights
+
+
+def _live_rows(snapshot: CatalogSnapshot) -> np.ndarray:
+    rows = snapshot.active_rows()
+    return np.arange(len(snapshot)) if rows is None else rows
+
+
+def _shortlist(dist: np.ndarray, depth: int):
+    """
+    Positions of the `depth` smallest segment distances and the cutoff below which the list is
+    complete: every position left out has a segment distance >= cutoff.
+    """
+    n = len(dist)
+    if n <= depth:
+        return np.arange(n), np.inf
+    kth = np.partition(dist, depth)[depth]
+    within = dist <= kth
+    if np.count_nonzero(within) <= SEGMENT_TIE_EXPANSION * depth:
+        # Sınırdaki eşitlikleri de al; kesim bir sonraki farklı değer olur
+        rest = dist[~within]
+        return np.flatnonzero(within), float(rest.min()) if len(rest) else np.inf
+    return np.flatnonzero(dist < kth), float(kth)
+
+
+def snapshot_fingerprint(snapshot: CatalogSnapshot) -> str:
+    """Hash of the live ids and their segment columns; independent of row order and of interest edits."""
+    rows = _live_rows(snapshot)
+    rows = rows[np.argsort(snapshot.ids[rows], kind="stable")]
+    idx = [FEATURE_INDEX[c] for c in SEGMENT_COLUMNS]
+    digest = hashlib.sha1(snapshot.ids[rows].tobytes())
+    digest.update(np.ascontiguousarray(snapshot.features[np.ix_(rows, idx)]).tobytes())
+    return digest.hexdigest()
+
+
+class SegmentIndex:
+    """
+    Top-SEGMENT_CANDIDATES candidate rows per (age, gender, special) segment of one snapshot lineage.
+
+    A product left out of a segment's list has a segment distance of at least the segment's cutoff,
+    and the full distance only adds non-negative interest terms to it. If the limit-th result among
+    the candidates is strictly closer than the cutoff, the shortlist answer is therefore exact.
+    Rows patched into the snapshot after the build are always re-scored as extra candidates.
+    """
+
+    def __init__(self, segments: dict, loaded_at: float, changed_count: int, depth: int, fingerprint: str, built_at: float = None):
+        self.segments = segments
+        self.loaded_at = loaded_at
+        self.changed_count = changed_count
+        self.depth = depth
+        self.fingerprint = fingerprint
+        self.built_at = built_at or time.time()
+
+    def matches(self, snapshot: CatalogSnapshot) -> bool:
+        return snapshot.loaded_at == self.loaded_at
+
+    def pending_changes(self, snapshot: CatalogSnapshot) -> int:
+        return len(snapshot.changed_rows) - self.changed_count
+
+    def candidates(self, snapshot: CatalogSnapshot, key: tuple):
+        """(live candidate rows, cutoff) for a segment of `snapshot`, or None if the index is for another lineage."""
+        if not self.matches(snapshot) or key not in self.segments:
+            return None
+        rows, cutoff = self.segments[key]
+        changed = snapshot.changed_rows[self.changed_count:]
+        if len(changed):
+            rows = np.union1d(rows, changed)
+        if snapshot.active_rows() is not None:
+            rows = rows[snapshot.active[rows]]
+        return rows, cutoff
+
+
+def build_index(snapshot: CatalogSnapshot, depth: int = SEGMENT_CANDIDATES) -> SegmentIndex:
+    """Compute the candidate list of every segment with a full pass over the live rows."""
+    started = time.monotonic()
+    rows = _live_rows(snapshot)
+    features = snapshot.features[rows]
+    age_terms = _terms(features, AGE_COLUMNS)
+    gender_terms = _terms(features, GENDER_COLUMNS)
+    special_terms = _terms(features, SPECIAL_COLUMNS)
+
+    segments = {}
+    for a in range(len(AGE_COLUMNS)):
+        for g in range(len(GENDER_COLUMNS)):
+            base = age_terms[:, a] + gender_terms[:, g]
+            for s in range(len(SPECIAL_COLUMNS) + 1):
+                dist = (base if s == _NO_SPECIAL else base + special_terms[:, s]) / (NORMALIZE * NORMALIZE)
+                positions, cutoff = _shortlist(dist, depth)
+                segments[(a, g, s)] = (rows[positions], cutoff)
+
+    index = SegmentIndex(segments, snapshot.loaded_at, len(snapshot.changed_rows), depth, snapshot_fingerprint(snapshot))
+    logger.info(f"✅ Segment index built: {len(segments)} segments x {depth} candidates in {time.monotonic() - started:.2f}s")
+    return index
+
+
+def save_index(index: SegmentIndex, snapshot: CatalogSnapshot, path: str):
+    """Write the index as a compressed .npz keyed by product id so that it survives a restart."""
+    keys = sorted(index.segments)
+    lists = [snapshot.ids[index.segments[k][0]] for k in keys]
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        np.savez_compressed(
+            f,
+            keys=np.array(keys, dtype=np.int8),
+            offsets=np.cumsum([0] + [len(ids) for ids in lists]).astype(np.int64),
+            ids=np.concatenate(lists).astype(np.int64) if lists else np.empty(0, dtype=np.int64),
+            cutoffs=np.array([index.segments[k][1] for k in keys], dtype=np.float64),
+            depth=np.int64(index.depth),
+            format=np.int64(_INDEX_FORMAT),
+            built_at=np.float64(index.built_at),
+            fingerprint=np.array(index.fingerprint),
+        )
+    os.replace(tmp, path)
+
+
+def load_index(path: str, snapshot: CatalogSnapshot, depth: int = SEGMENT_CANDIDATES) -> Optional[SegmentIndex]:
+    """Load an index written by save_index; None if it is missing or was built for other catalog contents."""
+    if not path or not os.path.exists(path):
+        return None
+    with np.load(path) as data:
+        if "format" not in data.files or int(data["format"]) != _INDEX_FORMAT:
+            return None
+        if int(data["depth"]) != depth or str(data["fingerprint"]) != snapshot_fingerprint(snapshot):
+            return None
+        rows = snapshot.positions(data["ids"])
+        if (rows < 0).any():
+            return None
+        offsets = data["offsets"]
+        segments = {
+            tuple(int(v) for v in key): (rows[offsets[i]:offsets[i + 1]], float(data["cutoffs"][i]))
+            for i, key in enumerate(data["keys"])
+        }
+        fingerprint = str(data["fingerprint"])
+        built_at = float(data["built_at"])
+    return SegmentIndex(segments, snapshot.loaded_at, len(snapshot.changed_rows), depth, fingerprint, built_at)
+
+
+class SegmentRefresher:
+    """
+    Background job that keeps the segment index current.
+
+    The index is rebuilt when the snapshot was fully reloaded, when it is older than
+    SEGMENT_REFRESH_INTERVAL, or when more than SEGMENT_MAX_PENDING_CHANGES rows were patched
+    since the build (every patched row is re-scored on each request until then).
+    """
+
+    def __init__(self, get_snapshot):
+        self._get_snapshot = get_snapshot
+        self._thread = None
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self.index: Optional[SegmentIndex] = None
+        self.stats = {"builds": 0, "loaded_from_disk": 0, "lookups": 0, "exact": 0, "fallbacks": 0, "last_build_seconds": None}
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="segment-index", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=SEGMENT_CHECK_INTERVAL)
+
+    def record(self, event: str):
+        with self._lock:
+            self.stats[event] += 1
+
+    def refresh(self, force: bool = False):
+        snapshot = self._get_snapshot()
+        if snapshot is None:
+            return
+        index = self.index
+        if not force and index is not None and index.matches(snapshot):
+            stale = time.time() - index.built_at >= SEGMENT_REFRESH_INTERVAL
+            if not stale and index.pending_changes(snapshot) <= SEGMENT_MAX_PENDING_CHANGES:
+                return
+
+        if index is None and not force:
+            index = load_index(SEGMENT_INDEX_PATH, snapshot)
+            if index is not None and time.time() - index.built_at < SEGMENT_REFRESH_INTERVAL:
+                self.index = index
+                self.record("loaded_from_disk")
+                logger.info(f"✅ Segment index loaded from {SEGMENT_INDEX_PATH}")
+                return
+
+        started = time.monotonic()
+        self.index = build_index(snapshot)
+        with self._lock:
+            self.stats["builds"] += 1
+            self.stats["last_build_seconds"] = round(time.monotonic() - started, 3)
+        if SEGMENT_INDEX_PATH:
+            save_index(self.index, snapshot, SEGMENT_INDEX_PATH)
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.refresh()
+            except Exception as e:
+                logger.error(f"❌ Segment index refresh failed: {e}")
+            self._stop.wait(SEGMENT_CHECK_INTERVAL)
+
+    def status(self) -> dict:
+        snapshot = self._get_snapshot()
+        index = self.index
+        with self._lock:
+            stats = dict(self.stats)
+        if index is not None:
+            stats.update({
+                "segments": len(index.segments),
+                "depth": index.depth,
+                "built_at": index.built_at,
+                "current": snapshot is not None and index.matches(snapshot),
+                "pending_changes": index.pending_changes(snapshot) if snapshot is not None and index.matches(snapshot) else None,
+            })
+        return stats
+
+
+_refresher: Optional[SegmentRefresher] = None
+
+
+def start_refresher(get_snapshot):
+    """Start the background segment index job; called once the snapshot is loaded."""
+    global _refresher
+    if not SEGMENT_INDEX_ENABLED or _refresher is not None:
+        return
+    _refresher = SegmentRefresher(get_snapshot)
+    _refresher.start()
+
+
+def stop_refresher():
+    if _refresher is not None:
+        _refresher.stop()
+
+
+def lookup(snapshot: CatalogSnapshot, filters: dict):
+    """(candidate rows, cutoff) for the segment of `filters`, or None when a full scan is needed."""
+    if _refresher is None or _refresher.index is None:
+        return None
+    key = segment_key(filters)
+    if key is None:
+        return None
+    found = _refresher.index.candidates(snapshot, key)
+    if found is not None:
+        _refresher.record("lookups")
+    return found
+
+
+def record(event: str):
+    if _refresher is not None:
+        _refresher.record(event)
+
+
+def segment_status() -> Optional[dict]:
+    return _refresher.status() if _refresher is not None else None
@@ -0,0 +1,227 @@
+import os
+import json
+import time
+import secrets
+import logging
+import threading
+from collections import OrderedDict
+from typing import NamedTuple, Optional
+
+from app.db.async_db import run_db
+
+logger = logging.getLogger(__name__)
+
+# "memory": yalnızca bu süreçte; "postgres": premium_sessions tablosu (app/db/sql/premium_sessions.sql)
+SESSION_BACKEND = os.getenv("SESSION_BACKEND", "memory")
+SESSION_MAX_ENTRIES = int(os.getenv("SESSION_MAX_ENTRIES", "10000"))
+# Saniye; bu kadar süre kullanılmayan oturum geçersiz sayılır
+SESSION_TTL = float(os.getenv("SESSION_TTL", "86400"))
+# Oturumda hatırlanan en fazla gösterilmiş ürün sayısı
+SESSION_MAX_SHOWN = int(os.getenv("SESSION_MAX_SHOWN", "500"))
+
+
+class PremiumSession(NamedTuple):
+    session_id: str
+    uid: Optional[str]
+    filled_table: Optional[dict]
+    language: Optional[str]
+    shown_ids: tuple
+    updated_at: float
+
+    def data(self) -> dict:
+        return {"filled_table": self.filled_table, "language": self.language, "shown_ids": list(self.shown_ids)}
+
+    def with_shown(self, product_ids) -> "PremiumSession":
+        """Remember product ids as shown (most recent SESSION_MAX_SHOWN kept)."""
+        seen = set(self.shown_ids)
+        shown = self.shown_ids + tuple(pid for pid in product_ids if pid not in seen)
+        return self._replace(shown_ids=shown[-SESSION_MAX_SHOWN:])
+
+
+class SessionBackend:
+    """Persistent tier behind the in-memory LRU. This base keeps nothing (memory-only sessions)."""
+
+    name = "memory"
+    # Diğer worker'lar da yazar; bellekteki kopya her okumada arka uçla karşılaştırılır
+    shared = False
+
+    async def load(self, session_id: str, cached: Optional[PremiumSession] = None) -> Optional[PremiumSession]:
+        """
+        The stored session, or None when there is none. With `cached`, the copy this process holds:
+        it is returned as is when the stored one is not newer, so unchanged sessions are not re-read.
+        """
+        return None
+
+    async def save(self, session: PremiumSession):
+        pass
+
+    async def delete(self, session_id: str):
+        pass
+
+
+def _load_row(conn, session_id: str, ttl: float, cached_at: Optional[float]):
+    with conn.cursor() as cur:
+        # data yalnızca bellekteki kopyadan yeniyse okunur
+        cur.execute(
+            """
+            SELECT uid, CASE WHEN %s IS NULL OR updated_at > to_timestamp(%s) THEN data END,
+                   extract(epoch FROM updated_at)
+            FROM premium_sessions
+            WHERE id = %s AND updated_at > now() - make_interval(secs => %s)
+            """,
+            (cached_at, cached_at, session_id, ttl),
+        )
+        return cur.fetchone()
+
+
+def _save_row(conn, session: PremiumSession):
+    with conn.cursor() as cur:
+        cur.execute(
+            """
+            INSERT INTO premium_sessions (id, uid, data, updated_at)
+            VALUES (%s, %s, %s, to_timestamp(%s))
+            ON CONFLICT (id) DO UPDATE SET data = EXCLUDED.data, updated_at = EXCLUDED.updated_at
+            """,
+            (session.session_id, session.uid, json.dumps(session.data()), session.updated_at),
+        )
+    conn.commit()
+
+
+def _delete_row(conn, session_id: str):
+    with conn.cursor() as cur:
+        cur.execute("DELETE FROM premium_sessions WHERE id = %s", (session_id,))
+    conn.commit()
+
+
+class PostgresSessionBackend(SessionBackend):
+    """Sessions in the premium_sessions table, so they survive restarts and are shared between workers."""
+
+    name = "postgres"
+    shared = True
+
+    def __init__(self, ttl: float = SESSION_TTL):
+        self.ttl = ttl
+
+    async def load(self, session_id: str, cached: Optional[PremiumSession] = None) -> Optional[PremiumSession]:
+        row = await run_db(_load_row, session_id, self.ttl, cached.updated_at if cached is not None else None)
+        if row is None:
+            return None
+        uid, data, updated_at = row
+        if data is None:
+            return cached
+        data = data if isinstance(data, dict) else json.loads(data)
+        return PremiumSession(
+            session_id, uid, data.get("filled_table"), data.get("language"),
+            tuple(data.get("shown_ids") or ()), float(updated_at),
+        )
+
+    async def save(self, session: PremiumSession):
+        await run_db(_save_row, session)
+
+    async def delete(self, session_id: str):
+        await run_db(_delete_row, session_id)
+
+
+_BACKENDS = {"memory": SessionBackend, "postgres": PostgresSessionBackend}
+
+
+def backend_from_env() -> SessionBackend:
+    backend = _BACKENDS.get(SESSION_BACKEND)
+    if backend is None:
+        logger.warning(f"⚠️ Unknown SESSION_BACKEND '{SESSION_BACKEND}', keeping sessions in memory")
+        backend = SessionBackend
+    return backend()
+
+
+class SessionStore:
+    """
+    Premium conversation state keyed by session id: an LRU of recent sessions in front of a
+    pluggable backend. Saves write through to the backend; a session missing from memory (other
+    worker, restart, eviction) is loaded from it. With a shared backend the memory copy is only
+    used after the backend confirms no other worker saved a newer one. Sessions idle for longer
+    than ttl expire.
+    """
+
+    def __init__(self, backend: Optional[SessionBackend] = None, max_entries: int = SESSION_MAX_ENTRIES,
+                 ttl: float = SESSION_TTL):
+        self.backend = backend or SessionBackend()
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "backend_hits": 0, "misses": 0, "expired": 0, "created": 0, "saves": 0}
+
+    def create(self, uid: Optional[str], filled_table: Optional[dict] = None) -> PremiumSession:
+        """A new, not yet saved session."""
+        self._count("created")
+        return PremiumSession(secrets.token_urlsafe(16), uid, filled_table, None, (), time.time())
+
+    async def get(self, session_id: str, uid: Optional[str] = None) -> Optional[PremiumSession]:
+        """The session, or None when it is unknown, expired or belongs to another user."""
+        with self._lock:
+            session = self._entries.get(session_id)
+            if session is not None:
+                self._entries.move_to_end(session_id)
+        if session is None or self.backend.shared:
+            cached, session = session, await self.backend.load(session_id, session)
+            if session is None and cached is not None:
+                # Başka bir worker silmiş ya da süresi dolmuş
+                with self._lock:
+                    self._entries.pop(session_id, None)
+            elif session is not None and session is not cached:
+                self._count("backend_hits")
+                self._remember(session)
+            elif session is not None:
+                self._count("hits")
+        else:
+            self._count("hits")
+        if session is None:
+            self._count("misses")
+            return None
+        if session.updated_at + self.ttl <= time.time():
+            self._count("expired")
+            await self.delete(session_id)
+            return None
+        if session.uid != uid:
+            return None
+        return session
+
+    async def save(self, session: PremiumSession) -> PremiumSession:
+        session = session._replace(updated_at=time.time())
+        self._remember(session)
+        await self.backend.save(session)
+        self._count("saves")
+        return session
+
+    async def delete(self, session_id: str):
+        with self._lock:
+            self._entries.pop(session_id, None)
+        await self.backend.delete(session_id)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "backend": self.backend.name,
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl": self.ttl,
+                **self._stats,
+            }
+
+    def _remember(self, session: PremiumSession):
+        with self._lock:
+            self._entries[session.session_id] = session
+            self._entries.move_to_end(session.session_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def _count(self, event: str):
+        with self._lock:
+            self._stats[event] += 1
+
+
+session_store = SessionStore(backend_from_env())
+
+
+def session_stats() -> dict:
+    return session_store.stats()
@@ -0,0 +1,282 @@
+import io
+import os
+import queue
+import hashlib
+import logging
+import threading
+from datetime import datetime
+from typing import NamedTuple, Optional
+
+from app.db.database import db_connection
+from app.services import images
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # Pillow yoksa varyant üretilmez; thumbnail endpoint'leri orijinal resmi döndürür
+    Image = ImageOps = None
+
+logger = logging.getLogger(__name__)
+
+# Varyant tablosu app/db/sql/image_variants.sql ile oluşturulur
+THUMBNAIL_SIZES = tuple(sorted(int(s) for s in os.getenv("THUMBNAIL_SIZES", "128,256,512").split(",")))
+# Tercih sırası: istemci Accept başlığında ilkini destekliyorsa o kullanılır
+THUMBNAIL_FORMATS = tuple(f.strip().lower() for f in os.getenv("THUMBNAIL_FORMATS", "webp,jpeg").split(","))
+THUMBNAIL_QUALITY = int(os.getenv("THUMBNAIL_QUALITY", "80"))
+# Saniye; 0 ise arka planda toplu üretim yapılmaz, varyantlar yalnızca ilk istekte üretilir
+THUMBNAIL_BACKFILL_INTERVAL = float(os.getenv("THUMBNAIL_BACKFILL_INTERVAL", "0"))
+THUMBNAIL_BACKFILL_BATCH = int(os.getenv("THUMBNAIL_BACKFILL_BATCH", "100"))
+
+MEDIA_TYPES = {"webp": "image/webp", "jpeg": "image/jpeg", "png": "image/png"}
+_PIL_FORMATS = {"webp": "WEBP", "jpeg": "JPEG", "png": "PNG"}
+
+
+class VariantMeta(NamedTuple):
+    content_hash: str
+    updated_at: datetime
+    media_type: str
+
+
+def available() -> bool:
+    return Image is not None
+
+
+def nearest_size(size: int) -> int:
+    """Smallest configured size bucket that is at least `size`, or the largest bucket."""
+    for bucket in THUMBNAIL_SIZES:
+        if bucket >= size:
+            return bucket
+    return THUMBNAIL_SIZES[-1]
+
+
+def negotiate_format(accept: Optional[str]) -> str:
+    """First configured format the client lists in Accept; JPEG (or the last format) otherwise."""
+    accept = (accept or "").lower()
+    for fmt in THUMBNAIL_FORMATS:
+        if MEDIA_TYPES[fmt] in accept:
+            return fmt
+    return "jpeg" if "jpeg" in THUMBNAIL_FORMATS else THUMBNAIL_FORMATS[-1]
+
+
+def render(data: bytes, size: int, fmt: str) -> bytes:
+    """Downscale an image to fit in size x size (never upscaled) and encode it as `fmt`."""
+    with Image.open(io.BytesIO(data)) as original:
+        original.draft("RGB", (size, size))
+        img = ImageOps.exif_transpose(original)
+        img.thumbnail((size, size), Image.LANCZOS)
+        has_alpha = img.mode in ("RGBA", "LA") or (img.mode == "P" and "transparency" in img.info)
+        if fmt == "jpeg" and has_alpha:
+            # JPEG saydamlık desteklemez; beyaz zemine yerleştir
+            rgba = img.convert("RGBA")
+            flat = Image.new("RGB", img.size, (255, 255, 255))
+            flat.paste(rgba, mask=rgba.getchannel("A"))
+            img = flat
+        else:
+            img = img.convert("RGBA" if has_alpha else "RGB")
+        out = io.BytesIO()
+        img.save(out, _PIL_FORMATS[fmt], quality=THUMBNAIL_QUALITY)
+        return out.getvalue()
+
+
+def fetch_variant_meta(conn, image_id: int, size: int, fmt: str, source_hash: str) -> Optional[VariantMeta]:
+    """Validators of a stored variant, or None if it is missing or was made from an older original."""
+    with conn.cursor() as cur:
+        cur.execute(
+            """
+            SELECT content_hash, created_at FROM product_image_variants
+            WHERE image_id = %s AND size = %s AND format = %s AND source_hash = %s
+            """,
+            (image_id, size, fmt, source_hash)
+        )
+        result = cur.fetchone()
+    return VariantMeta(result[0], result[1], MEDIA_TYPES[fmt]) if result else None
+
+
+def fetch_variant_data(conn, image_id: int, size: int, fmt: str, content_hash: str) -> Optional[bytes]:
+    """Bytes of the variant described by content_hash, or None if it has since been regenerated or removed."""
+    with conn.cursor() as cur:
+        cur.execute(
+            """
+            SELECT data FROM product_image_variants
+            WHERE image_id = %s AND size = %s AND format = %s AND content_hash = %s
+            """,
+            (image_id, size, fmt, content_hash)
+        )
+        result = cur.fetchone()
+    return bytes(result[0]) if result else None
+
+
+def store_variant(conn, image_id: int, size: int, fmt: str, source_hash: str, data: bytes) -> VariantMeta:
+    with conn.cursor() as cur:
+        cur.execute(
+            """
+            INSERT INTO product_image_variants (image_id, size, format, source_hash, content_hash, data)
+            VALUES (%s, %s, %s, %s, %s, %s)
+            ON CONFLICT (image_id, size, format) DO UPDATE
+            SET source_hash = EXCLUDED.source_hash, content_hash = EXCLUDED.content_hash,
+                data = EXCLUDED.data, created_at = now()
+            RETURNING content_hash, created_at
+            """,
+            (image_id, size, fmt, source_hash, hashlib.sha256(data).hexdigest(), data)
+        )
+        content_hash, created_at = cur.fetchone()
+    conn.commit()
+    return VariantMeta(content_hash, created_at, MEDIA_TYPES[fmt])
+
+
+def lookup_thumbnail_variant(conn, product_id: int, size: int, fmt: str, not_modified):
+    """
+    Find the variant of a product's first image.
+    Returns (source ImageMeta, VariantMeta, bytes); the source is None when the product has no image,
+    the variant is None when it still has to be generated, and the bytes are None when
+    not_modified(variant) says the client copy is current.
+    """
+    source = images.fetch_image_meta(conn, product_id)
+    if source is None:
+        return None, None, None
+    meta = fetch_variant_meta(conn, source.image_id, size, fmt, source.content_hash)
+    if meta is None or not_modified(meta):
+        return source, meta, None
+    return source, meta, fetch_variant_data(conn, source.image_id, size, fmt, meta.content_hash)
+
+
+def generate_variants(conn, image_id: int) -> int:
+    """Render and store every configured size/format of an image that is missing or stale. Returns the count."""
+    with conn.cursor() as cur:
+        cur.execute("SELECT content_hash, image_data FROM product_images WHERE id = %s", (image_id,))
+        row = cur.fetchone()
+        if row is None or row[1] is None:
+            return 0
+        source_hash, data = row[0], bytes(row[1])
+        cur.execute(
+            "SELECT size, format FROM product_image_variants WHERE image_id = %s AND source_hash = %s",
+            (image_id, source_hash)
+        )
+        existing = set(cur.fetchall())
+    conn.rollback()
+
+    created = 0
+    for size in THUMBNAIL_SIZES:
+        for fmt in THUMBNAIL_FORMATS:
+            if (size, fmt) not in existing:
+                store_variant(conn, image_id, size, fmt, source_hash, render(data, size, fmt))
+                created += 1
+    return created
+
+
+def images_missing_variants(conn, limit: int, exclude=()) -> list:
+    """
+    Ids of first (thumbnail) images that do not yet have every current variant.
+    `exclude` skips images that already failed, so they cannot fill every batch and stall the scan.
+    """
+    with conn.cursor() as cur:
+        cur.execute(
+            """
+            SELECT pi.id
+            FROM (SELECT DISTINCT ON (product_id) id, content_hash FROM product_images
+                  ORDER BY product_id, image_order) pi
+            LEFT JOIN product_image_variants v ON v.image_id = pi.id AND v.source_hash = pi.content_hash
+            WHERE pi.id <> ALL(%s::bigint[])
+            GROUP BY pi.id
+            HAVING count(v.image_id) < %s
+            LIMIT %s
+            """,
+            (sorted(exclude), len(THUMBNAIL_SIZES) * len(THUMBNAIL_FORMATS), limit)
+        )
+        return [row[0] for row in cur.fetchall()]
+
+
+class ThumbnailWorker:
+    """
+    Background derivation of thumbnail variants.
+
+    Images are queued after their first variant was generated on request, so the remaining
+    sizes and formats follow without blocking anyone. With THUMBNAIL_BACKFILL_INTERVAL > 0 the
+    worker also scans for thumbnail images without variants and processes them in batches.
+    """
+
+    def __init__(self):
+        self._queue = queue.Queue()
+        self._pending = set()
+        # Çözülemeyen resimler toplu taramada tekrar denenmez
+        self._failed = set()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self.stats = {"images": 0, "variants": 0, "failures": 0}
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="thumbnail-worker", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._queue.put(None)
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+
+    def submit(self, image_id: int):
+        with self._lock:
+            if image_id in self._pending:
+                return
+            self._pending.add(image_id)
+        self._queue.put(image_id)
+
+    def _run(self):
+        timeout = THUMBNAIL_BACKFILL_INTERVAL or None
+        while not self._stop.is_set():
+            try:
+                image_id = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                self._backfill()
+                continue
+            if image_id is None:
+                break
+            self._process(image_id)
+
+    def _process(self, image_id: int):
+        try:
+            with db_connection() as conn:
+                created = generate_variants(conn, image_id)
+            self.stats["images"] += 1
+            self.stats["variants"] += created
+        except Exception as e:
+            self.stats["failures"] += 1
+            self._failed.add(image_id)
+            logger.warning(f"⚠️ Thumbnail variants for image {image_id} failed: {e}")
+        finally:
+            with self._lock:
+                self._pending.discard(image_id)
+
+    def _backfill(self):
+        try:
+            with db_connection() as conn:
+                image_ids = images_missing_variants(conn, THUMBNAIL_BACKFILL_BATCH, self._failed)
+        except Exception as e:
+            logger.error(f"❌ Thumbnail backfill scan failed: {e}")
+            return
+        for image_id in image_ids:
+            self.submit(image_id)
+
+
+_worker: Optional[ThumbnailWorker] = None
+
+
+def start_thumbnail_worker():
+    global _worker
+    if not available():
+        logger.warning("⚠️ Pillow is not installed; thumbnail variants are disabled")
+        return
+    if _worker is None:
+        _worker = ThumbnailWorker()
+        _worker.start()
+
+
+def stop_thumbnail_worker():
+    if _worker is not None:
+        _worker.stop()
+
+
+def submit(image_id: int):
+    """Queue the remaining variants of an image for background generation."""
+    if _worker is not None:
+        _worker.submit(image_id)
@@ -0,0 +1,91 @@
+"""
+Recall@10 and latency of the IVF (ANN) scorer against the exact in-memory scorer.
+
+Builds a synthetic catalog (no database needed), an IVF index for it, and runs random filter
+combinations through both scorers. Recall@10 is the share of the exact top 10 ids that the
+ANN scorer also returns.
+
+    python -m benchmarks.ann_recall --size 1000000 --nprobe 4 8 16 32 64
+"""
+import argparse
+import time
+
+import numpy as np
+
+from app.services import ann, scoring
+from app.services.catalog import CatalogSnapshot, _object_array
+from app.services.features import AGE_COLUMNS, FEATURE_COLUMNS, GENDER_COLUMNS, INTEREST_COLUMNS, SPECIAL_COLUMNS
+from benchmarks.budget_prefilter import synthetic_snapshot
+
+
+def clustered_snapshot(n: int, archetypes: int = 200, seed: int = 0) -> CatalogSnapshot:
+    """Products scattered around a few hundred feature profiles, closer to real catalogs than uniform noise."""
+    rng = np.random.default_rng(seed)
+    centers = rng.integers(0, 11, size=(archetypes, len(FEATURE_COLUMNS)))
+    noise = rng.normal(0, 1.5, size=(n, len(FEATURE_COLUMNS)))
+    features = np.clip(np.rint(centers[rng.integers(0, archetypes, n)] + noise), 0, 10).astype(np.float32)
+    return CatalogSnapshot(
+        ids=np.arange(1, n + 1, dtype=np.int64),
+        features=features,
+        prices=np.round(rng.lognormal(mean=7.0, sigma=1.0, size=n), 2),
+        names=_object_array([f"Product {i}" for i in range(n)]),
+        sites=_object_array(["site"] * n),
+        links=_object_array([""] * n),
+        lower_7=_object_array([False] * n),
+        lower_30=_object_array([False] * n),
+    )
+
+
+def random_queries(count: int, seed: int = 1) -> list:
+    rng = np.random.default_rng(seed)
+    queries = []
+    for _ in range(count):
+        cols = [rng.choice(AGE_COLUMNS), rng.choice(GENDER_COLUMNS), rng.choice(SPECIAL_COLUMNS)]
+        cols += list(rng.choice(INTEREST_COLUMNS, size=rng.integers(1, 4), replace=False))
+        queries.append([str(c) for c in cols])
+    return queries
+
+
+def exact_top(snapshot: CatalogSnapshot, cols: list, k: int) -> np.ndarray:
+    dist = scoring.distances(snapshot, cols)
+    return snapshot.ids[scoring.rank_top_k(dist, snapshot.ids, k)]
+
+
+def ann_top(snapshot: CatalogSnapshot, index: ann.IvfIndex, cols: list, k: int, nprobe: int) -> np.ndarray:
+    rows = index.candidates(snapshot, cols, k, nprobe=nprobe)
+    dist = scoring.distances(snapshot, cols, rows)
+    return snapshot.ids[rows[scoring.rank_top_k(dist, snapshot.ids[rows], k)]]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size", type=int, default=1_000_000)
+    parser.add_argument("--data", choices=["clustered", "uniform"], default="clustered")
+    parser.add_argument("--lists", type=int, default=0, help="0: ~4 * sqrt(size)")
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[4, 8, 16, 32, 64])
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--k", type=int, default=10)
+    args = parser.parse_args()
+
+    snapshot = clustered_snapshot(args.size) if args.data == "clustered" else synthetic_snapshot(args.size)
+    started = time.perf_counter()
+    index = ann.build_index(snapshot, n_lists=args.lists)
+    print(f"index: {index.n_lists} lists, built in {time.perf_counter() - started:.2f}s")
+
+    queries = random_queries(args.queries)
+    started = time.perf_counter()
+    exact = [set(exact_top(snapshot, cols, args.k).tolist()) for cols in queries]
+    exact_ms = (time.perf_counter() - started) / len(queries) * 1000
+    print(f"{'exact':>8} {'':>10} {exact_ms:>9.3f} ms/query")
+
+    print(f"{'nprobe':>8} {'recall@' + str(args.k):>10} {'ms/query':>9}")
+    for nprobe in args.nprobe:
+        started = time.perf_counter()
+        found = [ann_top(snapshot, index, cols, args.k, nprobe) for cols in queries]
+        ms = (time.perf_counter() - started) / len(queries) * 1000
+        recall = np.mean([len(e & set(f.tolist())) / args.k for e, f in zip(exact, found)])
+        print(f"{nprobe:>8} {recall:>10.3f} {ms:>9.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+"""
+Latency of in-memory scoring with the budget pre-filter.
+
+Builds synthetic catalog snapshots (no database needed) and times scoring.top_products for
+budget windows of different widths. With the price index the latency should follow the number
+of products inside the window, not the catalog size.
+
+    python -m benchmarks.budget_prefilter --sizes 100000 1000000 --repeat 50
+"""
+import argparse
+import time
+
+import numpy as np
+
+from app.services import scoring
+from app.services.catalog import CatalogSnapshot, _object_array
+from app.services.features import FEATURE_COLUMNS
+
+
+def synthetic_snapshot(n: int, seed: int = 0) -> CatalogSnapshot:
+    rng = np.random.default_rng(seed)
+    return CatalogSnapshot(
+        ids=np.arange(1, n + 1, dtype=np.int64),
+        features=rng.integers(0, 11, size=(n, len(FEATURE_COLUMNS))).astype(np.float32),
+        prices=np.round(rng.lognormal(mean=7.0, sigma=1.0, size=n), 2),
+        names=_object_array([f"Product {i}" for i in range(n)]),
+        sites=_object_array(["site"] * n),
+        links=_object_array([""] * n),
+        lower_7=_object_array([False] * n),
+        lower_30=_object_array([False] * n),
+    )
+
+
+def time_call(fn, repeat: int) -> float:
+    fn()
+    started = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - started) / repeat * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100_000, 1_000_000])
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    filters = {"age_19_29": True, "gender_male": True, "special_birthday": True, "interest_technology": True}
+    windows = [(1000, 1050), (1000, 1500), (500, 3000), (0, 100_000), (None, None)]
+
+    print(f"{'catalog':>10} {'window':>16} {'candidates':>11} {'ms/query':>9}")
+    for n in args.sizes:
+        snapshot = synthetic_snapshot(n)
+        for low, high in windows:
+            f = {**filters, "min_budget": low, "max_budget": high}
+            rows = scoring.budget_rows(snapshot, low, high)
+            candidates = n if rows is None else len(rows)
+            ms = time_call(lambda: scoring.top_products(f, snapshot=snapshot), args.repeat)
+            window = "none" if low is None else f"{low}-{high}"
+            print(f"{n:>10} {window:>16} {candidates:>11} {ms:>9.3f}")
+
+
+if __name__ == "__main__":
+    main()
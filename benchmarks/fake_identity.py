@@ -0,0 +1,125 @@
+"""
+Local stand-in for the Firebase Auth REST API (accounts:signInWithPassword), for exercising sign-in
+without a Firebase project.
+
+Any email signs in with --password; other passwords get Firebase's 400 INVALID_PASSWORD. Answers
+come after a configurable latency, a configurable share fails with 503, and --down fails them all.
+The returned idToken is an RS256 token signed with a throwaway key whose certificate is written to
+--certs-file, so the app verifies it locally. GET /stats shows request counts and how many TCP
+connections clients opened (keep-alive reuse shows up as few connections for many requests).
+
+    python -m benchmarks.fake_identity --port 8910 --certs-file /tmp/fake_certs.json
+    FIREBASE_AUTH_URL=http://127.0.0.1:8910/v1/accounts FIREBASE_PROJECT_ID=hediyele-test \\
+        FIREBASE_CERTS_FILE=/tmp/fake_certs.json uvicorn app.main:app
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import random
+from typing import Optional
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+from google.auth import crypt
+
+from benchmarks.token_verify import KID, self_signed_pair, sign
+
+
+class FakeSettings:
+    latency = 0.05
+    jitter = 0.02
+    error_rate = 0.0
+    down = False
+    password = "secret"
+
+
+settings = FakeSettings()
+stats = {"requests": 0, "signins": 0, "rejected": 0, "errors": 0}
+_connections = set()
+_signer: Optional[crypt.RSASigner] = None
+_cert_pem: Optional[str] = None
+app = FastAPI(title="fake-identity")
+
+
+def _keys():
+    global _signer, _cert_pem
+    if _signer is None:
+        private_pem, _cert_pem = self_signed_pair()
+        _signer = crypt.RSASigner.from_string(private_pem, key_id=KID)
+    return _signer, _cert_pem
+
+
+def _error(message: str, status_code: int) -> JSONResponse:
+    return JSONResponse({"error": {"code": status_code, "message": message, "errors": []}}, status_code=status_code)
+
+
+@app.post("/v1/accounts:signInWithPassword")
+async def sign_in_with_password(request: Request):
+    stats["requests"] += 1
+    _connections.add((request.client.host, request.client.port))
+    body = await request.json()
+    await asyncio.sleep(max(0.0, settings.latency + random.uniform(-settings.jitter, settings.jitter)))
+    if settings.down or random.random() < settings.error_rate:
+        stats["errors"] += 1
+        return _error("UNAVAILABLE", 503)
+    email = body.get("email") or ""
+    if body.get("password") != settings.password:
+        stats["rejected"] += 1
+        return _error("INVALID_PASSWORD", 400)
+
+    stats["signins"] += 1
+    uid = hashlib.sha256(email.encode("utf-8")).hexdigest()[:28]
+    signer, _ = _keys()
+    return {
+        "kind": "identitytoolkit#VerifyPasswordResponse",
+        "localId": uid,
+        "email": email,
+        "displayName": "",
+        "idToken": sign(signer, uid, email=email, premium=False),
+        "registered": True,
+        "refreshToken": f"fake-refresh-{uid}",
+        "expiresIn": "3600",
+    }
+
+
+@app.get("/stats")
+async def get_stats():
+    return {**stats, "connections": len(_connections)}
+
+
+def configure(latency=None, jitter=None, error_rate=None, down=None, password=None):
+    for name, value in locals().items():
+        if value is not None:
+            setattr(settings, name, value)
+
+
+def write_certs(path: str):
+    """Write {kid: certificate} for FIREBASE_CERTS_FILE."""
+    _, cert_pem = _keys()
+    with open(path, "w") as f:
+        json.dump({KID: cert_pem}, f)
+
+
+def main():
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8910)
+    parser.add_argument("--latency", type=float, default=settings.latency, help="seconds per response")
+    parser.add_argument("--jitter", type=float, default=settings.jitter)
+    parser.add_argument("--error-rate", type=float, default=settings.error_rate, help="share of 503 responses")
+    parser.add_argument("--down", action="store_true", help="answer every request with 503")
+    parser.add_argument("--password", default=settings.password, help="the password every account accepts")
+    parser.add_argument("--certs-file", default="", help="write the token signing certificate here")
+    args = parser.parse_args()
+
+    configure(args.latency, args.jitter, args.error_rate, args.down, args.password)
+    if args.certs_file:
+        write_certs(args.certs_file)
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,176 @@
+"""
+Local stand-in for the OpenAI chat completions API, for exercising the LLM client without a key.
+
+Answers POST /v1/chat/completions after a configurable latency (time to the first token) and
+fails a configurable share of requests with 500 or 429 (with Retry-After). Structured premium
+requests get a schema-valid answer that keeps the table sent in the prompt and asks for its first
+missing field; an --off-script-rate share instead asks for another field, or fills the missing field
+and still asks for it, like a model whose question does not match its own table. With stream=true the answer arrives in small chunks, one per --token-delay;
+without it the whole answer comes after the same total generation time. GET /stats shows request
+counts and the highest number of concurrent requests seen.
+
+    python -m benchmarks.fake_openai --port 8900 --latency 0.3 --error-rate 0.05
+    OPENAI_BASE_URL=http://127.0.0.1:8900/v1 OPENAI_API_KEY=fake uvicorn app.main:app
+"""
+import argparse
+import asyncio
+import json
+import random
+import re
+import time
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+from app.schemas.schemas import ProductFilterSchema
+from app.services import filter_rules, premium
+
+
+class FakeSettings:
+    latency = 0.3
+    jitter = 0.1
+    error_rate = 0.0
+    rate_limit_rate = 0.0
+    retry_after = 0.2
+    # Akışta parça başına bekleme ve parça uzunluğu (karakter)
+    token_delay = 0.02
+    token_chars = 4
+    off_script_rate = 0.0
+
+
+settings = FakeSettings()
+stats = {"requests": 0, "streams": 0, "errors": 0, "rate_limited": 0, "off_script": 0, "in_flight": 0,
+         "max_in_flight": 0}
+app = FastAPI(title="fake-openai")
+
+
+_TABLE = re.compile(r"Mevcut doldurulmuş tablo[^\n]*:\s*(\{.*?\})\s*\n")
+
+
+def _premium_answer(body: dict) -> str:
+    # İstemdeki tablo aynen geri döner; böylece birkaç turluk sohbetlerde kuralların doldurduğu alanlar korunur
+    prompt = "".join(m.get("content") or "" for m in body.get("messages", []) if m.get("role") == "user")
+    match = _TABLE.search(prompt)
+    table = {**ProductFilterSchema().model_dump(), **(json.loads(match.group(1)) if match else {})}
+    field = premium.missing_field(ProductFilterSchema(**table))
+    if field and random.random() < settings.off_script_rate:
+        stats["off_script"] += 1
+        if random.random() < 0.5:
+            # Başka bir alanı sorar
+            field = random.choice([f for f in premium.FOLLOW_UP_FIELDS if f != field])
+        else:
+            # Eksik alanı kendisi doldurur ama yine de onu sorar
+            table = {**table, **({"min_budget": 500, "max_budget": 1000} if field == "budget"
+                                 else {filter_rules.GROUP_FIELDS[field][0]: True})}
+    return json.dumps({
+        "language": "tr",
+        "follow_up_field": field or "none",
+        "follow_up_question": (
+            "Hediyeyi kaç yaşındaki biri için düşünüyorsunuz? Genç biri mi, yetişkin biri mi?" if field == "age"
+            else premium.FOLLOW_UP_QUESTIONS[field]["tr"] if field in premium.FOLLOW_UP_QUESTIONS else None
+        ),
+        "filters": table,
+    }, ensure_ascii=False)
+
+
+def _content(body: dict) -> str:
+    response_format = body.get("response_format") or {}
+    if response_format.get("json_schema", {}).get("name") == "premium_turn":
+        return _premium_answer(body)
+    return "ok"
+
+
+def _completion(body: dict, content: str) -> dict:
+    return {
+        "id": f"chatcmpl-fake-{stats['requests']}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": body.get("model", "fake"),
+        "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+        "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0},
+    }
+
+
+@app.post("/v1/chat/completions")
+async def chat_completions(request: Request):
+    body = await request.json()
+    stats["requests"] += 1
+    stats["in_flight"] += 1
+    stats["max_in_flight"] = max(stats["max_in_flight"], stats["in_flight"])
+    try:
+        await asyncio.sleep(max(0.0, settings.latency + random.uniform(-settings.jitter, settings.jitter)))
+        roll = random.random()
+        if roll < settings.rate_limit_rate:
+            stats["rate_limited"] += 1
+            return JSONResponse(
+                {"error": {"message": "Rate limit reached", "type": "rate_limit_error"}},
+                status_code=429, headers={"retry-after": str(settings.retry_after)},
+            )
+        if roll < settings.rate_limit_rate + settings.error_rate:
+            stats["errors"] += 1
+            return JSONResponse({"error": {"message": "Injected failure", "type": "server_error"}}, status_code=500)
+        content = _content(body)
+        if body.get("stream"):
+            return StreamingResponse(_stream(body, content), media_type="text/event-stream")
+        await asyncio.sleep(settings.token_delay * -(-len(content) // settings.token_chars))
+        return _completion(body, content)
+    finally:
+        stats["in_flight"] -= 1
+
+
+async def _stream(body: dict, content: str):
+    def chunk(delta: dict, finish_reason=None) -> str:
+        payload = {
+            "id": f"chatcmpl-fake-{stats['requests']}",
+            "object": "chat.completion.chunk",
+            "created": int(time.time()),
+            "model": body.get("model", "fake"),
+            "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+        }
+        return f"data: {json.dumps(payload, ensure_ascii=False)}\n\n"
+
+    stats["streams"] += 1
+    yield chunk({"role": "assistant", "content": ""})
+    for i in range(0, len(content), settings.token_chars):
+        await asyncio.sleep(settings.token_delay)
+        yield chunk({"content": content[i:i + settings.token_chars]})
+    yield chunk({}, "stop")
+    yield "data: [DONE]\n\n"
+
+
+@app.get("/stats")
+async def get_stats():
+    return stats
+
+
+def configure(latency=None, jitter=None, error_rate=None, rate_limit_rate=None, retry_after=None,
+              token_delay=None, token_chars=None, off_script_rate=None):
+    for name, value in locals().items():
+        if value is not None:
+            setattr(settings, name, value)
+
+
+def main():
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8900)
+    parser.add_argument("--latency", type=float, default=settings.latency, help="seconds per response")
+    parser.add_argument("--jitter", type=float, default=settings.jitter)
+    parser.add_argument("--error-rate", type=float, default=settings.error_rate, help="share of 500 responses")
+    parser.add_argument("--rate-limit-rate", type=float, default=settings.rate_limit_rate, help="share of 429 responses")
+    parser.add_argument("--retry-after", type=float, default=settings.retry_after)
+    parser.add_argument("--token-delay", type=float, default=settings.token_delay, help="seconds between streamed chunks")
+    parser.add_argument("--token-chars", type=int, default=settings.token_chars, help="characters per streamed chunk")
+    parser.add_argument("--off-script-rate", type=float, default=settings.off_script_rate,
+                        help="share of premium answers whose question does not match their table")
+    args = parser.parse_args()
+
+    configure(args.latency, args.jitter, args.error_rate, args.rate_limit_rate, args.retry_after,
+              args.token_delay, args.token_chars, args.off_script_rate)
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""
+Coverage, agreement and latency of the rule-based premium filter extractor.
+
+Each sample carries the filter groups the LLM extracted for it (bundled reference answers, or
+fresh ones with --live, which needs OPENAI_API_KEY). For every group the report shows how often
+the rules resolved it with enough confidence and how often a resolved value agrees with the
+LLM; "llm skipped" is the share of messages that would need no LLM call on an empty table.
+
+    python -m benchmarks.filter_rules --errors
+"""
+import argparse
+import asyncio
+import json
+import os
+import time
+
+from app.schemas.schemas import ProductFilterSchema
+from app.services import filter_rules, llm, premium
+
+SAMPLES = os.path.join(os.path.dirname(__file__), "data", "filter_samples.jsonl")
+
+
+def load_samples(path: str = SAMPLES) -> list:
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def group_values(table: dict) -> dict:
+    """Comparable per-group values of a filter table (the same shape as the bundled references)."""
+    def single(group):
+        chosen = [field for field in filter_rules.GROUP_FIELDS[group] if table.get(field)]
+        return chosen[0] if len(chosen) == 1 else None
+
+    budget = (table.get("min_budget"), table.get("max_budget"))
+    return {
+        "age": single("age"),
+        "gender": single("gender"),
+        "special": single("special"),
+        "interests": sorted(field for field in filter_rules.GROUP_FIELDS["interests"] if table.get(field)),
+        "budget": None if budget == (None, None) else list(budget),
+    }
+
+
+def _same(group: str, ours, reference) -> bool:
+    if group == "budget" and ours and reference:
+        return all((a is None) == (b is None) and (a is None or abs(a - b) <= 1) for a, b in zip(ours, reference))
+    if group == "interests":
+        return sorted(ours or []) == sorted(reference or [])
+    return ours == reference
+
+
+def live_reference(text: str) -> dict:
+    turn = asyncio.run(premium.extract_turn(text, ProductFilterSchema().model_dump(), llm.LlmClient()))
+    return group_values(premium.merge_filters(ProductFilterSchema().model_dump(), turn.filters))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--samples", default=SAMPLES)
+    parser.add_argument("--min-confidence", type=float, default=filter_rules.RULES_MIN_CONFIDENCE)
+    parser.add_argument("--live", action="store_true", help="compare against fresh LLM answers instead of the bundled ones")
+    parser.add_argument("--repeat", type=int, default=200, help="passes over the samples for the latency figure")
+    parser.add_argument("--errors", action="store_true", help="print disagreements")
+    args = parser.parse_args()
+
+    samples = load_samples(args.samples)
+    empty = ProductFilterSchema().model_dump()
+    stats = {group: {"mentioned": 0, "resolved": 0, "agree": 0} for group in filter_rules.GROUPS}
+    skipped, errors = 0, []
+
+    for sample in samples:
+        reference = live_reference(sample["text"]) if args.live else sample["llm"]
+        extraction = filter_rules.extract(sample["text"])
+        table = filter_rules.apply(empty, extraction, args.min_confidence)
+        ours = group_values(table)
+        skipped += not filter_rules.needs_llm(table, extraction, args.min_confidence)
+        resolved = extraction.resolved(args.min_confidence)
+        for group in filter_rules.GROUPS:
+            counts = stats[group]
+            counts["mentioned"] += bool(reference[group])
+            if group in resolved:
+                counts["resolved"] += 1
+                if _same(group, ours[group], reference[group]):
+                    counts["agree"] += 1
+                else:
+                    errors.append((group, sample["text"], ours[group], reference[group]))
+
+    started = time.perf_counter()
+    for _ in range(args.repeat):
+        for sample in samples:
+            filter_rules.extract(sample["text"])
+    us = (time.perf_counter() - started) / (args.repeat * len(samples)) * 1e6
+
+    print(f"samples: {len(samples)}  reference: {'live LLM' if args.live else 'bundled'}  min confidence: {args.min_confidence}")
+    print(f"{'group':>10} {'mentioned':>10} {'resolved':>9} {'agreement':>10}")
+    for group, counts in stats.items():
+        agreement = counts["agree"] / counts["resolved"] if counts["resolved"] else 0.0
+        print(f"{group:>10} {counts['mentioned']:>10} {counts['resolved']:>9} {agreement:>10.3f}")
+    print(f"llm skipped: {skipped / len(samples):.3f}  latency: {us:.1f} us/message")
+
+    if args.errors:
+        for group, text, ours, reference in errors:
+            print(f"  {group}: rules={ours} llm={reference}  {text}")
+
+
+if __name__ == "__main__":
+    main()
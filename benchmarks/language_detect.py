@@ -0,0 +1,63 @@
+"""
+Accuracy and latency of the local Turkish/English detector on a bundled sample set.
+
+Coverage is the share of samples detected with at least --min-confidence (the others would fall
+back to the conversation's earlier language or to the LLM); accuracy is reported both on those
+confident samples and on every sample that had any evidence.
+
+    python -m benchmarks.language_detect --min-confidence 0.85 --errors
+"""
+import argparse
+import os
+import time
+
+from app.services import language
+
+SAMPLES = os.path.join(os.path.dirname(__file__), "data", "language_samples.tsv")
+
+
+def load_samples(path: str = SAMPLES) -> list:
+    samples = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if line.strip() and not line.startswith("#"):
+                expected, text = line.rstrip("\n").split("\t", 1)
+                samples.append((expected, text))
+    return samples
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--samples", default=SAMPLES)
+    parser.add_argument("--min-confidence", type=float, default=language.LANGUAGE_MIN_CONFIDENCE)
+    parser.add_argument("--repeat", type=int, default=200, help="passes over the samples for the latency figure")
+    parser.add_argument("--errors", action="store_true", help="print misdetected and low-confidence samples")
+    args = parser.parse_args()
+
+    samples = load_samples(args.samples)
+    detections = [language.detect(text) for _, text in samples]
+    confident = [(e, d) for (e, _), d in zip(samples, detections) if d.confidence >= args.min_confidence]
+    answered = [(e, d) for (e, _), d in zip(samples, detections) if d.language is not None]
+
+    started = time.perf_counter()
+    for _ in range(args.repeat):
+        for _, text in samples:
+            language.detect(text)
+    us = (time.perf_counter() - started) / (args.repeat * len(samples)) * 1e6
+
+    def accuracy(pairs):
+        return sum(e == d.language for e, d in pairs) / len(pairs) if pairs else 0.0
+
+    print(f"samples: {len(samples)}  ({sum(e == 'tr' for e, _ in samples)} tr / {sum(e == 'en' for e, _ in samples)} en)")
+    print(f"coverage @ {args.min_confidence:.2f}: {len(confident) / len(samples):.3f}  accuracy: {accuracy(confident):.3f}")
+    print(f"any evidence: {len(answered) / len(samples):.3f}  accuracy: {accuracy(answered):.3f}")
+    print(f"latency: {us:.1f} us/call")
+
+    if args.errors:
+        for (expected, text), d in zip(samples, detections):
+            if d.language != expected or d.confidence < args.min_confidence:
+                print(f"  {expected} -> {d.language} ({d.confidence:.2f})  {text}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""
+Latency, retries and concurrency of the shared LLM client under a burst of premium turns.
+
+Starts the fake OpenAI server (benchmarks/fake_openai.py) in-process, fires --requests structured
+extraction calls at once through one LlmClient and reports latency percentiles, how many calls
+succeeded, were retried or timed out, and the highest concurrency the server saw (which must not
+exceed --max-concurrency).
+
+    python -m benchmarks.llm_client --requests 200 --max-concurrency 16 --error-rate 0.1
+"""
+import argparse
+import asyncio
+import threading
+import time
+
+import uvicorn
+
+from app.schemas.schemas import ProductFilterSchema
+from app.services import llm, premium
+from benchmarks import fake_openai
+
+
+def start_server(port: int, app=fake_openai.app) -> uvicorn.Server:
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    return server
+
+
+async def burst(client: llm.LlmClient, requests: int) -> tuple:
+    table = ProductFilterSchema().model_dump()
+    latencies, failures = [], {}
+
+    async def one(i):
+        started = time.perf_counter()
+        try:
+            await premium.extract_turn(f"annem için hediye {i}", table, client)
+            latencies.append(time.perf_counter() - started)
+        except llm.LlmError as e:
+            failures[type(e).__name__] = failures.get(type(e).__name__, 0) + 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(requests)))
+    elapsed = time.perf_counter() - started
+    await client.close()
+    return sorted(latencies), failures, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=8901)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--max-concurrency", type=int, default=llm.LLM_MAX_CONCURRENCY)
+    parser.add_argument("--timeout", type=float, default=2.0, help="per-attempt timeout")
+    parser.add_argument("--deadline", type=float, default=30.0)
+    parser.add_argument("--max-retries", type=int, default=llm.LLM_MAX_RETRIES)
+    parser.add_argument("--latency", type=float, default=0.3)
+    parser.add_argument("--error-rate", type=float, default=0.05)
+    parser.add_argument("--rate-limit-rate", type=float, default=0.05)
+    args = parser.parse_args()
+
+    fake_openai.configure(latency=args.latency, error_rate=args.error_rate, rate_limit_rate=args.rate_limit_rate,
+                          token_delay=0.0)
+    server = start_server(args.port)
+    client = llm.LlmClient(
+        api_key="fake", base_url=f"http://127.0.0.1:{args.port}/v1", max_concurrency=args.max_concurrency,
+        timeout=args.timeout, deadline=args.deadline, max_retries=args.max_retries,
+    )
+    latencies, failures, elapsed = asyncio.run(burst(client, args.requests))
+    server.should_exit = True
+
+    def pct(p):
+        return latencies[min(len(latencies) - 1, int(p * len(latencies)))] * 1000 if latencies else 0.0
+
+    status = client.status()
+    print(f"requests: {args.requests}  ok: {len(latencies)}  failed: {failures or 0}  wall: {elapsed:.2f}s")
+    print(f"latency p50: {pct(0.5):.0f} ms  p95: {pct(0.95):.0f} ms  p99: {pct(0.99):.0f} ms")
+    print(f"retries: {status['retries']}  timeouts: {status['timeouts']}")
+    print(f"server max concurrency: {fake_openai.stats['max_in_flight']} (limit {args.max_concurrency})"
+          f"  server requests: {fake_openai.stats['requests']}")
+
+
+if __name__ == "__main__":
+    main()
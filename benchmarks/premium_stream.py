@@ -0,0 +1,101 @@
+"""
+Time to the first follow-up text: streamed versus single-response premium extraction.
+
+Runs against the fake OpenAI server (benchmarks/fake_openai.py, started in-process) with a
+--latency before the first token and --token-delay between chunks, and reports for each mode
+when the first question text and the complete turn became available. The LLM cache is bypassed.
+
+A second pass checks the streamed text against the final message the SSE route sends, with an
+--off-script-rate share of answers whose question does not match the model's own table: the
+streamed text must be either the final message or flagged as replaced (replaces_stream).
+
+    python -m benchmarks.premium_stream --latency 0.4 --token-delay 0.01 --off-script-rate 0.3
+"""
+import argparse
+import asyncio
+import time
+
+from app.schemas.schemas import ProductFilterSchema
+from app.services import llm, premium
+from benchmarks import fake_openai
+from benchmarks.llm_client import start_server
+
+
+def final_message(turn: premium.PremiumTurn, table: dict) -> str:
+    """The message the SSE route sends after the stream (see routes._premium_events)."""
+    field = premium.missing_field(ProductFilterSchema(**table))
+    return premium.follow_up_message(turn, field) if field else premium.MESSAGES["success"][turn.language]
+
+
+async def consistency(client: llm.LlmClient, repeat: int) -> dict:
+    counts = {"turns": 0, "streamed": 0, "kept": 0, "replaced": 0}
+    table = ProductFilterSchema().model_dump()
+    for i in range(repeat):
+        streamed = []
+        async for kind, value in premium.stream_turn(f"kız kardeşim için hediye {i}", table, client=client):
+            if kind == "delta":
+                streamed.append(value)
+            else:
+                turn, updated, _ = value
+        counts["turns"] += 1
+        if streamed:
+            counts["streamed"] += 1
+            counts["kept" if "".join(streamed) == final_message(turn, updated) else "replaced"] += 1
+    return counts
+
+
+async def measure(client: llm.LlmClient, repeat: int) -> dict:
+    table = ProductFilterSchema().model_dump()
+    timings = {"single": [], "stream": []}
+    for i in range(repeat):
+        # Her mesaj farklı; önbellekten dönmesin
+        started = time.perf_counter()
+        await premium.extract_turn(f"kız kardeşim için hediye {i}", table, client)
+        done = time.perf_counter() - started
+        timings["single"].append((done, done))
+
+        started, first = time.perf_counter(), None
+        async for kind, _ in premium.stream_extract(f"kız kardeşim için hediye {i}.", table, client):
+            if first is None:
+                first = time.perf_counter() - started
+        timings["stream"].append((first, time.perf_counter() - started))
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=8902)
+    parser.add_argument("--repeat", type=int, default=10)
+    parser.add_argument("--latency", type=float, default=0.4, help="seconds before the first token")
+    parser.add_argument("--token-delay", type=float, default=0.01, help="seconds between streamed chunks")
+    parser.add_argument("--off-script-rate", type=float, default=0.3,
+                        help="share of answers whose question does not match their table (consistency pass)")
+    args = parser.parse_args()
+
+    premium.LLM_CACHE_ENABLED = False
+    fake_openai.configure(latency=args.latency, jitter=0.0, token_delay=args.token_delay)
+    server = start_server(args.port)
+    client = llm.LlmClient(api_key="fake", base_url=f"http://127.0.0.1:{args.port}/v1")
+
+    async def run():
+        timings = await measure(client, args.repeat)
+        fake_openai.configure(latency=0.0, token_delay=0.0, off_script_rate=args.off_script_rate)
+        counts = await consistency(client, args.repeat * 5)
+        await client.close()
+        return timings, counts
+
+    timings, counts = asyncio.run(run())
+    server.should_exit = True
+
+    print(f"{'mode':>8} {'first text ms':>14} {'complete ms':>12}")
+    for mode, pairs in timings.items():
+        first = sorted(p[0] for p in pairs)[len(pairs) // 2] * 1000
+        complete = sorted(p[1] for p in pairs)[len(pairs) // 2] * 1000
+        print(f"{mode:>8} {first:>14.0f} {complete:>12.0f}")
+    print(f"\nconsistency: {counts['turns']} turns, {fake_openai.stats['off_script']} off-script answers, "
+          f"{counts['streamed']} streamed a question: {counts['kept']} kept, "
+          f"{counts['replaced']} replaced by the final message (sent with replaces_stream)")
+
+
+if __name__ == "__main__":
+    main()
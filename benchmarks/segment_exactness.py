@@ -0,0 +1,112 @@
+"""
+Checks that the segment shortlist (app/services/segments.py) answers exactly like the full scan.
+
+ 1. A hand-built tie: the 10th result of the shortlist and a product left out of it have the same
+    full distance, so the full scan returns the left-out product (lower id). The shortlist must
+    notice the tie at its cutoff and fall back instead of counting its own answer as exact.
+ 2. Random age + gender + special day + interest queries (with and without a budget) on a
+    synthetic catalog, through scoring.top_products with and without the index: the ids must
+    match for every query. Reports how many shortlist answers were exact and how many fell back.
+
+Exits with status 1 on any mismatch.
+
+    python -m benchmarks.segment_exactness --size 200000 --depth 300 --queries 300
+"""
+import argparse
+import sys
+
+import numpy as np
+
+from app.services import scoring, segments
+from app.services.catalog import CatalogSnapshot, _object_array
+from app.services.features import AGE_COLUMNS, FEATURE_COLUMNS, FEATURE_INDEX, GENDER_COLUMNS, SPECIAL_COLUMNS
+from benchmarks.ann_recall import clustered_snapshot, random_queries
+
+
+def use_index(snapshot: CatalogSnapshot, depth: int):
+    segments._refresher = segments.SegmentRefresher(lambda: snapshot)
+    segments._refresher.index = segments.build_index(snapshot, depth=depth)
+
+
+def ids(result: dict) -> list:
+    return [p["id"] for p in result["products"]]
+
+
+def compare(snapshot: CatalogSnapshot, filters: dict, limit: int) -> tuple:
+    refresher = segments._refresher
+    shortlist = ids(scoring.top_products(filters, limit, snapshot))
+    segments._refresher = None
+    full = ids(scoring.top_products(filters, limit, snapshot))
+    segments._refresher = refresher
+    return shortlist, full
+
+
+def tie_snapshot() -> tuple:
+    """
+    Ten products at segment distance 0 (ids 100..108 and 200) and 41 at 2.28: age 2, gender 5.
+    Summed per term, 1.28 + 1.0 gives 2.2800000000000002; summed as integers, 228 / 100 is 2.28.
+    Product 200 gets 2.28 from three interests and product 1 none, so they tie on the full distance.
+    """
+    age, gender, special = AGE_COLUMNS[0], GENDER_COLUMNS[0], SPECIAL_COLUMNS[0]
+    interests = ["interest_sports", "interest_music", "interest_books"]
+    close_ids = list(range(100, 109)) + [200]
+    far_ids = [1] + list(range(1000, 1040))
+    n = len(close_ids) + len(far_ids)
+    features = np.full((n, len(FEATURE_COLUMNS)), 10, dtype=np.float32)
+    features[len(close_ids) - 1, [FEATURE_INDEX[c] for c in interests]] = [0, 2, 2]
+    far = slice(len(close_ids), n)
+    features[far, FEATURE_INDEX[age]] = 2
+    features[far, FEATURE_INDEX[gender]] = 5
+    # Doldurma ürünleri ilgi alanlarında en uzakta
+    features[len(close_ids) + 1:, [FEATURE_INDEX[c] for c in interests]] = 0
+    snapshot = CatalogSnapshot(
+        ids=np.array(close_ids + far_ids, dtype=np.int64),
+        features=features,
+        prices=np.full(n, 100.0),
+        names=_object_array([f"Product {i}" for i in range(n)]),
+        sites=_object_array(["site"] * n),
+        links=_object_array([""] * n),
+        lower_7=_object_array([False] * n),
+        lower_30=_object_array([False] * n),
+    )
+    return snapshot, {c: True for c in [age, gender, special] + interests}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size", type=int, default=200_000)
+    parser.add_argument("--depth", type=int, default=segments.SEGMENT_CANDIDATES)
+    parser.add_argument("--queries", type=int, default=300)
+    parser.add_argument("--limit", type=int, default=10)
+    args = parser.parse_args()
+    mismatches = 0
+
+    snapshot, filters = tie_snapshot()
+    use_index(snapshot, depth=10)
+    shortlist, full = compare(snapshot, filters, 10)
+    stats = segments.segment_status()
+    ok = shortlist == full
+    mismatches += not ok
+    print(f"tie at the cutoff: {'ok' if ok else 'MISMATCH'}  full {full[-1]}, shortlist {shortlist[-1]}, "
+          f"exact {stats['exact']}, fallbacks {stats['fallbacks']}")
+
+    snapshot = clustered_snapshot(args.size)
+    use_index(snapshot, depth=args.depth)
+    rng = np.random.default_rng(2)
+    tie_mismatches = mismatches
+    for i, cols in enumerate(random_queries(args.queries)):
+        filters = {c: True for c in cols}
+        if i % 3 == 0:
+            low = float(rng.uniform(100, 2000))
+            filters.update(min_budget=low, max_budget=low * float(rng.uniform(1.2, 3)))
+        shortlist, full = compare(snapshot, filters, args.limit)
+        if shortlist != full:
+            mismatches += 1
+            print(f"MISMATCH {sorted(filters)}: full {full}, shortlist {shortlist}")
+    stats = segments.segment_status()
+    print(f"random queries: {args.queries}, exact {stats['exact']}, fallbacks {stats['fallbacks']}, mismatches {mismatches - tie_mismatches}")
+    sys.exit(1 if mismatches else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,154 @@
+"""
+Firebase email/password sign-in under load: the pooled async client versus a blocking
+requests.post per call, and the circuit breaker during an outage.
+
+Starts the fake identity server (benchmarks/fake_identity.py) in-process and
+ 1. fires --requests sign-ins at once through one IdentityClient, and the same number through a
+    bare requests.post inside the coroutine (what the async routes used to do: a new connection
+    per call, and the event loop blocked while it waits), and reports wall time, the longest
+    event loop stall, the TCP connections the server saw and latency percentiles;
+ 2. takes the server down and keeps signing in: after --breaker-threshold failed calls the
+    breaker opens and the rest fail fast instead of waiting on retries;
+ 3. brings the server back and waits out --cooldown: one trial call closes the breaker again.
+
+    python -m benchmarks.signin --requests 100 --latency 0.05 --error-rate 0.05
+"""
+import argparse
+import asyncio
+import time
+
+import requests
+
+from app.services import identity
+from benchmarks import fake_identity
+from benchmarks.llm_client import start_server
+
+
+def percentiles(latencies: list) -> str:
+    latencies = sorted(latencies)
+
+    def pct(p):
+        return latencies[min(len(latencies) - 1, int(p * len(latencies)))] * 1000 if latencies else 0.0
+
+    return f"p50 {pct(0.5):.0f} ms  p95 {pct(0.95):.0f} ms  p99 {pct(0.99):.0f} ms"
+
+
+async def pooled_burst(client: identity.IdentityClient, requests_: int) -> tuple:
+    latencies, failures = [], 0
+
+    async def one(i):
+        nonlocal failures
+        started = time.perf_counter()
+        try:
+            await client.signin_with_password(f"user{i}@example.com", "secret")
+            latencies.append(time.perf_counter() - started)
+        except identity.IdentityUnavailable:
+            failures += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(requests_)))
+    return latencies, failures, time.perf_counter() - started
+
+
+async def blocking_burst(url: str, requests_: int) -> tuple:
+    latencies, failures = [], 0
+
+    async def one(i):
+        nonlocal failures
+        started = time.perf_counter()
+        try:
+            response = requests.post(url, json={"email": f"user{i}@example.com", "password": "secret"})
+            response.raise_for_status()
+            latencies.append(time.perf_counter() - started)
+        except requests.RequestException:
+            failures += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(requests_)))
+    return latencies, failures, time.perf_counter() - started
+
+
+async def with_stall(burst) -> tuple:
+    """Run a burst while a ticker records the longest time the event loop could not run it."""
+    stall, done = 0.0, False
+
+    async def ticker():
+        nonlocal stall
+        while not done:
+            started = time.perf_counter()
+            await asyncio.sleep(0.01)
+            stall = max(stall, time.perf_counter() - started - 0.01)
+
+    task = asyncio.create_task(ticker())
+    await asyncio.sleep(0)
+    result = await burst
+    done = True
+    await task
+    return result, stall
+
+
+async def outage(client: identity.IdentityClient, calls: int) -> list:
+    results = []
+    for i in range(calls):
+        started = time.perf_counter()
+        try:
+            await client.signin_with_password(f"user{i}@example.com", "secret")
+            outcome = "ok"
+        except identity.IdentityUnavailable:
+            outcome = "unavailable"
+        results.append((outcome, client.breaker.state, time.perf_counter() - started))
+    return results
+
+
+async def run(args) -> None:
+    base_url = f"http://127.0.0.1:{args.port}/v1/accounts"
+    client = identity.IdentityClient(
+        base_url=base_url, api_key="fake", read_timeout=args.read_timeout, max_retries=args.max_retries,
+        breaker=identity.CircuitBreaker(args.breaker_threshold, args.cooldown),
+    )
+
+    print(f"{'mode':>9} {'ok':>5} {'failed':>6} {'wall s':>7} {'loop stall ms':>13} {'connections':>11}  latency")
+    for mode in ("pooled", "blocking"):
+        before = len(fake_identity._connections)
+        if mode == "pooled":
+            burst = pooled_burst(client, args.requests)
+        else:
+            burst = blocking_burst(f"{base_url}:signInWithPassword?key=fake", args.requests)
+        (latencies, failures, elapsed), stall = await with_stall(burst)
+        connections = len(fake_identity._connections) - before
+        print(f"{mode:>9} {len(latencies):>5} {failures:>6} {elapsed:>7.2f} {stall * 1000:>13.0f} {connections:>11}"
+              f"  {percentiles(latencies)}")
+    print(f"pooled client retries: {client.stats['retries']}")
+
+    fake_identity.configure(down=True)
+    print("\noutage:")
+    for i, (outcome, state, elapsed) in enumerate(await outage(client, args.breaker_threshold + 5)):
+        print(f"  call {i + 1:>2}: {outcome:<11} {elapsed * 1000:>6.0f} ms  breaker {state}")
+
+    fake_identity.configure(down=False)
+    await asyncio.sleep(args.cooldown)
+    outcome, state, elapsed = (await outage(client, 1))[0]
+    print(f"recovered after {args.cooldown:.1f}s cooldown: {outcome}, {elapsed * 1000:.0f} ms, breaker {state}")
+    await client.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=8911)
+    parser.add_argument("--requests", type=int, default=100)
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--error-rate", type=float, default=0.05)
+    parser.add_argument("--read-timeout", type=float, default=2.0)
+    parser.add_argument("--max-retries", type=int, default=identity.SIGNIN_MAX_RETRIES)
+    parser.add_argument("--breaker-threshold", type=int, default=identity.SIGNIN_BREAKER_THRESHOLD)
+    parser.add_argument("--cooldown", type=float, default=2.0)
+    args = parser.parse_args()
+
+    fake_identity.configure(latency=args.latency, error_rate=args.error_rate)
+    server = start_server(args.port, fake_identity.app)
+    asyncio.run(run(args))
+    server.should_exit = True
+
+
+if __name__ == "__main__":
+    main()
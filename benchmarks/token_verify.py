@@ -0,0 +1,99 @@
+"""
+Latency of Firebase ID token verification: local RS256 check versus the verified-token cache.
+
+Runs offline: a self-signed RSA certificate is generated and served through a StaticKeySource,
+tokens are signed with it the way Firebase signs ID tokens, and a set of bad tokens (wrong
+audience, expired, unknown key, tampered payload) must all be rejected.
+
+    python -m benchmarks.token_verify --tokens 200
+"""
+import argparse
+import datetime
+import time
+
+from cryptography import x509
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+from cryptography.x509.oid import NameOID
+from google.auth import crypt, jwt
+
+from app.services import id_tokens
+
+PROJECT_ID = "hediyele-test"
+KID = "test-key"
+
+
+def self_signed_pair():
+    key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, "securetoken.test")])
+    now = datetime.datetime.now(datetime.timezone.utc)
+    cert = (
+        x509.CertificateBuilder().subject_name(name).issuer_name(name).public_key(key.public_key())
+        .serial_number(x509.random_serial_number())
+        .not_valid_before(now - datetime.timedelta(days=1)).not_valid_after(now + datetime.timedelta(days=1))
+        .sign(key, hashes.SHA256())
+    )
+    private_pem = key.private_bytes(
+        serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8, serialization.NoEncryption()
+    )
+    return private_pem, cert.public_bytes(serialization.Encoding.PEM).decode()
+
+
+def sign(signer, uid: str, **overrides) -> str:
+    now = int(time.time())
+    payload = {
+        "iss": f"https://securetoken.google.com/{PROJECT_ID}", "aud": PROJECT_ID, "sub": uid,
+        "auth_time": now - 10, "iat": now - 10, "exp": now + 3600, "email": f"{uid}@example.com", "premium": True,
+        **overrides,
+    }
+    return jwt.encode(signer, payload).decode()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tokens", type=int, default=200)
+    parser.add_argument("--repeat", type=int, default=20, help="cached verifications per token")
+    args = parser.parse_args()
+
+    private_pem, cert_pem = self_signed_pair()
+    signer = crypt.RSASigner.from_string(private_pem, key_id=KID)
+    other = crypt.RSASigner.from_string(self_signed_pair()[0], key_id="other-key")
+    id_tokens._verifier = id_tokens.TokenVerifier(PROJECT_ID, id_tokens.StaticKeySource({KID: cert_pem}))
+
+    tokens = [sign(signer, f"user-{i}") for i in range(args.tokens)]
+    started = time.perf_counter()
+    for token in tokens:
+        assert id_tokens.verify(token)["uid"].startswith("user-")
+    cold = (time.perf_counter() - started) / len(tokens) * 1e6
+
+    started = time.perf_counter()
+    for _ in range(args.repeat):
+        for token in tokens:
+            id_tokens.verify(token)
+    cached = (time.perf_counter() - started) / (len(tokens) * args.repeat) * 1e6
+
+    good = sign(signer, "tampered")
+    head, body, signature = good.split(".")
+    bad = {
+        "wrong audience": sign(signer, "u", aud="another-project"),
+        "wrong issuer": sign(signer, "u", iss="https://example.com/"),
+        "expired": sign(signer, "u", iat=int(time.time()) - 7200, exp=int(time.time()) - 3600),
+        "unknown key": sign(other, "u"),
+        "tampered": ".".join([head, sign(signer, "someone-else").split(".")[1], signature]),
+        "garbage": "not-a-token",
+    }
+    rejected = {}
+    for label, token in bad.items():
+        try:
+            id_tokens.verify(token)
+            rejected[label] = False
+        except id_tokens.TokenError:
+            rejected[label] = True
+
+    print(f"tokens: {len(tokens)}  local verify: {cold:.0f} us/token  cached: {cached:.1f} us/token")
+    print("rejected: " + ", ".join(f"{label}={'yes' if ok else 'NO'}" for label, ok in rejected.items()))
+    print(f"cache: {id_tokens.token_cache.status()}")
+
+
+if __name__ == "__main__":
+    main()